@@ -0,0 +1,70 @@
+# 异步模式（DB_ASYNC=1）：把路由模块里的同步路由换成 async def 版本。
+# 原有的同步实现不变，放进 AsyncSession.run_sync 里执行：代码照旧使用同步 Session，底层却是 asyncpg / aiosqlite 连接，
+# 等待数据库时让出事件循环，不再占用线程池线程；本来就是 async def 的路由（SSE、批量导入）保持原样。
+# run_sync 是在事件循环线程上执行同步代码的，只适合以等数据库为主的路由；计算密集的路由用 @cpu_bound 标记，
+# 保持同步路由，由 FastAPI 放进线程池执行，计算期间不会卡住其他请求
+import functools
+import inspect
+
+from fastapi import APIRouter, Depends
+from fastapi.routing import APIRoute
+
+from database import get_async_db, get_db
+from security import get_current_user, get_current_user_async
+
+# 同步依赖 -> 对应的异步依赖
+ASYNC_DEPENDENCIES = {get_db: get_async_db, get_current_user: get_current_user_async}
+
+
+def _dependency(param: inspect.Parameter):
+    return getattr(param.default, "dependency", None)
+
+
+# ✅ 标记计算密集的同步路由（派单、路线规划、MinHash 查重等），asyncify_router 不改写它们
+def cpu_bound(endpoint):
+    endpoint.cpu_bound = True
+    return endpoint
+
+
+# ✅ 把一个同步路由函数包装成 async def：依赖换成异步版本，函数体在 run_sync 里拿到同步 Session 执行
+def asyncify_endpoint(endpoint):
+    signature = inspect.signature(endpoint)
+    db_param = next((name for name, param in signature.parameters.items() if _dependency(param) is get_db), None)
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        if db_param is None:
+            return endpoint(**kwargs)
+        db = kwargs[db_param]
+        return await db.run_sync(lambda session: endpoint(**dict(kwargs, **{db_param: session})))
+
+    wrapper.__signature__ = signature.replace(parameters=[
+        param.replace(default=Depends(ASYNC_DEPENDENCIES[_dependency(param)]))
+        if _dependency(param) in ASYNC_DEPENDENCIES else param
+        for param in signature.parameters.values()
+    ])
+    return wrapper
+
+
+# ✅ 原地替换路由表里的同步路由，需在 app.include_router 之前调用
+def asyncify_router(router: APIRouter) -> APIRouter:
+    for i, route in enumerate(router.routes):
+        if not isinstance(route, APIRoute) or inspect.iscoroutinefunction(route.endpoint):
+            continue
+        if getattr(route.endpoint, "cpu_bound", False):
+            continue
+        router.routes[i] = APIRoute(
+            route.path,
+            asyncify_endpoint(route.endpoint),
+            methods=list(route.methods),
+            response_model=route.response_model,
+            status_code=route.status_code,
+            response_class=route.response_class,
+            dependencies=route.dependencies,
+            name=route.name,
+            summary=route.summary,
+            description=route.description,
+            tags=route.tags,
+            include_in_schema=route.include_in_schema,
+        )
+    return router
@@ -0,0 +1,204 @@
+# 服务者空闲时间：每人每天 96 个 15 分钟时段的位图（12 字节，高位在前，第 0 位为 00:00-00:15，1 表示空闲）。
+# 查询时把当天所有服务者的位图拼成 (服务者数, 3) 的 uint32 矩阵，与需求时间窗的掩码整体按位与，一次得出谁有空
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from database import dialect_insert
+from models import ProviderAvailability
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES   # 96
+SLOT_BYTES = SLOTS_PER_DAY // 8           # 12
+# 缓存最长有效期（秒）：本进程的写入会立即失效缓存，这里兜底其他进程 / 其他实例的写入
+AVAILABILITY_CACHE_TTL = 30
+# 批量写入时每条 INSERT 的行数
+AVAILABILITY_INSERT_CHUNK = 1000
+
+_RANGE = re.compile(r"^\s*(\d{1,2})[:：](\d{2})\s*-\s*(\d{1,2})[:：](\d{2})\s*$")
+
+Window = Optional[Tuple[datetime, datetime]]
+
+
+# ---------- 位图编解码 ----------
+
+def mask_from_ranges(ranges: Iterable[str]) -> bytes:
+    # "09:00-12:00" 这样的时段；不足 15 分钟的零头不算空闲（开始向后取整、结束向前取整）
+    bits = np.zeros(SLOTS_PER_DAY, dtype=bool)
+    for text in ranges:
+        m = _RANGE.match(text)
+        if not m:
+            raise HTTPException(status_code=400, detail=f"时间段格式应为 HH:MM-HH:MM：{text}")
+        sh, sm, eh, em = map(int, m.groups())
+        start, end = sh * 60 + sm, eh * 60 + em
+        if sm >= 60 or em >= 60 or not 0 <= start < end <= 24 * 60:
+            raise HTTPException(status_code=400, detail=f"时间段无效：{text}")
+        bits[-(-start // SLOT_MINUTES):end // SLOT_MINUTES] = True
+    return np.packbits(bits).tobytes()
+
+
+def ranges_from_mask(mask: bytes) -> List[str]:
+    bits = np.unpackbits(np.frombuffer(mask, dtype=np.uint8))
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], bits, [0]))))
+    return [
+        f"{_clock(start)}-{_clock(end)}"
+        for start, end in zip(edges[::2].tolist(), edges[1::2].tolist())
+    ]
+
+
+def _clock(slot: int) -> str:
+    minutes = slot * SLOT_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+# ✅ 需求时间窗 [start_at, end_at) 覆盖的时段掩码，跨天时按天拆开：{日期: 12 字节掩码}
+def window_masks(start_at: datetime, end_at: datetime) -> Dict[date, bytes]:
+    masks = {}
+    day = start_at.date()
+    while datetime.combine(day, datetime.min.time()) < end_at:
+        day_start = datetime.combine(day, datetime.min.time())
+        first = max(start_at, day_start) - day_start
+        last = min(end_at, day_start + timedelta(days=1)) - day_start
+        slot = timedelta(minutes=SLOT_MINUTES)
+        bits = np.zeros(SLOTS_PER_DAY, dtype=bool)
+        bits[first // slot:-(-last // slot)] = True
+        masks[day] = np.packbits(bits).tobytes()
+        day += timedelta(days=1)
+    return masks
+
+
+def _words(blob: bytes) -> np.ndarray:
+    # 12 字节一行 → 每行 3 个 uint32；掩码按同样方式展开，字节序不影响按位与的结果
+    return np.frombuffer(blob, dtype=np.uint32).reshape(-1, SLOT_BYTES // 4)
+
+
+def fits(words: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    # words: (n, 3)，mask: (3,) 或 (n, 3)；掩码覆盖的时段全部空闲才算有空
+    return ((words & mask) == mask).all(axis=1)
+
+
+# ---------- 查询引擎 ----------
+
+class AvailabilityIndex:
+    # ✅ 每天一张按服务者 ID 排序的位图矩阵，进程内缓存；写入空闲时间后按天失效。
+    # 每次失效版本号 +1；查库期间若又发生失效，查到的结果照常返回但不写回缓存，避免缓存旧数据
+    def __init__(self, ttl: float = AVAILABILITY_CACHE_TTL):
+        self.ttl = ttl
+        self._version = 0
+        self._days: Dict[date, Tuple[np.ndarray, np.ndarray, float]] = {}
+        self._calendar: Optional[Tuple[np.ndarray, float]] = None
+        self._lock = threading.Lock()
+
+    def invalidate(self, days: Optional[Iterable[date]] = None):
+        with self._lock:
+            self._version += 1
+            if days is None:
+                self._days.clear()
+            else:
+                for day in days:
+                    self._days.pop(day, None)
+            self._calendar = None
+
+    def day(self, db: Session, day: date) -> Tuple[np.ndarray, np.ndarray]:
+        entry = self._days.get(day)
+        if entry is not None and time.monotonic() - entry[2] < self.ttl:
+            return entry[0], entry[1]
+        with self._lock:
+            version = self._version
+        rows = (
+            db.query(ProviderAvailability.provider_id, ProviderAvailability.slots)
+            .filter(ProviderAvailability.day == day)
+            .order_by(ProviderAvailability.provider_id)
+            .all()
+        )
+        ids = np.array([r.provider_id for r in rows], dtype=np.int64)
+        words = _words(b"".join(r.slots for r in rows))
+        with self._lock:
+            if self._version == version:
+                self._days[day] = (ids, words, time.monotonic())
+        return ids, words
+
+    def calendar_providers(self, db: Session) -> np.ndarray:
+        # 登记过空闲时间的服务者（升序）；从未登记的服务者派单时不按空闲时间限制
+        entry = self._calendar
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        with self._lock:
+            version = self._version
+        ids = np.array(
+            [pid for (pid,) in db.query(ProviderAvailability.provider_id).distinct().order_by(ProviderAvailability.provider_id)],
+            dtype=np.int64,
+        )
+        with self._lock:
+            if self._version == version:
+                self._calendar = (ids, time.monotonic())
+        return ids
+
+    # ✅ 在 [start_at, end_at) 内全程有空的服务者 ID（升序）
+    def free_providers(self, db: Session, start_at: datetime, end_at: datetime) -> np.ndarray:
+        result = None
+        for day, mask in window_masks(start_at, end_at).items():
+            ids, words = self.day(db, day)
+            free = ids[fits(words, _words(mask)[0])]
+            result = free if result is None else np.intersect1d(result, free, assume_unique=True)
+        return result if result is not None else np.zeros(0, dtype=np.int64)
+
+    # ✅ 派单候选边 (windows[rows[i]], provider_ids[i]) 是否可行：服务者在需求时间窗内全程有空。
+    # 没有结构化时间的需求、从未登记空闲时间的服务者不受限制
+    def pairs_free(self, db: Session, windows: Sequence[Window], rows: np.ndarray, provider_ids: np.ndarray) -> np.ndarray:
+        ok = np.ones(len(rows), dtype=bool)
+        restricted = np.isin(provider_ids, self.calendar_providers(db))
+        if not restricted.any():
+            return ok
+
+        by_day: Dict[date, Tuple[List[int], List[bytes]]] = {}
+        for need, window in enumerate(windows):
+            if window is None:
+                continue
+            for day, mask in window_masks(*window).items():
+                needs, masks = by_day.setdefault(day, ([], []))
+                needs.append(need)
+                masks.append(mask)
+
+        for day, (needs, masks) in by_day.items():
+            slot_of_need = np.full(len(windows), -1, dtype=np.int64)
+            slot_of_need[needs] = np.arange(len(needs))
+            selected = np.flatnonzero(restricted & (slot_of_need[rows] >= 0))
+            if not len(selected):
+                continue
+            ids, words = self.day(db, day)
+            wanted = provider_ids[selected]
+            where = np.minimum(np.searchsorted(ids, wanted), max(len(ids) - 1, 0))
+            found = ids[where] == wanted if len(ids) else np.zeros(len(wanted), dtype=bool)
+            # 当天没有登记的服务者按全天没空处理
+            provider_words = np.zeros((len(selected), SLOT_BYTES // 4), dtype=np.uint32)
+            provider_words[found] = words[where[found]]
+            need_words = _words(b"".join(masks))[slot_of_need[rows[selected]]]
+            ok[selected] &= fits(provider_words, need_words)
+        return ok
+
+
+availability_index = AvailabilityIndex()
+
+
+# ✅ 批量写入空闲时间：items 为 [(服务者 ID, 日期, 12 字节位图)]，已有的当天记录整天覆盖
+def save(db: Session, items: List[Tuple[int, date, bytes]]) -> int:
+    now = datetime.utcnow()
+    # 同一人同一天出现多次时以最后一条为准（同一条 INSERT ... ON CONFLICT 不能两次更新同一行）
+    latest = {(pid, day): slots for pid, day, slots in items}
+    values = [dict(provider_id=pid, day=day, slots=slots, updated_at=now) for (pid, day), slots in latest.items()]
+    for start in range(0, len(values), AVAILABILITY_INSERT_CHUNK):
+        stmt = dialect_insert(db, ProviderAvailability).values(values[start:start + AVAILABILITY_INSERT_CHUNK])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["provider_id", "day"],
+            set_={"slots": stmt.excluded.slots, "updated_at": stmt.excluded.updated_at},
+        ))
+    db.commit()
+    availability_index.invalidate({day for _, day in latest})
+    return len(values)
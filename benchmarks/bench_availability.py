@@ -0,0 +1,95 @@
+# 空闲时间查询基准：N 位服务者登记当天空闲时段后，查询某时间段有空的服务者、以及派单候选边的可行性过滤
+# 用法：python benchmarks/bench_availability.py
+#      默认使用临时 SQLite 文件；设置 DATABASE_URL 可指向其他测试库（会写入测试数据，结束时删除）
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/availability.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+import availability  # noqa: E402
+from database import Base, SessionLocal, engine  # noqa: E402
+from models import ProviderAvailability, User  # noqa: E402
+
+PROVIDERS = 10000
+NEEDS = 5000
+CANDIDATES = 20
+ROUNDS = 20
+
+
+def seed(db, tag, day):
+    rng = random.Random(7)
+    db.execute(insert(User), [
+        dict(name=f"bench-{i}", age=30, email=f"bench-av-{tag}-{i}@example.com", phone=f"av{tag}{i}",
+             hashed_password="-", role="provider")
+        for i in range(PROVIDERS)
+    ])
+    ids = [uid for (uid,) in db.query(User.id).filter(User.email.like(f"bench-av-{tag}-%")).order_by(User.id)]
+    items = []
+    for uid in ids:
+        # 每人随机 1~3 段空闲，每段 1~4 小时
+        ranges = []
+        for _ in range(rng.randint(1, 3)):
+            start = rng.randrange(6 * 4, 20 * 4) * 15
+            end = min(start + rng.randint(4, 16) * 15, 24 * 60)
+            ranges.append(f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}")
+        items.append((uid, day, availability.mask_from_ranges(ranges)))
+    availability.save(db, items)
+    return np.array(ids, dtype=np.int64)
+
+
+def timed(fn, rounds=ROUNDS):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, float(np.median(samples))
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    tag = time.time_ns()
+    day = date.today() + timedelta(days=30)
+    started = time.perf_counter()
+    ids = seed(db, tag, day)
+    print(f"登记 {PROVIDERS} 位服务者的空闲时间：{(time.perf_counter() - started) * 1000:.0f} ms")
+
+    index = availability.AvailabilityIndex()
+    start_at = datetime.combine(day, datetime.min.time()) + timedelta(hours=10)
+    end_at = start_at + timedelta(hours=2)
+
+    started = time.perf_counter()
+    index.day(db, day)
+    print(f"首次加载当天位图（查库）：{(time.perf_counter() - started) * 1000:.1f} ms")
+
+    free, ms = timed(lambda: index.free_providers(db, start_at, end_at))
+    print(f"查询 10:00-12:00 有空的服务者：{len(free)} 位，中位数 {ms:.2f} ms")
+
+    # 派单候选边：每个需求随机 20 位候选服务者，时间窗随机分布在当天 8:00-18:00
+    rng = np.random.default_rng(7)
+    windows = []
+    for _ in range(NEEDS):
+        begin = datetime.combine(day, datetime.min.time()) + timedelta(minutes=int(rng.integers(8 * 4, 18 * 4)) * 15)
+        windows.append((begin, begin + timedelta(hours=2)))
+    rows = np.repeat(np.arange(NEEDS), CANDIDATES)
+    provider_ids = ids[rng.integers(0, len(ids), NEEDS * CANDIDATES)]
+    ok, ms = timed(lambda: index.pairs_free(db, windows, rows, provider_ids), rounds=5)
+    print(f"过滤 {len(rows)} 条派单候选边：可行 {int(ok.sum())} 条，中位数 {ms:.1f} ms")
+
+    db.query(ProviderAvailability).filter(ProviderAvailability.provider_id.in_(ids.tolist())).delete(synchronize_session=False)
+    db.query(User).filter(User.id.in_(ids.tolist())).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
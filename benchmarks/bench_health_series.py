@@ -0,0 +1,50 @@
+# 压缩序列存储基准：每条读数占用字节数、解码吞吐
+# 用法：DATABASE_URL=sqlite:// python benchmarks/bench_health_series.py（只用到编解码，不访问数据库）
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from health_series import encode_series, decode_series  # noqa: E402
+
+# PostgreSQL 中一条 health_data 行的大致大小：
+# 行头 23B + 对齐 1B + id 4B + user_id 4B + 空值位图 + 3 个数值列 4~8B + timestamp 8B + 行指针 4B，
+# 再加主键索引条目约 16B
+ROW_BYTES_ESTIMATE = 23 + 1 + 4 + 4 + 8 + 8 + 4 + 16
+
+
+def make_day(metric: str, interval: int = 60):
+    points = []
+    value = 72 if metric == "heart_rate" else 0
+    for offset in range(0, 86400, interval):
+        offset += random.randint(0, 2)  # 采集时间轻微抖动
+        if metric == "heart_rate":
+            value = max(40, min(180, value + random.randint(-3, 3)))
+        else:
+            value += random.randint(0, 40)
+        points.append((offset, value))
+    return points
+
+
+def main():
+    random.seed(42)
+    for metric in ("heart_rate", "steps"):
+        days = [make_day(metric) for _ in range(200)]
+        blobs = [encode_series(day) for day in days]
+        readings = sum(len(day) for day in days)
+        size = sum(len(blob) for blob in blobs)
+
+        start = time.perf_counter()
+        for blob in blobs:
+            decode_series(blob)
+        elapsed = time.perf_counter() - start
+
+        print(f"[{metric}] {readings} 条读数，共 {size} 字节")
+        print(f"  压缩后：{size / readings:.2f} 字节/条（按行存储约 {ROW_BYTES_ESTIMATE} 字节/条）")
+        print(f"  解码吞吐：{readings / elapsed / 1e6:.2f} M 条/秒")
+
+
+if __name__ == "__main__":
+    main()
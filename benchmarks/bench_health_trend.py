@@ -0,0 +1,79 @@
+# 健康趋势接口基准：数据库窗口函数 vs NumPy 两种执行策略对比
+# 用法：DATABASE_URL=postgresql://... python benchmarks/bench_health_trend.py
+# 注意：会在目标库中创建一个临时用户并写入一年的模拟数据，结束后删除；请使用测试库。
+# SQLite 下只运行 NumPy 策略。
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Base, SessionLocal, engine  # noqa: E402
+from models import HealthData, HealthSeries, User  # noqa: E402
+import health_series  # noqa: E402
+import health_trend  # noqa: E402
+
+DAYS = 365
+ROWS_PER_DAY = 24          # health_data 行（体重、心率等低频上报）
+SERIES_PER_DAY = 1440      # 压缩序列中的分钟级心率
+RUNS = 20
+
+
+def seed(db):
+    user = User(name="bench", age=80, email=f"bench-{time.time_ns()}@example.com",
+                phone=str(time.time_ns()), hashed_password="-", role="provider")
+    db.add(user)
+    db.flush()
+
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = []
+    for d in range(DAYS):
+        day = today - timedelta(days=d)
+        for h in range(ROWS_PER_DAY):
+            rows.append({"user_id": user.id, "heart_rate": random.randint(55, 95),
+                         "weight": 60 + random.random(), "timestamp": day + timedelta(hours=h)})
+        points = [(day + timedelta(minutes=m), random.randint(55, 95)) for m in range(SERIES_PER_DAY)]
+        health_series.append_points(db, user.id, "heart_rate", points)
+    db.bulk_insert_mappings(HealthData, rows)
+    db.commit()
+    return user.id
+
+
+def cleanup(db, user_id):
+    db.query(HealthData).filter(HealthData.user_id == user_id).delete()
+    db.query(HealthSeries).filter(HealthSeries.user_id == user_id).delete()
+    db.query(User).filter(User.id == user_id).delete()
+    db.commit()
+
+
+def timed(fn, *args):
+    fn(*args)  # 预热
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        fn(*args)
+    return (time.perf_counter() - start) / RUNS * 1000
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user_id = seed(db)
+    try:
+        strategies = [("numpy", health_trend.trend_numpy)]
+        if engine.dialect.name == "postgresql":
+            strategies.insert(0, ("sql", health_trend.trend_sql))
+
+        print(f"{DAYS} 天数据：每天 {ROWS_PER_DAY} 行 + {SERIES_PER_DAY} 条压缩序列读数")
+        for metric in ("heart_rate", "weight"):
+            for days in (30, 90, 365):
+                results = [f"{name}={timed(fn, db, user_id, metric, days):.2f}ms" for name, fn in strategies]
+                print(f"  [{metric}] {days} 天：" + "  ".join(results))
+    finally:
+        cleanup(db, user_id)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
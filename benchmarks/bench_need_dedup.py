@@ -0,0 +1,104 @@
+# 重复需求检测基准：库里已有 N 条近期未接单需求时，新需求查重（LSH 桶查询 + 签名比较）与逐条计算 Jaccard 的对比，
+# 以及 LSH 的召回：对每条抽样需求做小改动后能否找回原需求
+# 用法：python benchmarks/bench_need_dedup.py
+#      默认使用临时 SQLite 文件；设置 DATABASE_URL 可指向其他测试库（会写入测试数据，结束时删除）
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/need_dedup.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert  # noqa: E402
+
+import need_dedup  # noqa: E402
+from database import Base, SessionLocal, engine  # noqa: E402
+from models import NeedLshBand, ServiceNeed, User  # noqa: E402
+
+NEEDS = 20000
+PROBES = int(os.getenv("PROBES", 200))
+
+ELDERS = "张王李赵刘陈杨黄周吴徐孙马朱胡郭何高林罗"
+SERVICES = ["陪同就医", "上门理发", "代买蔬菜", "打扫卫生", "陪同散步", "代取药品", "维修水管", "更换灯泡", "读报聊天", "洗澡护理"]
+PLACES = ["市第一医院", "社区卫生站", "中心菜市场", "区人民医院", "街道服务中心"]
+
+
+def make_need(rng, i):
+    service = rng.choice(SERVICES)
+    elder = rng.choice(ELDERS) + rng.choice("爷奶") * 2
+    text = f"{elder}需要{service}，地点在{rng.choice(PLACES)}附近，{rng.randint(1, 9)}号楼{rng.randint(1, 30)}0{rng.randint(1, 4)}室，编号{i}"
+    return service, text, f"幸福社区{rng.randint(1, 50)}号楼"
+
+
+def perturb(rng, text):
+    # 删掉一个字、替换一个字，模拟不同管理员对同一需求的不同写法
+    chars = list(text)
+    del chars[rng.randrange(len(chars))]
+    chars[rng.randrange(len(chars))] = "的"
+    return "".join(chars)
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    rng = random.Random(7)
+    tag = time.time_ns()
+    db.execute(insert(User), [dict(name="bench", age=30, email=f"bench-dd-{tag}@example.com", phone=f"dd{tag}",
+                                   hashed_password="-", role="admin")])
+    admin_id = db.query(User.id).filter(User.email == f"bench-dd-{tag}@example.com").scalar()
+
+    needs = [make_need(rng, i) for i in range(NEEDS)]
+    started = time.perf_counter()
+    signatures = [need_dedup.signature(*need) for need in needs]
+    print(f"计算 {NEEDS} 条签名：{(time.perf_counter() - started) * 1000:.0f} ms")
+    now = datetime.utcnow()
+    ids = db.execute(
+        insert(ServiceNeed.__table__).returning(ServiceNeed.__table__.c.id),
+        [dict(title=t, description=d, address=a, time="-", created_by=admin_id, created_at=now, status="open",
+              minhash=sig.tobytes()) for (t, d, a), sig in zip(needs, signatures)],
+    ).scalars().all()
+    ids.sort()
+    need_dedup.index_needs(db, ids, signatures)
+    db.commit()
+
+    probes = rng.sample(range(NEEDS), PROBES)
+    queries = [(t, perturb(rng, d), a) for t, d, a in (needs[i] for i in probes)]
+
+    started = time.perf_counter()
+    found = [need_dedup.find_duplicates(db, [(need_dedup.signature(*q), (None, None))])[0] for q in queries]
+    lsh_ms = (time.perf_counter() - started) * 1000 / PROBES
+    recall = sum(f == ids[i] for f, i in zip(found, probes)) / PROBES
+    print(f"LSH 查重：平均每条 {lsh_ms:.2f} ms，找回原需求 {recall:.1%}")
+
+    # 对照：逐条读出所有近期未接单需求，计算字符二元组 Jaccard
+    started = time.perf_counter()
+    brute_hits = 0
+    for q, i in zip(queries[:20], probes[:20]):
+        grams = set(need_dedup._shingles(" ".join(q)))
+        rows = db.query(ServiceNeed.id, ServiceNeed.title, ServiceNeed.description, ServiceNeed.address).filter(
+            ServiceNeed.status == "open").all()
+        best = max(rows, key=lambda r: jaccard(grams, set(need_dedup._shingles(f"{r.title} {r.description} {r.address}"))))
+        brute_hits += best.id == ids[i]
+    brute_ms = (time.perf_counter() - started) * 1000 / 20
+    print(f"逐条比对：平均每条 {brute_ms:.1f} ms（{lsh_ms and brute_ms / lsh_ms:.0f} 倍），找回 {brute_hits}/20")
+
+    distinct = [need_dedup.find_duplicates(db, [(need_dedup.signature(*make_need(rng, NEEDS + k)), (None, None))])[0]
+                for k in range(PROBES)]
+    print(f"新生成的需求（同一模板、不同老人 / 楼号）被标记为疑似重复：{sum(d is not None for d in distinct)}/{PROBES}")
+
+    db.query(NeedLshBand).filter(NeedLshBand.need_id.in_(ids)).delete(synchronize_session=False)
+    db.query(ServiceNeed).filter(ServiceNeed.id.in_(ids)).delete(synchronize_session=False)
+    db.query(User).filter(User.id == admin_id).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# 批量导入服务需求压测：生成 N 行 CSV，通过 /api/needs/import 一次导入，统计耗时
+# 用法：DATABASE_URL=postgresql://... python benchmarks/bench_need_import.py [行数]
+# 注意：会在目标库中写入测试需求和临时管理员，结束后删除；请使用测试库。
+import os
+import sys
+import time
+
+os.environ.setdefault("MATCHING_INTERVAL_SECONDS", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from models import ServiceNeed, User  # noqa: E402
+from security import create_access_token  # noqa: E402
+
+PERIODS = ["上午", "下午", "上午9点-11点", "下午2点到4点半", "晚上7点"]
+
+
+def make_csv(rows: int) -> bytes:
+    lines = ["标题,服务内容,服务地址,服务时间"]
+    for i in range(rows):
+        lines.append(f'助餐服务 {i},"送餐上门，少盐少油",幸福社区{i % 40}号楼,2030-06-{i % 28 + 1:02d} {PERIODS[i % len(PERIODS)]}')
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def main_bench():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    db = SessionLocal()
+    tag = time.time_ns()
+    admin = User(name="bench-admin", age=40, email=f"bench-import-{tag}@example.com",
+                 phone=f"i{tag}", hashed_password="-", role="admin")
+    db.add(admin)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': admin.email})}", "Content-Type": "text/csv"}
+
+    client = TestClient(main.app)
+    body = make_csv(rows)
+
+    def chunks(data):
+        # 模拟分块上传
+        for i in range(0, len(data), 64 * 1024):
+            yield data[i:i + 64 * 1024]
+
+    try:
+        client.post("/api/needs/import", content=chunks(make_csv(50)), headers=headers)  # 预热（地名库等）
+        start = time.perf_counter()
+        response = client.post("/api/needs/import", content=chunks(body), headers=headers)
+        elapsed = time.perf_counter() - start
+        result = response.json()
+        print(f"{rows} 行 CSV（{len(body) / 1024:.0f} KB）：{elapsed:.3f}s，"
+              f"成功 {result['created']} 行，失败 {result['failed']} 行")
+    finally:
+        db.query(ServiceNeed).filter(ServiceNeed.created_by == admin.id).delete()
+        db.query(User).filter(User.id == admin.id).delete()
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,71 @@
+# 路线规划基准：小规模与穷举最优解比较差距，30 个站点测耗时（目标 < 50 ms）
+# 用法：DATABASE_URL=sqlite:// python benchmarks/bench_route.py（只用纯数组接口，不访问数据库）
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import routing  # noqa: E402
+
+INSTANCES = 200
+
+
+def random_instance(rng: random.Random, stops: int, timed: bool):
+    # 出发点 + stops 个站点，散布在约 20km 见方的城区；一半站点带 2 小时时间窗，开始时间按站数铺满当天（每站约 1 小时）
+    lat = np.array([31.23 + rng.uniform(-0.1, 0.1) for _ in range(stops + 1)])
+    lng = np.array([121.47 + rng.uniform(-0.1, 0.1) for _ in range(stops + 1)])
+    windows = [None]
+    for _ in range(stops):
+        if timed and rng.random() < 0.5:
+            start = rng.randrange(0, stops) * 60
+            windows.append((float(start), float(start + 120)))
+        else:
+            windows.append(None)
+    return routing.distance_matrix(lat, lng), windows
+
+
+def brute_force(dist, windows):
+    n = len(dist)
+    return min(routing.route_cost(order, dist, windows)[0] for order in itertools.permutations(range(1, n)))
+
+
+def compare(stops: int, timed: bool):
+    rng = random.Random(stops * 2 + timed)
+    gaps, optimal = [], 0
+    for _ in range(INSTANCES):
+        dist, windows = random_instance(rng, stops, timed)
+        best = brute_force(dist, windows)
+        cost = routing.route_cost(routing.plan_route(dist, windows), dist, windows)[0]
+        gaps.append((cost - best) / best * 100 if best else 0.0)
+        optimal += cost <= best + 1e-6
+    label = "有时间窗" if timed else "无时间窗"
+    print(f"{stops:>3} 站 {label}：最优 {optimal}/{INSTANCES}，平均差距 {np.mean(gaps):.2f}%，最大差距 {max(gaps):.2f}%")
+
+
+def timing(stops: int, timed: bool, rounds: int = 50):
+    rng = random.Random(42)
+    samples = []
+    for _ in range(rounds):
+        dist, windows = random_instance(rng, stops, timed)
+        started = time.perf_counter()
+        routing.plan_route(dist, windows)
+        samples.append((time.perf_counter() - started) * 1000)
+    label = "有时间窗" if timed else "无时间窗"
+    print(f"{stops:>3} 站 {label}：平均 {np.mean(samples):.1f} ms，P95 {np.percentile(samples, 95):.1f} ms，"
+          f"最慢 {max(samples):.1f} ms")
+
+
+if __name__ == "__main__":
+    print("== 与穷举比较 ==")
+    for stops in (4, 6, 8):
+        for timed in (False, True):
+            compare(stops, timed)
+    print("== 耗时 ==")
+    for stops in (10, 20, routing.MAX_ROUTE_STOPS):
+        for timed in (False, True):
+            timing(stops, timed)
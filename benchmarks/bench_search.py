@@ -0,0 +1,79 @@
+# 全文检索基准：写入 N 条模拟的需求 / 反馈检索文档，统计不同查询词（常见 / 少见 / 单字 / 多词）的分页检索耗时
+# 用法：python benchmarks/bench_search.py [文档数，默认 1000000]
+#      默认使用临时 SQLite 文件（FTS5）；设置 DATABASE_URL 可指向 PostgreSQL 测试库（会写入测试数据，结束时删除）
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/search.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+import search  # noqa: E402
+from database import Base, SessionLocal, engine  # noqa: E402
+from models import SearchDocument  # noqa: E402
+
+DOC_ID_BASE = 900_000_000  # 测试文档的 id 从这里开始，避免和真实数据冲突
+ROUNDS = 20
+
+SURNAMES = "张王李赵刘陈杨黄周吴徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤"
+SERVICES = ["陪同就医", "上门理发", "代买蔬菜", "打扫卫生", "陪同散步", "代取药品", "维修水管", "更换灯泡", "读报聊天", "洗澡护理",
+            "做饭送餐", "康复训练", "测量血压", "整理衣物", "代缴水电费", "手机教学", "修剪指甲", "晾晒被褥"]
+PHRASES = ["服务很周到", "态度很好", "迟到了半小时", "准时到达", "非常耐心", "动作有点慢", "下次还找他", "沟通不太顺畅",
+           "老人很满意", "家属表示感谢", "工具带得很齐全", "提前电话联系", "没有按约定时间来", "做事认真细致", "说话很温和"]
+PLACES = ["幸福社区", "和平里", "光明小区", "朝阳花园", "滨江苑", "翠竹园", "青年路", "人民医院", "社区卫生站", "中心菜市场"]
+
+
+def make_text(rng):
+    elder = rng.choice(SURNAMES) + rng.choice(["奶奶", "爷爷", "阿姨", "大爷"])
+    body = "，".join(rng.sample(PHRASES, rng.randint(1, 3)))
+    return f"{elder} {rng.choice(SERVICES)} {body} {rng.choice(PLACES)}{rng.randint(1, 40)}号楼"
+
+
+def timed(fn):
+    samples = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, float(np.median(samples)), float(np.percentile(samples, 95))
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    rng = random.Random(7)
+
+    started = time.perf_counter()
+    chunk = 10000
+    for start in range(0, total, chunk):
+        docs = [
+            (search.DOC_FEEDBACK if i % 2 else search.DOC_NEED, DOC_ID_BASE + i, make_text(rng))
+            for i in range(start, min(start + chunk, total))
+        ]
+        search.index_documents(db, docs)
+        db.commit()
+    print(f"写入 {total} 条检索文档：{time.perf_counter() - started:.1f} s")
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("ANALYZE search_documents"))
+        db.commit()
+
+    for q, types in [("迟到", search.DOC_TYPES), ("态度很好", (search.DOC_FEEDBACK,)), ("龚奶奶", search.DOC_TYPES),
+                     ("晾晒被褥 翠竹园", search.DOC_TYPES), ("覃", search.DOC_TYPES), ("没有按约定时间来", search.DOC_TYPES)]:
+        search.search(db, q, types)  # 预热统计缓存
+        (hits, has_more), median, p95 = timed(lambda: search.search(db, q, types))
+        _, median10, _ = timed(lambda: search.search(db, q, types, page=10))
+        print(f"{q:<12} 第 1 页 {len(hits)} 条，中位数 {median:.1f} ms，p95 {p95:.1f} ms；第 10 页中位数 {median10:.1f} ms")
+
+    db.query(SearchDocument).filter(SearchDocument.doc_id >= DOC_ID_BASE).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
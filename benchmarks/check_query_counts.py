@@ -0,0 +1,179 @@
+# 各接口的 SQL 条数检查：数据量从少到多，每个接口的查询条数必须保持不变（没有 N+1），且不能触发懒加载
+# 用法：python benchmarks/check_query_counts.py
+#      默认使用临时 SQLite 文件；设置 DATABASE_URL 可指向其他测试库（会写入测试数据，结束时通过删除用户接口清理）
+# 任一接口不满足时以非 0 状态退出；tests/test_query_counts.py 会在 pytest 里以两种数据库模式各跑一次。
+# 开始前先做一次冷启动并发检查：进程内缓存全空时同时发多个请求，不能互相卡死（异步模式下等锁会卡住整个事件循环）
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/query_counts.db")
+os.environ["SQL_QUERY_GUARD"] = "1"
+os.environ.setdefault("MATCHING_INTERVAL_SECONDS", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import geo  # noqa: E402
+import main  # noqa: E402
+from database import SessionLocal, async_engine  # noqa: E402
+from need_cache import open_needs_cache  # noqa: E402
+from models import Feedback, Gazetteer, ServiceNeed, Task, User  # noqa: E402
+from security import create_access_token  # noqa: E402
+
+# 冷启动检查的并发请求数，以及等它们全部完成的最长时间（秒）
+COLD_START_CLIENTS = 8
+COLD_START_TIMEOUT = 60
+
+# 每轮之间追加的已完成任务数（每个任务带一条反馈）；第一轮只用于预热进程内缓存（地名库、空间索引），不参与比较
+ROUNDS = (1, 2, 20)
+
+
+def seed_users(db, tag):
+    admin = User(name="qc-admin", age=40, email=f"qc-admin-{tag}@example.com",
+                 phone=f"qa{tag}", hashed_password="-", role="admin")
+    provider = User(name="qc-provider", age=30, email=f"qc-provider-{tag}@example.com",
+                    phone=f"qp{tag}", hashed_password="-", role="provider", lat=31.23, lng=121.47)
+    db.add_all([admin, provider])
+    if db.query(Gazetteer).filter(Gazetteer.name == "查询计数测试地址").first() is None:
+        db.add(Gazetteer(name="查询计数测试地址", lat=31.23, lng=121.47))
+    db.commit()
+    return admin, provider
+
+
+def seed_tasks(db, admin_id, provider_id, count):
+    for i in range(count):
+        need = ServiceNeed(title=f"查询计数 {i}", description="-", address="测试地址", time="明天上午",
+                           status="accepted", created_by=admin_id, lat=31.23, lng=121.47)
+        db.add(need)
+        db.flush()
+        task = Task(need_id=need.id, provider_id=provider_id, status="completed")
+        db.add(task)
+        db.flush()
+        db.add(Feedback(task_id=task.id, elder_name="张阿姨", comment="很好", rating=5))
+    db.commit()
+
+
+def open_need(db, admin_id):
+    need = ServiceNeed(title="待接单", description="-", address="测试地址", time="后天下午3点",
+                       status="open", created_by=admin_id, lat=31.23, lng=121.47)
+    db.add(need)
+    db.commit()
+    return need.id
+
+
+def measure(client, method, path, headers, **kwargs):
+    response = client.request(method, path, headers=headers, **kwargs)
+    if response.status_code >= 400:
+        raise AssertionError(f"{method} {path} -> {response.status_code} {response.text}")
+    return int(response.headers["X-Query-Count"]), response
+
+
+# ✅ 清空地名库、空间索引和未接单列表缓存后并发发布需求、拉取列表，全部请求都要在限定时间内完成。
+# 卡住时事件循环本身停住了，超时只能在另一个线程里判断
+def check_cold_start(admin_headers) -> bool:
+    geo.reset_gazetteer()
+    open_needs_cache.invalidate()
+    statuses = []
+
+    async def burst():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            requests = [
+                client.post("/api/needs/", headers=admin_headers, json={
+                    "title": f"冷启动 {i}", "description": "-", "address": "查询计数测试地址", "time": "明天上午"})
+                for i in range(COLD_START_CLIENTS)
+            ] + [client.get("/api/needs/") for _ in range(COLD_START_CLIENTS)]
+            statuses.extend(response.status_code for response in await asyncio.gather(*requests))
+        if async_engine is not None:
+            await async_engine.dispose()  # 连接绑定在这个事件循环上，后面的 TestClient 换了循环会重新建连
+
+    worker = threading.Thread(target=asyncio.run, args=(burst(),), daemon=True)
+    worker.start()
+    worker.join(COLD_START_TIMEOUT)
+    if worker.is_alive():
+        # 卡住的请求还占着锁，后面的检查也跑不下去，直接退出
+        print(f"❌ 冷启动并发 {2 * COLD_START_CLIENTS} 个请求 {COLD_START_TIMEOUT}s 内没有全部完成（疑似死锁）")
+        sys.exit(1)
+    if len(statuses) != 2 * COLD_START_CLIENTS or any(status >= 400 for status in statuses):
+        print(f"❌ 冷启动并发请求失败：{statuses}")
+        return False
+    print(f"✅ 冷启动并发 {len(statuses)} 个请求全部完成")
+    return True
+
+
+def run_round(client, db, admin, provider, admin_headers, provider_headers):
+    counts = {}
+
+    def record(name, method, path, headers, **kwargs):
+        counts[name], response = measure(client, method, path, headers, **kwargs)
+        return response
+
+    need_id = open_need(db, admin.id)
+    task = record("POST /api/tasks/", "POST", "/api/tasks/", provider_headers, json={"need_id": need_id}).json()
+    record("PUT /api/tasks/complete/{id}", "PUT", f"/api/tasks/complete/{task['id']}", provider_headers)
+    batch = [measure(client, "POST", "/api/tasks/", provider_headers, json={"need_id": open_need(db, admin.id)})[1].json()["id"]
+             for _ in range(3)]
+    record("PUT /api/tasks/complete（批量 3 个）", "PUT", "/api/tasks/complete", provider_headers, json={"task_ids": batch})
+    record("GET /api/tasks/my", "GET", "/api/tasks/my", provider_headers)
+    record("GET /api/tasks/completed", "GET", "/api/tasks/completed", admin_headers)
+    record("GET /api/tasks/by-provider/{id}", "GET", f"/api/tasks/by-provider/{provider.id}", admin_headers)
+    record("GET /api/tasks/feedbacks", "GET", "/api/tasks/feedbacks", admin_headers)
+    record("GET /api/feedback/mine", "GET", "/api/feedback/mine", provider_headers)
+    record("GET /api/feedback/all", "GET", "/api/feedback/all", admin_headers)
+    record("GET /api/feedback/by-provider/{id}", "GET", f"/api/feedback/by-provider/{provider.id}", admin_headers)
+    record("GET /api/needs/ (window)", "GET", "/api/needs/", None,
+           params={"window_start": "2000-01-01T00:00:00", "window_end": "2100-01-01T00:00:00"})
+    record("POST /api/needs/", "POST", "/api/needs/", admin_headers,
+           json={"title": "附近需求", "description": "-", "address": "查询计数测试地址", "time": "明天上午"})
+    record("GET /api/needs/nearby", "GET", "/api/needs/nearby", None, params={"lat": 31.23, "lng": 121.47})
+    return counts
+
+
+def main_check():
+    client = TestClient(main.app)
+    db = SessionLocal()
+    tag = time.time_ns()
+    admin, provider = seed_users(db, tag)
+    admin_headers = {"Authorization": f"Bearer {create_access_token({'sub': admin.email})}"}
+    provider_headers = {"Authorization": f"Bearer {create_access_token({'sub': provider.email})}"}
+
+    results = []
+    failed = not check_cold_start(admin_headers)
+    try:
+        for batch in ROUNDS:
+            seed_tasks(db, admin.id, provider.id, batch)
+            results.append(run_round(client, db, admin, provider, admin_headers, provider_headers))
+    except AssertionError as e:
+        print(f"❌ {e}")
+        failed = True
+
+    results = results[1:]
+    if results:
+        print(f"{'接口':<40}" + "".join(f"{'第' + str(i + 2) + '轮':>8}" for i in range(len(results))))
+        for name in results[0]:
+            row = [r.get(name) for r in results]
+            stable = len(set(row)) == 1
+            failed |= not stable
+            print(f"{name:<40}" + "".join(f"{c:>8}" for c in row) + ("" if stable else "  ❌ 随数据量增长"))
+
+    try:
+        count, _ = measure(client, "DELETE", f"/users/{provider.id}", None)
+        print(f"{'DELETE /users/{id}（级联删除）':<40}{count:>8}")
+        measure(client, "DELETE", f"/users/{admin.id}", None)
+    except AssertionError as e:
+        print(f"❌ {e}")
+        failed = True
+    db.close()
+
+    if failed:
+        sys.exit(1)
+    print("✅ 所有接口查询条数与数据量无关，且没有懒加载")
+
+
+if __name__ == "__main__":
+    main_check()
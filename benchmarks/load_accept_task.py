@@ -0,0 +1,100 @@
+# 并发抢单压测：200 个服务者同时接同一个需求，必须恰好一人成功
+# 用法：DATABASE_URL=postgresql://... python benchmarks/load_accept_task.py [并发数]
+#      设置 BASE_URL=http://127.0.0.1:8000 时压测运行中的服务（DATABASE_URL 需指向同一个库），
+#      否则在进程内用 TestClient 发请求。
+# 注意：会在目标库中创建临时用户和需求，结束后删除；请使用测试库。
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Base, SessionLocal, engine  # noqa: E402
+from models import ServiceNeed, Task, User  # noqa: E402
+from security import create_access_token  # noqa: E402
+
+
+def make_client():
+    base_url = os.getenv("BASE_URL")
+    if base_url:
+        import httpx
+        return httpx.Client(base_url=base_url, timeout=60)
+    from fastapi.testclient import TestClient
+    import main
+    return TestClient(main.app)
+
+
+def seed(db, clients: int):
+    tag = time.time_ns()
+    admin = User(name="bench-admin", age=40, email=f"bench-admin-{tag}@example.com",
+                 phone=f"a{tag}", hashed_password="-", role="admin")
+    providers = [
+        User(name=f"bench-{i}", age=30, email=f"bench-{tag}-{i}@example.com",
+             phone=f"p{tag}-{i}", hashed_password="-", role="provider")
+        for i in range(clients)
+    ]
+    db.add(admin)
+    db.add_all(providers)
+    db.flush()
+    need = ServiceNeed(title="压测需求", description="并发抢单压测", address="测试地址",
+                       time="今天", status="open", created_by=admin.id)
+    db.add(need)
+    db.commit()
+    return admin.id, [p.id for p in providers], [p.email for p in providers], need.id
+
+
+def cleanup(db, admin_id, provider_ids, need_id):
+    db.query(Task).filter(Task.need_id == need_id).delete()
+    db.query(ServiceNeed).filter(ServiceNeed.id == need_id).delete()
+    db.query(User).filter(User.id.in_(provider_ids + [admin_id])).delete(synchronize_session=False)
+    db.commit()
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    admin_id, provider_ids, emails, need_id = seed(db, clients)
+    tokens = [create_access_token({"sub": email}) for email in emails]
+
+    barrier = threading.Barrier(clients)
+    statuses = [None] * clients
+    latencies = [0.0] * clients
+
+    def worker(i):
+        client = make_client()
+        headers = {"Authorization": f"Bearer {tokens[i]}"}
+        barrier.wait()
+        start = time.perf_counter()
+        statuses[i] = client.post("/api/tasks/", json={"need_id": need_id}, headers=headers).status_code
+        latencies[i] = time.perf_counter() - start
+
+    try:
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        db.expire_all()
+        task_count = db.query(Task).filter(Task.need_id == need_id).count()
+        need_status = db.query(ServiceNeed.status).filter(ServiceNeed.id == need_id).scalar()
+        latencies.sort()
+        print(f"{clients} 个并发请求，用时 {elapsed:.2f}s")
+        print(f"  状态码分布：{dict(Counter(statuses))}")
+        print(f"  p50={latencies[len(latencies) // 2] * 1000:.1f}ms  p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms")
+        print(f"  该需求的任务数：{task_count}，需求状态：{need_status}")
+        assert Counter(statuses)[200] == 1, "应当恰好一个请求接单成功"
+        assert task_count == 1, "同一需求只能有一个任务"
+        print("✅ 无重复派单")
+    finally:
+        cleanup(db, admin_id, provider_ids, need_id)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
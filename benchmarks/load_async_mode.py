@@ -0,0 +1,183 @@
+# 同步 / 异步数据库模式压测对比：分别以 DB_ASYNC=0、DB_ASYNC=1 启动 uvicorn（单进程），
+# 500 个并发客户端持续请求读接口（我的任务 / 反馈列表 / 服务者统计），统计吞吐量和 p50 / p99 延迟；
+# 再混入计算密集的今日路线规划（/api/tasks/my/route）压一轮，检查计算期间读接口不会被卡住
+# 用法：DATABASE_URL=postgresql://... python benchmarks/load_async_mode.py [并发数，默认 500] [每种模式压测秒数，默认 20]
+# 注意：会在目标库中创建临时用户、需求、任务和反馈，结束后删除；请使用测试库。
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+
+from database import Base, SessionLocal, engine  # noqa: E402
+from models import Feedback, ServiceNeed, Task, User  # noqa: E402
+from security import create_access_token  # noqa: E402
+import service_time  # noqa: E402
+
+PROVIDERS = 50
+TASKS_PER_PROVIDER = 20
+# 每个服务者今天进行中、带坐标的任务数（路线规划的站点数）
+ROUTE_STOPS = 25
+PORT = 8765
+# 单个请求最长等待（秒），超时记为失败
+REQUEST_TIMEOUT = 30
+
+
+def seed(db):
+    tag = time.time_ns()
+    admin = User(name="bench-admin", age=40, email=f"bench-admin-{tag}@example.com",
+                 phone=f"a{tag}", hashed_password="-", role="admin")
+    providers = [
+        User(name=f"bench-{i}", age=30, email=f"bench-{tag}-{i}@example.com",
+             phone=f"p{tag}-{i}", hashed_password="-", role="provider", lat=31.23, lng=121.47)
+        for i in range(PROVIDERS)
+    ]
+    db.add(admin)
+    db.add_all(providers)
+    db.flush()
+    now = datetime.utcnow()
+    needs = [
+        ServiceNeed(title="压测需求", description="读接口压测", address="测试地址", time="今天",
+                    status="completed", created_by=admin.id)
+        for _ in range(PROVIDERS * TASKS_PER_PROVIDER)
+    ]
+    today = service_time.local_now().replace(hour=8, minute=0, second=0, microsecond=0)
+    route_needs = [
+        ServiceNeed(title="压测上门", description="路线规划压测", address="测试地址", time="今天",
+                    status="accepted", created_by=admin.id,
+                    lat=31.23 + (i * 37 % 101) / 1000, lng=121.47 + (i * 53 % 97) / 1000,
+                    start_at=today + timedelta(minutes=i % ROUTE_STOPS * 20),
+                    end_at=today + timedelta(minutes=i % ROUTE_STOPS * 20 + 90))
+        for i in range(PROVIDERS * ROUTE_STOPS)
+    ]
+    db.add_all(needs + route_needs)
+    db.flush()
+    tasks = [
+        Task(need_id=need.id, provider_id=providers[i % PROVIDERS].id, status="completed", accepted_at=now)
+        for i, need in enumerate(needs)
+    ]
+    db.add_all(tasks)
+    db.add_all([
+        Task(need_id=need.id, provider_id=providers[i // ROUTE_STOPS].id, status="ongoing", accepted_at=now)
+        for i, need in enumerate(route_needs)
+    ])
+    db.flush()
+    db.add_all([
+        Feedback(task_id=task.id, elder_name="老人", comment="压测反馈", rating=i % 5 + 1,
+                 created_at=now - timedelta(minutes=i))
+        for i, task in enumerate(tasks)
+    ])
+    db.commit()
+    return admin, providers, [need.id for need in needs + route_needs]
+
+
+def cleanup(db, admin, providers, need_ids):
+    task_ids = [task_id for (task_id,) in db.query(Task.id).filter(Task.need_id.in_(need_ids))]
+    db.query(Feedback).filter(Feedback.task_id.in_(task_ids)).delete(synchronize_session=False)
+    db.query(Task).filter(Task.id.in_(task_ids)).delete(synchronize_session=False)
+    db.query(ServiceNeed).filter(ServiceNeed.id.in_(need_ids)).delete(synchronize_session=False)
+    db.query(User).filter(User.id.in_([p.id for p in providers] + [admin.id])).delete(synchronize_session=False)
+    db.commit()
+
+
+def start_server(async_mode: bool) -> subprocess.Popen:
+    env = dict(os.environ, DB_ASYNC="1" if async_mode else "0",
+               MATCHING_INTERVAL_SECONDS="0", NEED_SWEEP_INTERVAL_SECONDS="0")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("服务启动超时")
+
+
+async def run_load(requests, clients: int, duration: float):
+    latencies, statuses = [], Counter()
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=REQUEST_TIMEOUT) as client:
+        stop_at = time.perf_counter() + duration
+
+        async def worker(i):
+            n = i
+            while time.perf_counter() < stop_at:
+                path, headers = requests[n % len(requests)]
+                n += clients
+                start = time.perf_counter()
+                try:
+                    statuses[(await client.get(path, headers=headers)).status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(clients)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "statuses": dict(statuses),
+    }
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    admin, providers, need_ids = seed(db)
+    admin_headers = {"Authorization": f"Bearer {create_access_token({'sub': admin.email})}"}
+    requests, mixed = [], []
+    for provider in providers:
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': provider.email})}"}
+        reads = [
+            ("/api/tasks/my", headers),
+            (f"/api/tasks/stats/{provider.id}", admin_headers),
+            (f"/api/feedback/all?provider_id={provider.id}&limit=20", admin_headers),
+        ]
+        requests.extend(reads)
+        # 混合场景：每 4 个请求里有 1 个路线规划
+        mixed.extend(reads + [("/api/tasks/my/route", headers)])
+    scenarios = (("读接口", requests), ("混入路线规划", mixed))
+
+    try:
+        print(f"{clients} 个并发客户端，每种模式 {duration:.0f}s")
+        print(f"{'场景':<10}{'模式':<8}{'请求数':>10}{'吞吐(req/s)':>14}{'p50(ms)':>10}{'p99(ms)':>10}  状态码")
+        for async_mode in (False, True):
+            server = start_server(async_mode)
+            try:
+                asyncio.run(run_load(mixed, 10, 2))  # 低并发预热连接池和缓存
+                results = [(name, asyncio.run(run_load(reqs, clients, duration))) for name, reqs in scenarios]
+            finally:
+                server.terminate()
+                try:
+                    server.wait(10)
+                except subprocess.TimeoutExpired:  # 同步模式压垮后还有卡住的请求，优雅退出会一直等
+                    server.kill()
+                    server.wait()
+            for name, result in results:
+                print(f"{name:<10}{'异步' if async_mode else '同步':<8}{result['requests']:>10}{result['rps']:>14.0f}"
+                      f"{result['p50']:>10.1f}{result['p99']:>10.1f}  {result['statuses']}")
+    finally:
+        cleanup(db, admin, providers, need_ids)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
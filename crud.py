@@ -1,9 +1,26 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, selectinload
 from fastapi import HTTPException
 from passlib.context import CryptContext
 
-from models import User, Appointment, HealthData
-from schemas import UserRegister, AppointmentCreate, HealthDataCreate
+import hashlib
+from collections import defaultdict
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from database import dialect_insert
+from models import User, Appointment, HealthData, ServiceNeed, Task, Feedback
+from schemas import UserRegister, AppointmentCreate, HealthDataCreate, ServiceNeedCreate, ServiceNeedOut, FeedbackCreate
+import events
+import geo
+import health_series
+import health_validation
+import need_dedup
+import ratings
+import search
+import service_time
+import task_log
 
 from passlib.context import CryptContext
 
@@ -44,7 +61,9 @@ def create_user(db: Session, user: UserRegister):
         email=user.email,
         phone=user.phone,
         hashed_password=hashed,
-        role=user.role or "provider"
+        role=user.role or "provider",
+        lat=user.lat,
+        lng=user.lng
     )
     db.add(db_user)
     db.commit()
@@ -82,7 +101,20 @@ def get_user(db: Session, user_id: int):
 
 # 删除用户
 def delete_user(db: Session, user_id: int):
-    db_user = db.query(User).filter(User.id == user_id).first()
+    # 级联删除需要用到的关联数据一次性批量加载，避免逐条懒加载
+    db_user = (
+        db.query(User)
+        .options(
+            selectinload(User.appointments),
+            selectinload(User.health_data),
+            selectinload(User.health_series),
+            selectinload(User.service_needs).selectinload(ServiceNeed.task),
+            selectinload(User.tasks).selectinload(Task.feedback),
+            selectinload(User.availability),
+        )
+        .filter(User.id == user_id)
+        .first()
+    )
     if db_user:
         db.delete(db_user)
         db.commit()
@@ -124,15 +156,332 @@ def delete_appointment(db: Session, appointment_id: int):
     return db_appointment
 
 
-# 创建健康数据
+# 计算健康数据去重键：优先用客户端读数 id，否则对 user_id + 采集时间（统一换算成 UTC，同一时刻不同时区写法得到同一个键）+ 各指标取哈希；
+# 没有采集时间（由服务器打时间戳）的读数无法判断是否为重传，不参与去重
+def health_dedup_key(item: HealthDataCreate) -> Optional[str]:
+    if item.reading_id:
+        raw = f"{item.user_id}|id|{item.reading_id}"
+    elif item.timestamp is not None:
+        raw = "|".join(str(v) for v in (
+            item.user_id, health_series.to_naive_utc(item.timestamp).isoformat(), item.heart_rate,
+            item.blood_pressure, item.blood_sugar, item.weight, item.steps,
+        ))
+    else:
+        return None
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# 创建健康数据（重传的读数命中唯一索引后直接返回已有记录）
 def create_health_data(db: Session, health_data: HealthDataCreate):
-    db_health = HealthData(**health_data.dict())
-    db.add(db_health)
+    values = health_data.dict(exclude_none=True, exclude={"reading_id"})
+    if "timestamp" in values:
+        values["timestamp"] = health_series.to_naive_utc(values["timestamp"])
+    dedup_key = health_dedup_key(health_data)
+    if dedup_key is None:
+        db_health = HealthData(**values)
+        db.add(db_health)
+        db.commit()
+        db.refresh(db_health)
+        return db_health
+
+    stmt = (
+        dialect_insert(db, HealthData)
+        .values(dedup_key=dedup_key, **values)
+        .on_conflict_do_nothing(index_elements=["dedup_key"])
+        .returning(HealthData)
+    )
+    db_health = db.scalars(stmt).first()
+    if db_health is None:
+        db_health = db.query(HealthData).filter(HealthData.dedup_key == dedup_key).first()
     db.commit()
     db.refresh(db_health)
     return db_health
 
 
-# 获取健康数据
+# 批量创建健康数据：先整批做生理范围校验，不合理的行跳过并在结果中报告；
+# 高频指标写入压缩序列（同一秒的读数自动去重），其余指标按行批量插入，重传的行由唯一索引跳过
+def create_health_data_batch(db: Session, items: List[HealthDataCreate]):
+    now = datetime.utcnow()
+    series_points = defaultdict(list)  # {(user_id, metric): [(timestamp, value)]}
+    rows = []
+
+    reject_mask = health_validation.validate_batch(items)
+    for item, rejected in zip(items, reject_mask.tolist()):
+        if rejected:
+            continue
+        data = item.dict(exclude_none=True, exclude={"reading_id"})
+        timestamp = health_series.to_naive_utc(data.pop("timestamp", None)) or now
+        for metric in health_series.SERIES_METRICS:
+            value = data.pop(metric, None)
+            if value is not None:
+                series_points[(item.user_id, metric)].append((timestamp, value))
+        if len(data) > 1:  # 除 user_id 外还有其他指标
+            rows.append(dict(
+                {"blood_pressure": None, "blood_sugar": None, "weight": None},
+                timestamp=timestamp, dedup_key=health_dedup_key(item), **data,
+            ))
+
+    series_count = 0
+    for (user_id, metric), points in series_points.items():
+        series_count += health_series.append_points(db, user_id, metric, points)
+
+    stored = 0
+    if rows:
+        stmt = (
+            dialect_insert(db, HealthData)
+            .on_conflict_do_nothing(index_elements=["dedup_key"])
+            .returning(HealthData.id)
+        )
+        stored = len(db.execute(stmt, rows).all())
+    db.commit()
+    return {
+        "stored_rows": stored,
+        "duplicate_rows": len(rows) - stored,
+        "series_points": series_count,
+        "rejected": health_validation.rejection_report(reject_mask),
+    }
+
+
+# 获取健康数据（合并普通行和解码后的压缩序列，按时间排序）
 def get_health_data(db: Session, user_id: int):
-    return db.query(HealthData).filter(HealthData.user_id == user_id).all()
+    records = db.query(HealthData).filter(HealthData.user_id == user_id).all()
+
+    # 同一时刻的心率、步数合并成一条记录返回，字段与 HealthData 保持一致
+    merged = {}
+    for timestamp, metric, value in health_series.load_points(db, user_id):
+        record = merged.get(timestamp)
+        if record is None:
+            record = merged[timestamp] = HealthData(
+                id=None, user_id=user_id, heart_rate=None, blood_pressure=None,
+                blood_sugar=None, weight=None, steps=None, timestamp=timestamp,
+            )
+        setattr(record, metric, value)
+
+    records.extend(merged.values())
+    records.sort(key=lambda r: r.timestamp or datetime.min)
+    return records
+
+
+# 服务者接单：用带条件的 UPDATE ... RETURNING 原子地抢占需求，并发接单时只有一个人能成功，
+# tasks.need_id 上的唯一约束兜底，保证不会重复派单；抢占后在同一事务里检查与在手任务的时间冲突，冲突则整体回滚
+# actor_id 为执行接单的人（服务者自己，或按派单方案派单的管理员），记入任务事件日志
+def accept_need(db: Session, need_id: int, provider_id: int, actor_id: Optional[int] = None):
+    window = db.query(ServiceNeed.start_at, ServiceNeed.end_at).filter(ServiceNeed.id == need_id).first()
+    timed = window is not None and window.start_at is not None
+    if timed:
+        # 先锁住服务者的用户行，同一服务者的并发接单在这里排队（PostgreSQL）；
+        # SQLite 没有行锁，但写事务本身串行，下面在插入任务之后做的冲突检查能看到先提交的那一单
+        db.query(User.id).filter(User.id == provider_id).with_for_update().first()
+
+    claimed = db.execute(
+        update(ServiceNeed)
+        .where(ServiceNeed.id == need_id, ServiceNeed.status == "open")
+        .values(status="accepted")
+        .returning(ServiceNeed.id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if claimed is None:
+        db.rollback()
+        # 只有抢占失败时才多查一次，区分“不存在”“已过期”和“已被接单”
+        current = db.query(ServiceNeed.status).filter(ServiceNeed.id == need_id).first()
+        if current is None:
+            raise HTTPException(status_code=404, detail="该服务需求不存在")
+        if current.status == "expired":
+            raise HTTPException(status_code=400, detail="该服务需求已过期")
+        raise HTTPException(status_code=400, detail="该服务需求已被接单")
+
+    task = Task(
+        need_id=need_id,
+        provider_id=provider_id,
+        accepted_at=datetime.utcnow(),
+        status="ongoing"
+    )
+    db.add(task)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="该服务需求已被接单")
+
+    # 服务时间与该服务者其他进行中的任务重叠时不允许接单（时间未能解析的需求不做检查），在同一事务里回滚抢占
+    if timed:
+        conflict = (
+            db.query(Task.id)
+            .join(ServiceNeed, Task.need_id == ServiceNeed.id)
+            .filter(
+                Task.provider_id == provider_id,
+                Task.status == "ongoing",
+                Task.id != task.id,
+                ServiceNeed.start_at < window.end_at,
+                ServiceNeed.end_at > window.start_at,
+            )
+            .first()
+        )
+        if conflict is not None:
+            db.rollback()
+            raise HTTPException(status_code=400, detail="该需求的服务时间与您进行中的任务冲突")
+
+    task_log.record(db, task_log.TASK_ACCEPTED, task, actor_id if actor_id is not None else provider_id)
+    db.commit()
+    geo.need_index.discard(need_id)
+    # 返回值会按 TaskOut 序列化（嵌套 need），这里一并加载
+    task = db.query(Task).options(joinedload(Task.need)).filter(Task.id == task.id).one()
+    events.bus.publish(events.NEED_ACCEPTED, {"need_id": need_id, "task_id": task.id, "provider_id": provider_id})
+    return task
+
+
+# 提交反馈（/api/feedback/{task_id} 和 /api/tasks/feedback/{task_id} 共用）：只查任务的几个列做校验，
+# 插入用 ON CONFLICT (task_id) DO NOTHING RETURNING，feedbacks.task_id 的唯一约束保证并发提交也只会有一条；
+# 任务事件、服务者统计、检索索引与反馈在同一事务里写入
+def create_feedback(db: Session, task_id: int, data: FeedbackCreate, actor_id: int):
+    task = db.query(Task.id, Task.need_id, Task.provider_id, Task.status).filter(Task.id == task_id).first()
+    if task is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if task.status != "completed":
+        raise HTTPException(status_code=400, detail="任务未完成，无法反馈")
+
+    stmt = (
+        dialect_insert(db, Feedback)
+        .values(task_id=task_id, elder_name=data.elder_name, comment=data.comment, rating=data.rating,
+                created_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=["task_id"])
+        .returning(Feedback)
+    )
+    feedback = db.scalars(stmt).first()
+    if feedback is None:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="该任务已存在反馈")
+
+    task_log.record(db, task_log.TASK_FEEDBACK, task, actor_id, {"rating": data.rating})
+    search.index_documents(db, [(search.DOC_FEEDBACK, feedback.id, search.feedback_text(data.elder_name, data.comment))])
+    db.commit()
+    ratings.leaderboard.update(db, task.provider_id)
+    return feedback
+
+
+# 完成任务失败的原因 -> (HTTP 状态码, 提示)
+COMPLETE_FAILURES = {
+    "not_found": (404, "任务不存在"),
+    "forbidden": (403, "无权修改他人任务"),
+    "already_completed": (400, "该任务已完成"),
+}
+
+
+# 服务者批量完成任务：一条带条件的 UPDATE ... WHERE provider_id=? AND status='ongoing' RETURNING 同时完成校验和更新，
+# 并发重复提交时只有一次生效；未更新的任务再用一次查询区分原因。
+# 返回 (已完成的 [(task_id, need_id)], {task_id: 失败原因})，已在同一事务中记录任务事件并提交
+def complete_tasks(db: Session, provider_id: int, task_ids: List[int]):
+    completed = db.execute(
+        update(Task)
+        .where(Task.id.in_(task_ids), Task.provider_id == provider_id, Task.status == "ongoing")
+        .values(status="completed")
+        .returning(Task.id, Task.need_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    done = {task_id for task_id, _ in completed}
+
+    failures = {}
+    rest = [task_id for task_id in task_ids if task_id not in done]
+    if rest:
+        found = {
+            row.id: row
+            for row in db.query(Task.id, Task.provider_id, Task.status).filter(Task.id.in_(rest)).all()
+        }
+        for task_id in rest:
+            row = found.get(task_id)
+            if row is None:
+                failures[task_id] = "not_found"
+            elif row.provider_id != provider_id:
+                failures[task_id] = "forbidden"
+            else:
+                failures[task_id] = "already_completed"
+
+    if completed:
+        db.execute(
+            update(ServiceNeed)
+            .where(ServiceNeed.id.in_([need_id for _, need_id in completed]))
+            .values(status="completed")
+            .execution_options(synchronize_session=False)
+        )
+        task_log.record_many(
+            db, task_log.TASK_COMPLETED,
+            [(task_id, need_id, provider_id) for task_id, need_id in completed], provider_id,
+        )
+    db.commit()
+    for task_id, need_id in completed:
+        events.bus.publish(events.NEED_COMPLETED, {"need_id": need_id, "task_id": task_id, "provider_id": provider_id})
+    return [tuple(row) for row in completed], failures
+
+
+# 每条 INSERT 的行数（SQLite 单条语句最多 32766 个参数，每行 13 列）
+NEED_INSERT_CHUNK = 1000
+
+
+# 批量发布服务需求：逐行解析服务时间和地址坐标，再一次性批量插入（多行 VALUES ... RETURNING），最后只发布一条批量事件。
+# rows 为 [(行号, 数据)]，返回 (成功行报告, 失败行报告)
+def create_needs_bulk(db: Session, rows: List[Tuple[int, ServiceNeedCreate]], created_by: int):
+    now = datetime.utcnow()
+    values, line_numbers, signatures, errors = [], [], [], []
+    for line_no, data in rows:
+        try:
+            start_at, end_at = service_time.resolve_window(data.time, data.start_at, data.end_at)
+        except HTTPException as e:
+            errors.append({"row": line_no, "status": "error", "errors": [e.detail]})
+            continue
+        coords = geo.geocode(db, data.address)
+        signature = need_dedup.signature(data.title, data.description, data.address)
+        values.append(dict(
+            title=data.title,
+            description=data.description,
+            address=data.address,
+            time=data.time,
+            start_at=start_at,
+            end_at=end_at,
+            created_by=created_by,
+            created_at=now,
+            status="open",
+            lat=coords[0] if coords else None,
+            lng=coords[1] if coords else None,
+            minhash=signature.tobytes(),
+        ))
+        line_numbers.append(line_no)
+        signatures.append(signature)
+
+    if not values:
+        return [], errors
+
+    # 整批一次查重（只和库里已有的需求比，同一文件内的行之间不互相比较）
+    duplicates = need_dedup.find_duplicates(db, [(sig, (v["start_at"], v["end_at"])) for sig, v in zip(signatures, values)])
+    for value, duplicate_of in zip(values, duplicates):
+        value["duplicate_of"] = duplicate_of
+
+    # executemany + RETURNING 由 SQLAlchemy 自动改写为多行 VALUES（每批 NEED_INSERT_CHUNK 行）。
+    # PostgreSQL 上要求按参数顺序返回 id（仍是批量语句）；SQLite 按 VALUES 顺序分配 rowid，
+    # 但按参数顺序返回会退化成逐行插入，所以直接对 id 排序
+    ordered = db.get_bind().dialect.name == "postgresql"
+    result = db.execute(
+        insert(ServiceNeed.__table__).returning(ServiceNeed.__table__.c.id, sort_by_parameter_order=ordered),
+        values,
+        execution_options={"insertmanyvalues_page_size": NEED_INSERT_CHUNK},
+    )
+    ids = result.scalars().all()
+    if not ordered:
+        ids.sort()
+    need_dedup.index_needs(db, ids, signatures)
+    search.index_documents(db, [
+        (search.DOC_NEED, need_id, search.need_text(value["title"], value["description"], value["address"]))
+        for need_id, value in zip(ids, values)
+    ])
+    db.commit()
+
+    created = []
+    for need_id, line_no, value in zip(ids, line_numbers, values):
+        geo.need_index.add(need_id, value["lat"], value["lng"])
+        report = {"row": line_no, "status": "created", "id": need_id}
+        if value["duplicate_of"] is not None:
+            report["duplicate_of"] = value["duplicate_of"]
+        created.append(report)
+    events.bus.publish(events.NEEDS_IMPORTED, {
+        "needs": [ServiceNeedOut(id=need_id, **value).model_dump(mode="json") for need_id, value in zip(ids, values)],
+    })
+    return created, errors
@@ -1,7 +1,14 @@
+import asyncio
 import os
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
 # ✅ 从环境变量中读取数据库连接字符串
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -22,3 +29,93 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# ✅ 按数据库方言返回 insert 构造器（支持 ON CONFLICT DO NOTHING / DO UPDATE）
+def dialect_insert(db, table):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"不支持的数据库方言：{dialect}")
+    return insert(table)
+
+
+# ---------- SQL 查询计数 / 懒加载检测（开发、测试用） ----------
+
+# ✅ 设置 SQL_QUERY_GUARD=1 后，任何请求触发关系懒加载（N+1 的来源）都会直接返回 500，
+# 响应头带上 X-Query-Count，便于在联调和压测前发现问题
+QUERY_GUARD = os.getenv("SQL_QUERY_GUARD") == "1"
+
+_query_stats: ContextVar[Optional[dict]] = ContextVar("query_stats", default=None)
+
+
+# ✅ 统计代码块内执行的 SQL 条数和懒加载次数（同步路由跑在线程池里，上下文会随之复制，
+# 所以这里放可变的 dict，线程里的计数外面也能看到）
+@contextmanager
+def track_queries():
+    stats = {"queries": 0, "lazy_loads": []}
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    stats = _query_stats.get()
+    if stats is not None:
+        stats["queries"] += 1
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_lazy_load(orm_execute_state):
+    stats = _query_stats.get()
+    if stats is not None and orm_execute_state.is_select and orm_execute_state.lazy_loaded_from is not None:
+        mapper = orm_execute_state.lazy_loaded_from.mapper
+        stats["lazy_loads"].append(f"{mapper.class_.__name__}.{orm_execute_state.loader_strategy_path[-1].key}")
+
+
+# ---------- 异步模式 ----------
+
+# ✅ DB_ASYNC=1 时 routers/ 下的同步路由改为 async def（见 async_routes.py），通过异步引擎（asyncpg / aiosqlite）访问数据库，
+# 等待数据库时让出事件循环，并发不再受线程池大小限制；认证、健康数据等 main.py 里的接口和定时任务仍用上面的同步引擎
+ASYNC_DB = os.getenv("DB_ASYNC") == "1"
+
+_ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+# ✅ 同一个库的异步驱动连接串：postgresql://... -> postgresql+asyncpg://...，sqlite:///... -> sqlite+aiosqlite:///...
+def async_database_url(url: str) -> str:
+    sa_url = make_url(url)
+    backend = sa_url.get_backend_name()
+    if backend not in _ASYNC_DRIVERS:
+        raise NotImplementedError(f"不支持的数据库方言：{backend}")
+    return sa_url.set(drivername=_ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DB:
+    async_engine = create_async_engine(async_database_url(DATABASE_URL))
+    # 提交后不过期：路由返回的对象在 run_sync 之外序列化，过期属性在那里没法再查库
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _count_query)
+
+
+# ✅ 异步模式下的数据库依赖
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# ✅ 当前是否在事件循环线程上：异步模式下 run_sync 里的同步代码就跑在这里，不能阻塞等锁
+def on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
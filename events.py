@@ -0,0 +1,99 @@
+import asyncio
+import json
+import secrets
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+# ✅ 需求动态事件：need_created / needs_imported（批量导入，一次一条）/ need_accepted / need_completed
+# / needs_expired、needs_escalated（过期清理，每批一条）
+NEED_CREATED = "need_created"
+NEEDS_IMPORTED = "needs_imported"
+NEED_ACCEPTED = "need_accepted"
+NEED_COMPLETED = "need_completed"
+NEEDS_EXPIRED = "needs_expired"
+NEEDS_ESCALATED = "needs_escalated"
+
+# 内存中保留最近多少条事件供断线重连补发
+EVENT_BUFFER_SIZE = 1000
+
+
+class EventBus:
+    # 进程内事件总线：环形缓冲区保存最近的事件，订阅者断线后凭最后收到的事件 id 补齐；
+    # 发布方多在线程池里（同步路由），通过 call_soon_threadsafe 唤醒事件循环上的订阅者。
+    # 序号每个进程都从 1 开始，发给客户端的 id 带上本进程的随机纪元（"<纪元>-<序号>"），
+    # 服务重启或连到别的进程后纪元对不上，客户端会收到 reset，而不是被新进程里无关的事件接上
+    def __init__(self, size: int = EVENT_BUFFER_SIZE):
+        self.epoch = secrets.token_hex(4)
+        self._buffer: deque = deque(maxlen=size)
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._waiters: Dict[asyncio.Event, asyncio.AbstractEventLoop] = {}
+        self._listeners: List[Callable[[str, dict], None]] = []
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    # ✅ 序号 <-> 发给客户端的事件 id
+    def wire_id(self, event_id: int) -> str:
+        return f"{self.epoch}-{event_id}"
+
+    def parse_id(self, text: str) -> Optional[int]:
+        # 其他进程（或格式不对）的 id 返回 None
+        epoch, _, number = text.partition("-")
+        if epoch != self.epoch or not number.isdigit():
+            return None
+        return int(number)
+
+    # ✅ 同步监听者（如缓存失效），在发布线程里直接调用
+    def add_listener(self, listener: Callable[[str, dict], None]):
+        self._listeners.append(listener)
+
+    def publish(self, event_type: str, data: dict) -> int:
+        with self._lock:
+            self._last_id += 1
+            event_id = self._last_id
+            self._buffer.append((event_id, event_type, json.dumps(data, ensure_ascii=False, default=str)))
+            waiters = list(self._waiters.items())
+
+        for listener in self._listeners:
+            listener(event_type, data)
+        for waiter, loop in waiters:
+            try:
+                loop.call_soon_threadsafe(waiter.set)
+            except RuntimeError:  # 事件循环已关闭
+                pass
+        return event_id
+
+    # ✅ 取 last_id 之后的事件；返回 (事件列表, 是否需要重置)。
+    # 缓冲区已覆盖掉客户端缺失的事件、或 id 来自其他进程（last_id 为 None）时需要重置：客户端重新拉一次全量列表
+    def since(self, last_id: Optional[int]) -> Tuple[List[tuple], bool]:
+        with self._lock:
+            if last_id is None:
+                return [], True
+            if last_id > self._last_id:
+                return [], True
+            if not self._buffer:
+                return [], last_id < self._last_id
+            oldest = self._buffer[0][0]
+            if last_id < oldest - 1:
+                return [], True
+            return [event for event in self._buffer if event[0] > last_id], False
+
+    def subscribe(self) -> asyncio.Event:
+        waiter = asyncio.Event()
+        with self._lock:
+            self._waiters[waiter] = asyncio.get_running_loop()
+        return waiter
+
+    def unsubscribe(self, waiter: asyncio.Event):
+        with self._lock:
+            self._waiters.pop(waiter, None)
+
+
+bus = EventBus()
+
+
+def format_sse(event_id: str, event_type: str, data: str) -> str:
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
@@ -0,0 +1,101 @@
+# 反馈列表（社区管理员）：按服务者、评分范围、日期范围筛选，按 (created_at, id) 倒序做游标分页，走 ix_feedbacks_created。
+#   - 普通请求每次返回一页和下一页的游标 next_cursor（为空表示没有更多）
+#   - format=ndjson 时从游标处开始流式输出全部结果，每行一个 JSON 对象；内部仍按页查询，内存占用与总条数无关
+# 只读列值、不建 ORM 对象，会话的身份映射不会随页数增长
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Feedback, Task
+
+# 流式输出时每次查询的条数
+STREAM_CHUNK = 1000
+
+_COLUMNS = (Feedback.id, Feedback.task_id, Feedback.elder_name, Feedback.comment, Feedback.rating, Feedback.created_at)
+
+
+@dataclass
+class FeedbackFilter:
+    provider_id: Optional[int] = None
+    min_rating: Optional[int] = None
+    max_rating: Optional[int] = None
+    since: Optional[datetime] = None  # 含
+    until: Optional[datetime] = None  # 不含
+
+
+# ✅ 游标是上一页最后一条的 (created_at, id)，编码成不透明字符串
+def encode_cursor(created_at: datetime, feedback_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{feedback_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    # 格式不对时抛 ValueError，由调用方转成 400
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, feedback_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(feedback_id)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
+
+
+def _query(filters: FeedbackFilter, after: Optional[Tuple[datetime, int]], limit: int):
+    stmt = select(*_COLUMNS)
+    if filters.provider_id is not None:
+        stmt = stmt.join(Task, Task.id == Feedback.task_id).where(Task.provider_id == filters.provider_id)
+    if filters.min_rating is not None:
+        stmt = stmt.where(Feedback.rating >= filters.min_rating)
+    if filters.max_rating is not None:
+        stmt = stmt.where(Feedback.rating <= filters.max_rating)
+    if filters.since is not None:
+        stmt = stmt.where(Feedback.created_at >= filters.since)
+    if filters.until is not None:
+        stmt = stmt.where(Feedback.created_at < filters.until)
+    if after is not None:
+        created_at, feedback_id = after
+        # 冗余的 <= 条件让数据库能直接从游标处开始扫索引，而不是从头扫再逐行过滤
+        stmt = stmt.where(Feedback.created_at <= created_at, or_(
+            Feedback.created_at < created_at,
+            and_(Feedback.created_at == created_at, Feedback.id < feedback_id),
+        ))
+    return stmt.order_by(Feedback.created_at.desc(), Feedback.id.desc()).limit(limit)
+
+
+def _row_dict(row) -> dict:
+    return dict(zip(("id", "task_id", "elder_name", "comment", "rating", "created_at"), row))
+
+
+# ✅ 取一页：after 为解码后的游标，返回 (反馈列表, 下一页游标)
+def list_page(db: Session, filters: FeedbackFilter, after: Optional[Tuple[datetime, int]],
+              limit: int) -> Tuple[List[dict], Optional[str]]:
+    rows = db.execute(_query(filters, after, limit + 1)).all()
+    items = [_row_dict(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(items[-1]["created_at"], items[-1]["id"]) if len(rows) > limit else None
+    return items, next_cursor
+
+
+# ✅ NDJSON 流：自己开会话（响应发送时请求依赖里的会话已关闭），逐页查询、逐行输出
+def stream_ndjson(filters: FeedbackFilter, after: Optional[Tuple[datetime, int]]) -> Iterator[bytes]:
+    db = SessionLocal()
+    try:
+        while True:
+            rows = db.execute(_query(filters, after, STREAM_CHUNK)).all()
+            # 每页之间结束只读事务，不长时间占着快照
+            db.rollback()
+            if not rows:
+                return
+            yield "".join(
+                json.dumps(dict(_row_dict(row), created_at=row.created_at.isoformat()), ensure_ascii=False) + "\n"
+                for row in rows
+            ).encode("utf-8")
+            if len(rows) < STREAM_CHUNK:
+                return
+            after = (rows[-1].created_at, rows[-1].id)
+    finally:
+        db.close()
@@ -0,0 +1,249 @@
+import csv
+import math
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import Gazetteer, ServiceNeed
+
+EARTH_RADIUS_KM = 6371.0088
+
+# 网格边长（度），约 1.1 km
+GRID_CELL_DEG = 0.01
+
+# 空间索引最长多久从数据库全量重建一次（其他进程新建的需求也能被查到）
+NEED_INDEX_TTL = 60
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+# ---------- 本地地名库（地址 -> 坐标） ----------
+
+_gazetteer: Optional[Dict[str, Tuple[float, float]]] = None
+_gazetteer_max_len = 0
+_gazetteer_version = 0  # 每次重置 +1，加载期间被重置的结果不写回
+_gazetteer_lock = threading.Lock()
+
+
+def _normalize(text: str) -> str:
+    return "".join(text.split())
+
+
+# 查库放在锁外：异步模式下查询会让出事件循环，持锁等待会让同时冷启动的其他请求卡住整个循环。
+# 并发冷启动时可能多查几次，只有第一个结果写入
+def _load_gazetteer(db: Session) -> Tuple[Dict[str, Tuple[float, float]], int]:
+    global _gazetteer, _gazetteer_max_len
+    with _gazetteer_lock:
+        if _gazetteer is not None:
+            return _gazetteer, _gazetteer_max_len
+        version = _gazetteer_version
+    entries = {_normalize(name): (lat, lng) for name, lat, lng in db.query(Gazetteer.name, Gazetteer.lat, Gazetteer.lng)}
+    max_len = max((len(name) for name in entries), default=0)
+    with _gazetteer_lock:
+        if _gazetteer is not None:
+            return _gazetteer, _gazetteer_max_len
+        if _gazetteer_version == version:
+            _gazetteer, _gazetteer_max_len = entries, max_len
+    return entries, max_len
+
+
+def reset_gazetteer():
+    global _gazetteer, _gazetteer_version
+    with _gazetteer_lock:
+        _gazetteer_version += 1
+        _gazetteer = None
+
+
+# ✅ 地址解析：在地址中找最长的地名库条目（越长越具体，如“XX社区3号楼”优先于“XX区”）
+def geocode(db: Session, address: str) -> Optional[Tuple[float, float]]:
+    gazetteer, max_len = _load_gazetteer(db)
+    text = _normalize(address)
+    for length in range(min(max_len, len(text)), 0, -1):
+        for start in range(len(text) - length + 1):
+            hit = gazetteer.get(text[start:start + length])
+            if hit is not None:
+                return hit
+    return None
+
+
+# ✅ 从 CSV（name,lat,lng）导入地名库，已存在的地名更新坐标
+def load_gazetteer_csv(db: Session, path: str) -> int:
+    existing = {row.name: row for row in db.query(Gazetteer).all()}
+    count = 0
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for record in csv.DictReader(f):
+            name = _normalize(record["name"])
+            lat, lng = float(record["lat"]), float(record["lng"])
+            row = existing.get(name)
+            if row is None:
+                row = existing[name] = Gazetteer(name=name, lat=lat, lng=lng)
+                db.add(row)
+            else:
+                row.lat, row.lng = lat, lng
+            count += 1
+    db.commit()
+    reset_gazetteer()
+    return count
+
+
+# ---------- 未接单需求的空间索引（网格） ----------
+
+class NeedIndex:
+    def __init__(self, cell_deg: float = GRID_CELL_DEG):
+        self.cell_deg = cell_deg
+        self._cells: Dict[Tuple[int, int], Dict[int, Tuple[float, float]]] = defaultdict(dict)
+        self._points: Dict[int, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        # 正在进行的全量重建各自的增删日志：快照查询期间发生的 add / discard 记在这里，换入快照后按顺序重放
+        self._journals: List[List[Tuple[int, Optional[Tuple[float, float]]]]] = []
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lng / self.cell_deg))
+
+    def _add(self, need_id: int, lat: float, lng: float):
+        self._discard(need_id)
+        self._points[need_id] = (lat, lng)
+        self._cells[self._cell(lat, lng)][need_id] = (lat, lng)
+
+    def _discard(self, need_id: int):
+        point = self._points.pop(need_id, None)
+        if point is not None:
+            cell = self._cell(*point)
+            self._cells[cell].pop(need_id, None)
+            if not self._cells[cell]:
+                del self._cells[cell]
+
+    def add(self, need_id: int, lat: Optional[float], lng: Optional[float]):
+        if lat is None or lng is None:
+            return
+        with self._lock:
+            self._add(need_id, lat, lng)
+            for journal in self._journals:
+                journal.append((need_id, (lat, lng)))
+
+    def discard(self, need_id: int):
+        with self._lock:
+            self._discard(need_id)
+            for journal in self._journals:
+                journal.append((need_id, None))
+
+    def _drop_journal(self, journal: list):
+        # 按身份移除：空日志之间互相相等，list.remove 可能删掉别的线程的
+        self._journals = [j for j in self._journals if j is not journal]
+
+    # ✅ 首次查询或超过 TTL 时从数据库全量重建。
+    # 快照在锁外查询，期间别的请求 add / discard 的需求可能不在快照里（或已被快照漏掉删除）；
+    # add / discard 都在事务提交之后调用，查询前登记日志，换入快照后重放日志里的变更即可不丢
+    def ensure_loaded(self, db: Session):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < NEED_INDEX_TTL:
+            return
+        journal = []
+        with self._lock:
+            self._journals.append(journal)
+        try:
+            rows = (
+                db.query(ServiceNeed.id, ServiceNeed.lat, ServiceNeed.lng)
+                .filter(ServiceNeed.status == "open", ServiceNeed.lat.isnot(None), ServiceNeed.lng.isnot(None))
+                .all()
+            )
+        except BaseException:
+            with self._lock:
+                self._drop_journal(journal)
+            raise
+        with self._lock:
+            self._drop_journal(journal)
+            self._cells.clear()
+            self._points.clear()
+            for need_id, lat, lng in rows:
+                self._add(need_id, lat, lng)
+            for need_id, point in journal:
+                if point is None:
+                    self._discard(need_id)
+                else:
+                    self._add(need_id, *point)
+            self._loaded_at = time.monotonic()
+
+    # ✅ 最近的 k 个需求：从所在网格向外逐圈扩展，圈外最近距离超过半径或第 k 近距离时停止。
+    # 半径很大而附近很稀疏时逐圈会走过大量空网格：走过的网格数要超过有数据的网格总数时，
+    # 改为把剩下范围内有数据的网格按圈号排序逐个检查，总耗时与有数据的网格数同阶
+    def nearest(self, lat: float, lng: float, radius_km: float, k: int) -> List[Tuple[int, float]]:
+        # 一个网格在纬度方向的最短跨度（经度方向随纬度变窄，用 cos 修正）
+        km_per_cell = self.cell_deg * math.pi / 180 * EARTH_RADIUS_KM * max(math.cos(math.radians(min(abs(lat) + 1, 89))), 0.01)
+        max_ring = int(radius_km / km_per_cell) + 1
+        center_lat, center_lng = self._cell(lat, lng)
+
+        found: List[Tuple[float, int]] = []
+
+        def collect(cell):
+            for need_id, (plat, plng) in self._cells.get(cell, {}).items():
+                distance = haversine_km(lat, lng, plat, plng)
+                if distance <= radius_km:
+                    found.append((distance, need_id))
+
+        def done(ring: int) -> bool:
+            # 下一圈中的点至少相距 ring * km_per_cell
+            if len(found) < k:
+                return False
+            found.sort()
+            return found[k - 1][0] <= ring * km_per_cell
+
+        with self._lock:
+            ring = 0
+            while ring <= max_ring and (2 * ring + 1) ** 2 <= len(self._cells):
+                for cell in self._ring(center_lat, center_lng, ring):
+                    collect(cell)
+                if done(ring):
+                    break
+                ring += 1
+            else:
+                remaining = sorted(
+                    (r, cell) for r, cell in (
+                        (max(abs(cy - center_lat), abs(cx - center_lng)), (cy, cx)) for cy, cx in self._cells
+                    )
+                    if ring <= r <= max_ring
+                )
+                for i, (r, cell) in enumerate(remaining):
+                    collect(cell)
+                    if (i + 1 == len(remaining) or remaining[i + 1][0] != r) and done(r):
+                        break
+
+        found.sort()
+        return [(need_id, distance) for distance, need_id in found[:k]]
+
+    @staticmethod
+    def _ring(cy: int, cx: int, ring: int):
+        if ring == 0:
+            yield (cy, cx)
+            return
+        for dx in range(-ring, ring + 1):
+            yield (cy - ring, cx + dx)
+            yield (cy + ring, cx + dx)
+        for dy in range(-ring + 1, ring):
+            yield (cy + dy, cx - ring)
+            yield (cy + dy, cx + ring)
+
+
+need_index = NeedIndex()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "load-gazetteer":
+        print("用法：python geo.py load-gazetteer <地名库.csv>（列：name,lat,lng）")
+        sys.exit(1)
+    from database import SessionLocal
+    session = SessionLocal()
+    try:
+        print(f"✅ 已导入 {load_gazetteer_csv(session, sys.argv[2])} 条地名")
+    finally:
+        session.close()
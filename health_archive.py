@@ -0,0 +1,373 @@
+# 健康数据列式归档：把 health_data / health_series 导出为按指标分列的 .npy 文件，
+# 供数据组做离线分析（np.load(mmap_mode="r") 零拷贝读取，不再访问线上数据库）
+#
+# 导出：python health_archive.py export /data/health_archive
+#      （设置 ARCHIVE_DATABASE_URL 可改为从只读从库导出）
+# 查询：
+#   archive = HealthArchive("/data/health_archive")
+#   archive.aggregate("heart_rate", "mean", start=datetime(2025, 1, 1))
+#   archive.select("steps", user_id=42)
+import calendar
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import HealthData, HealthSeries
+import health_series
+
+ARCHIVE_VERSION = 1
+ARCHIVE_METRICS = ("heart_rate", "steps", "blood_sugar", "weight")
+MANIFEST_FILE = "index.json"
+USERS_FILE = "users.npy"  # 每个用户在列数组中的区间：[[user_id, start, stop], ...]
+
+# 列名 -> dtype（时间戳为 UTC 秒）
+COLUMNS = {
+    "user_id": np.int64,
+    "timestamp": np.int64,
+    "value": np.float64,
+}
+
+EXPORT_CHUNK = 50000
+# 外部排序参数：导出时先把读数攒成每段 SORT_RUN_ROWS 行的有序段落盘，再多路归并，每段每次读入 MERGE_BLOCK_ROWS 行。
+# 内存占用：生成段时固定约 SORT_RUN_ROWS × 80 字节（约 80 MB）；归并时约 段数 × MERGE_BLOCK_ROWS × 110 字节，
+# 即每一百万行读数约 1 MB（一亿行约 90 MB）。仍随总行数增长，但只有原始数据量的约 1/25
+SORT_RUN_ROWS = 1_000_000
+MERGE_BLOCK_ROWS = 8192
+
+# 有序段文件里的记录格式
+RECORD = np.dtype([(name, dtype) for name, dtype in COLUMNS.items()])
+
+
+def _epoch(ts: datetime) -> int:
+    return calendar.timegm(ts.utctimetuple())
+
+
+# ---------- 导出 ----------
+
+def _sort_records(records: np.ndarray) -> np.ndarray:
+    return records[np.lexsort((records["timestamp"], records["user_id"]))]
+
+
+class _RunSpool:
+    # 分块追加的读数在内存里攒到 SORT_RUN_ROWS 行，排好序写成一个有序段文件
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.count = 0
+        self.runs: List[Tuple[str, int]] = []
+        self._pending: List[np.ndarray] = []
+        self._pending_rows = 0
+
+    def append(self, user_id, timestamp, value):
+        block = np.empty(len(user_id), dtype=RECORD)
+        block["user_id"], block["timestamp"], block["value"] = user_id, timestamp, value
+        self._pending.append(block)
+        self._pending_rows += len(block)
+        self.count += len(block)
+        if self._pending_rows >= SORT_RUN_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        records = _sort_records(np.concatenate(self._pending))
+        self._pending, self._pending_rows = [], 0
+        path = os.path.join(self.directory, f"run-{len(self.runs)}.raw")
+        records.tofile(path)
+        self.runs.append((path, len(records)))
+
+    def close(self) -> List[np.ndarray]:
+        self._flush()
+        return [np.memmap(path, dtype=RECORD, mode="r", shape=(rows,)) for path, rows in self.runs]
+
+
+def _merge_runs(runs: List[np.ndarray], block: int = MERGE_BLOCK_ROWS) -> Iterator[np.ndarray]:
+    # 多路归并：各段已读入的最后一个键中最小的那个记为 bound，没读到的记录都不小于 bound，
+    # 所以缓冲区里不大于 bound 的记录可以排序输出；然后只给卡住 bound 的段再读一块
+    positions = [0] * len(runs)
+    last_keys: List[Optional[Tuple[int, int]]] = [None] * len(runs)
+    pool = np.empty(0, dtype=RECORD)
+
+    def read(i: int) -> np.ndarray:
+        chunk = np.array(runs[i][positions[i]:positions[i] + block])
+        positions[i] += len(chunk)
+        last_keys[i] = (int(chunk["user_id"][-1]), int(chunk["timestamp"][-1])) if positions[i] < len(runs[i]) else None
+        return chunk
+
+    pool = np.concatenate([pool] + [read(i) for i in range(len(runs))])
+    while True:
+        pending = [key for key in last_keys if key is not None]
+        if not pending:
+            if len(pool):
+                yield _sort_records(pool)
+            return
+        bound = min(pending)
+        user_id, timestamp = pool["user_id"], pool["timestamp"]
+        ready = (user_id < bound[0]) | ((user_id == bound[0]) & (timestamp <= bound[1]))
+        if ready.any():
+            yield _sort_records(pool[ready])
+            pool = pool[~ready]
+        pool = np.concatenate([pool] + [read(i) for i, key in enumerate(last_keys) if key == bound])
+
+
+# ✅ 把按 (user_id, timestamp) 有序的记录块逐块写成 .npy，并生成用户区间索引
+def _write_sorted(directory: str, metric: str, rows: int, chunks: Iterable[np.ndarray]) -> dict:
+    metric_dir = os.path.join(directory, metric)
+    os.makedirs(metric_dir, exist_ok=True)
+    targets = {
+        name: np.lib.format.open_memmap(
+            os.path.join(metric_dir, f"{name}.npy"), mode="w+", dtype=COLUMNS[name], shape=(rows,)
+        )
+        for name in COLUMNS
+    }
+
+    offset = 0
+    users, starts = [], []
+    last_user = None
+    min_ts, max_ts = None, None
+    for chunk in chunks:
+        for name, target in targets.items():
+            target[offset:offset + len(chunk)] = chunk[name]
+        chunk_users, chunk_starts = np.unique(chunk["user_id"], return_index=True)
+        chunk_starts = chunk_starts + offset
+        if chunk_users[0] == last_user:  # 上一块结尾的用户延续到这一块
+            chunk_users, chunk_starts = chunk_users[1:], chunk_starts[1:]
+        last_user = chunk["user_id"][-1]
+        users.append(chunk_users)
+        starts.append(chunk_starts)
+        offset += len(chunk)
+        chunk_min, chunk_max = int(chunk["timestamp"].min()), int(chunk["timestamp"].max())
+        min_ts = chunk_min if min_ts is None else min(min_ts, chunk_min)
+        max_ts = chunk_max if max_ts is None else max(max_ts, chunk_max)
+    for target in targets.values():
+        target.flush()
+    del targets
+
+    users = np.concatenate(users) if users else np.zeros(0, dtype=np.int64)
+    starts = np.concatenate(starts) if starts else np.zeros(0, dtype=np.int64)
+    stops = np.append(starts[1:], offset) if len(starts) else starts
+    np.save(os.path.join(metric_dir, USERS_FILE), np.stack([users, starts, stops], axis=1).astype(np.int64))
+
+    return {
+        "rows": int(offset),
+        "users": int(len(users)),
+        "min_timestamp": min_ts,
+        "max_timestamp": max_ts,
+    }
+
+
+# ✅ 把内存中一个指标的三列数据按 (user_id, timestamp) 排序后写成 .npy（导出时数据在磁盘上，走外部排序）
+def write_metric(directory: str, metric: str, user_id: np.ndarray, timestamp: np.ndarray, value: np.ndarray) -> dict:
+    records = np.empty(len(user_id), dtype=RECORD)
+    records["user_id"], records["timestamp"], records["value"] = user_id, timestamp, value
+    return _write_sorted(directory, metric, len(records), [_sort_records(records)] if len(records) else [])
+
+
+def _spool_metric(db: Session, metric: str, spool: _RunSpool):
+    column = getattr(HealthData, metric)
+    rows = db.execute(
+        select(HealthData.user_id, HealthData.timestamp, column)
+        .where(column.isnot(None), HealthData.timestamp.isnot(None))
+        .execution_options(yield_per=EXPORT_CHUNK)
+    )
+    for chunk in rows.partitions():
+        spool.append(
+            [r[0] for r in chunk],
+            [_epoch(r[1]) for r in chunk],
+            [r[2] for r in chunk],
+        )
+
+    if metric not in health_series.SERIES_METRICS:
+        return
+    series = db.execute(
+        select(HealthSeries.user_id, HealthSeries.day, HealthSeries.payload)
+        .where(HealthSeries.metric == metric)
+        .execution_options(yield_per=1000)
+    )
+    for chunk in series.partitions():
+        for user_id, day, payload in chunk:
+            offsets, readings = health_series.decode_series(payload)
+            base = calendar.timegm(day.timetuple())
+            spool.append(
+                np.full(len(offsets), user_id),
+                np.asarray(offsets, dtype=np.int64) + base,
+                readings,
+            )
+
+
+# ✅ 导出完整归档：先写到临时目录，全部完成后再替换旧归档，读方不会看到半成品
+def export_archive(db: Session, directory: str) -> dict:
+    directory = os.path.abspath(directory)
+    staging = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    manifest = {
+        "version": ARCHIVE_VERSION,
+        "exported_at": datetime.utcnow().isoformat(),
+        "metrics": {},
+    }
+    for metric in ARCHIVE_METRICS:
+        spool_dir = os.path.join(staging, f".spool-{metric}")
+        os.makedirs(spool_dir)
+        spool = _RunSpool(spool_dir)
+        _spool_metric(db, metric, spool)
+        runs = spool.close()
+        manifest["metrics"][metric] = _write_sorted(staging, metric, spool.count, _merge_runs(runs))
+        del runs
+        shutil.rmtree(spool_dir)
+
+    with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    previous = f"{directory}.old-{os.getpid()}"
+    if os.path.exists(directory):
+        os.replace(directory, previous)
+    os.replace(staging, directory)
+    shutil.rmtree(previous, ignore_errors=True)
+    return manifest
+
+
+# ---------- 查询 ----------
+
+class HealthArchive:
+    # 只读打开归档，所有列都是内存映射，切片结果是视图而不是副本
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self._columns = {}
+        self._users = {}
+
+    @property
+    def metrics(self):
+        return list(self.manifest["metrics"].keys())
+
+    def columns(self, metric: str) -> Dict[str, np.ndarray]:
+        if metric not in self.manifest["metrics"]:
+            raise KeyError(f"归档中没有指标：{metric}")
+        if metric not in self._columns:
+            self._columns[metric] = {
+                name: np.load(os.path.join(self.directory, metric, f"{name}.npy"), mmap_mode="r")
+                for name in COLUMNS
+            }
+            self._users[metric] = np.load(os.path.join(self.directory, metric, USERS_FILE))
+        return self._columns[metric]
+
+    def _user_range(self, metric: str, user_id: int):
+        self.columns(metric)
+        users = self._users[metric]
+        i = np.searchsorted(users[:, 0], user_id)
+        if i == len(users) or users[i, 0] != user_id:
+            return 0, 0
+        return int(users[i, 1]), int(users[i, 2])
+
+    # ✅ 按用户 / 时间范围取数据：指定用户时用索引定位区间，再在有序时间戳上二分，返回零拷贝视图；
+    # 不指定用户时返回整列视图和时间过滤掩码（None 表示不过滤）
+    def select(self, metric: str, user_id: Optional[int] = None,
+               start: Optional[datetime] = None, end: Optional[datetime] = None):
+        columns = self.columns(metric)
+        if user_id is not None:
+            lo, hi = self._user_range(metric, user_id)
+            ts = columns["timestamp"][lo:hi]
+            if start is not None:
+                lo += int(np.searchsorted(ts, _epoch(start), side="left"))
+            if end is not None:
+                hi = lo + int(np.searchsorted(columns["timestamp"][lo:hi], _epoch(end), side="left"))
+            return {name: col[lo:hi] for name, col in columns.items()}, None
+
+        mask = None
+        if start is not None:
+            mask = columns["timestamp"] >= _epoch(start)
+        if end is not None:
+            before_end = columns["timestamp"] < _epoch(end)
+            mask = before_end if mask is None else mask & before_end
+        return columns, mask
+
+    # ✅ 聚合：how 为 count / sum / mean / min / max；by_user=True 时按用户分组
+    # （数据按用户连续存放，用 reduceat 一次扫描完成）
+    def aggregate(self, metric: str, how: str = "mean", user_id: Optional[int] = None,
+                  start: Optional[datetime] = None, end: Optional[datetime] = None, by_user: bool = False):
+        if how not in ("count", "sum", "mean", "min", "max"):
+            raise ValueError(f"不支持的聚合方式：{how}")
+
+        columns, mask = self.select(metric, user_id, start, end)
+        values = columns["value"]
+
+        if by_user and user_id is None:
+            return self._aggregate_by_user(metric, how, values, mask)
+
+        count = int(mask.sum()) if mask is not None else len(values)
+        if how == "count":
+            return count
+        if count == 0:
+            return None
+        if how in ("sum", "mean"):
+            total = float(np.sum(values, where=mask)) if mask is not None else float(values.sum())
+            return total if how == "sum" else total / count
+        reducer = np.min if how == "min" else np.max
+        if mask is None:
+            return float(reducer(values))
+        initial = np.inf if how == "min" else -np.inf
+        return float(reducer(values, where=mask, initial=initial))
+
+    def _aggregate_by_user(self, metric: str, how: str, values: np.ndarray, mask: Optional[np.ndarray]) -> dict:
+        users = self._users[metric]
+        if len(users) == 0:
+            return {}
+        starts = users[:, 1]
+
+        if mask is None:
+            counts = users[:, 2] - users[:, 1]
+        else:
+            counts = np.add.reduceat(mask.astype(np.int64), starts)
+
+        if how == "count":
+            result = counts
+        elif how in ("sum", "mean"):
+            source = values if mask is None else np.where(mask, values, 0.0)
+            sums = np.add.reduceat(source, starts)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result = sums if how == "sum" else sums / counts
+        else:
+            ufunc = np.minimum if how == "min" else np.maximum
+            fill = np.inf if how == "min" else -np.inf
+            source = values if mask is None else np.where(mask, values, fill)
+            result = ufunc.reduceat(source, starts)
+
+        return {
+            int(uid): (int(v) if how == "count" else float(v))
+            for uid, v, n in zip(users[:, 0], result, counts)
+            if n > 0
+        }
+
+
+def _export_main(directory: str):
+    url = os.getenv("ARCHIVE_DATABASE_URL")
+    if url:
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        session_factory = sessionmaker(bind=create_engine(url))
+    else:
+        from database import SessionLocal as session_factory
+
+    db = session_factory()
+    try:
+        manifest = export_archive(db, directory)
+    finally:
+        db.close()
+    for metric, info in manifest["metrics"].items():
+        print(f"✅ {metric}: {info['rows']} 条读数，{info['users']} 位用户")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "export":
+        print("用法：python health_archive.py export <归档目录>")
+        sys.exit(1)
+    _export_main(sys.argv[2])
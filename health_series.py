@@ -0,0 +1,170 @@
+from collections import defaultdict
+from itertools import accumulate
+from datetime import datetime, date, timedelta, timezone
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from database import dialect_insert
+from models import HealthSeries
+
+# ✅ 高频指标：按“用户 + 指标 + 天”压缩成一行存储
+SERIES_METRICS = ("heart_rate", "steps")
+
+# 编码格式版本（写在 payload 第一个字节）
+SERIES_FORMAT_VERSION = 1
+
+
+# ---------- varint / zigzag 编码 ----------
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _unzigzag(n: int) -> int:
+    return (n >> 1) ^ -(n & 1)
+
+
+def _write_varint(buf: bytearray, n: int):
+    while n >= 0x80:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+# ✅ 编码：时间戳（当天秒数）和数值各自做差分 + zigzag + varint，列式排列
+def encode_series(points: List[Tuple[int, int]]) -> bytes:
+    buf = bytearray()
+    buf.append(SERIES_FORMAT_VERSION)
+    _write_varint(buf, len(points))
+
+    prev = 0
+    for offset, _ in points:
+        _write_varint(buf, _zigzag(offset - prev))
+        prev = offset
+
+    prev = 0
+    for _, value in points:
+        _write_varint(buf, _zigzag(value - prev))
+        prev = value
+
+    return bytes(buf)
+
+
+# ✅ 解码：返回 (当天秒数列表, 数值列表)
+def decode_series(payload: bytes) -> Tuple[List[int], List[int]]:
+    if not payload:
+        return [], []
+    if payload[0] != SERIES_FORMAT_VERSION:
+        raise ValueError(f"未知的序列编码版本：{payload[0]}")
+
+    # 先顺序读出全部 varint，再按列做前缀和还原
+    raw = []
+    acc = 0
+    shift = 0
+    for byte in payload[1:]:
+        if byte & 0x80:
+            acc |= (byte & 0x7F) << shift
+            shift += 7
+        else:
+            raw.append(acc | (byte << shift))
+            acc = 0
+            shift = 0
+
+    if not raw or len(raw) != raw[0] * 2 + 1:
+        raise ValueError("序列数据已损坏")
+
+    count = raw[0]
+    offsets = list(accumulate(_unzigzag(n) for n in raw[1:count + 1]))
+    readings = list(accumulate(_unzigzag(n) for n in raw[count + 1:]))
+    return offsets, readings
+
+
+# ---------- 读写数据库 ----------
+
+def _day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day)
+
+
+# ✅ 库里的时间都是不带时区的 UTC 时间：带时区的上报时间先换算成 UTC 再去掉时区
+def to_naive_utc(ts: datetime) -> datetime:
+    if ts is not None and ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _split_points(points: Iterable[Tuple[datetime, int]]) -> Dict[date, Dict[int, int]]:
+    by_day = defaultdict(dict)
+    for ts, value in points:
+        ts = to_naive_utc(ts)
+        day = ts.date()
+        offset = int((ts - _day_start(day)).total_seconds())
+        by_day[day][offset] = int(value)  # 同一秒重复上报的读数只保留最后一条
+    return by_day
+
+
+# ✅ 追加读数：每天一行，读出已有数据合并后重新编码（同一秒的读数会被去重）。
+# 先用 INSERT ... ON CONFLICT DO NOTHING 补齐缺的天（空序列占位），再锁住这些行读出合并：
+# 同一天的首次上传并发到达时，后到的会等在行锁上，而不是撞唯一约束失败
+def append_points(db: Session, user_id: int, metric: str, points: Iterable[Tuple[datetime, int]]) -> int:
+    if metric not in SERIES_METRICS:
+        raise ValueError(f"不支持压缩存储的指标：{metric}")
+
+    by_day = _split_points(points)
+    if not by_day:
+        return 0
+
+    empty = encode_series([])
+    db.execute(
+        dialect_insert(db, HealthSeries)
+        .values([
+            dict(user_id=user_id, metric=metric, day=day, count=0, value_sum=0, payload=empty)
+            for day in by_day
+        ])
+        .on_conflict_do_nothing(index_elements=["user_id", "metric", "day"])
+    )
+    rows = {
+        row.day: row
+        for row in db.query(HealthSeries)
+        .filter(
+            HealthSeries.user_id == user_id,
+            HealthSeries.metric == metric,
+            HealthSeries.day.in_(list(by_day.keys())),
+        )
+        .with_for_update()
+        .populate_existing()
+        .all()
+    }
+
+    written = 0
+    for day, new_points in by_day.items():
+        row = rows[day]
+        offsets, readings = decode_series(row.payload)
+        merged = dict(zip(offsets, readings))
+        merged.update(new_points)
+        written += len(new_points)
+
+        ordered = sorted(merged.items())
+        row.count = len(ordered)
+        row.value_sum = sum(v for _, v in ordered)
+        row.payload = encode_series(ordered)
+
+    return written
+
+
+# ✅ 读取某用户的压缩序列，按时间返回 (timestamp, metric, value)
+def load_points(db: Session, user_id: int, start: date = None, end: date = None) -> List[Tuple[datetime, str, int]]:
+    query = db.query(HealthSeries).filter(HealthSeries.user_id == user_id)
+    if start is not None:
+        query = query.filter(HealthSeries.day >= start)
+    if end is not None:
+        query = query.filter(HealthSeries.day <= end)
+
+    result = []
+    for row in query.order_by(HealthSeries.day).all():
+        base = _day_start(row.day)
+        offsets, readings = decode_series(row.payload)
+        for offset, value in zip(offsets, readings):
+            result.append((base + timedelta(seconds=offset), row.metric, value))
+    result.sort(key=lambda item: item[0])
+    return result
@@ -0,0 +1,178 @@
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from models import HealthData, HealthSeries
+
+# ✅ 支持趋势分析的数值指标（血压是字符串，不参与）
+TREND_METRICS = ("heart_rate", "steps", "blood_sugar", "weight")
+
+SHORT_WINDOW = 7
+LONG_WINDOW = 30
+
+
+# ✅ PostgreSQL：按天聚合 + 窗口函数全部在数据库里完成，只返回平滑后的序列
+_TREND_SQL = """
+WITH raw AS (
+    SELECT CAST("timestamp" AS DATE) AS day, SUM({column}) AS total, COUNT({column}) AS n
+    FROM health_data
+    WHERE user_id = :user_id AND {column} IS NOT NULL
+      AND "timestamp" >= :since AND "timestamp" < :until
+    GROUP BY 1
+    UNION ALL
+    SELECT day, value_sum AS total, "count" AS n
+    FROM health_series
+    WHERE user_id = :user_id AND metric = :metric AND day >= :since AND day < :until
+),
+daily AS (
+    SELECT CAST(d AS DATE) AS day,
+           CAST(COALESCE(SUM(raw.total), 0) AS DOUBLE PRECISION) AS total,
+           COALESCE(SUM(raw.n), 0) AS n
+    FROM generate_series(CAST(:since AS DATE), CAST(:last AS DATE), INTERVAL '1 day') AS d
+    LEFT JOIN raw ON raw.day = CAST(d AS DATE)
+    GROUP BY 1
+),
+windowed AS (
+    SELECT day,
+           SUM(total) OVER w_short / NULLIF(SUM(n) OVER w_short, 0) AS ma_short,
+           SUM(total) OVER w_long / NULLIF(SUM(n) OVER w_long, 0) AS ma_long
+    FROM daily
+    WINDOW w_short AS (ORDER BY day ROWS BETWEEN {short_preceding} PRECEDING AND CURRENT ROW),
+           w_long AS (ORDER BY day ROWS BETWEEN {long_preceding} PRECEDING AND CURRENT ROW)
+),
+with_delta AS (
+    SELECT day, ma_short, ma_long,
+           ma_short - LAG(ma_short, 7) OVER (ORDER BY day) AS wow_delta
+    FROM windowed
+)
+SELECT day, ma_short, ma_long, wow_delta
+FROM with_delta
+WHERE day >= :first
+ORDER BY day
+"""
+
+
+def _window_bounds(days: int, end: Optional[date]):
+    last = end or datetime.utcnow().date()
+    first = last - timedelta(days=days - 1)
+    since = first - timedelta(days=LONG_WINDOW - 1)  # 第一天的 30 日均线也要完整
+    return since, first, last
+
+
+def _point(day, ma_short, ma_long, wow_delta) -> dict:
+    def clean(value):
+        if value is None or value != value:  # NaN
+            return None
+        return round(float(value), 2)
+
+    return {
+        "day": day.isoformat(),
+        f"ma{SHORT_WINDOW}": clean(ma_short),
+        f"ma{LONG_WINDOW}": clean(ma_long),
+        "wow_delta": clean(wow_delta),
+    }
+
+
+def trend_sql(db: Session, user_id: int, metric: str, days: int = 90, end: date = None) -> List[dict]:
+    since, first, last = _window_bounds(days, end)
+    sql = _TREND_SQL.format(
+        column=metric,
+        short_preceding=SHORT_WINDOW - 1,
+        long_preceding=LONG_WINDOW - 1,
+    )
+    rows = db.execute(text(sql), {
+        "user_id": user_id,
+        "metric": metric,
+        "since": since,
+        "until": last + timedelta(days=1),
+        "first": first,
+        "last": last,
+    })
+    return [_point(*row) for row in rows]
+
+
+# ---------- NumPy 实现（SQLite 等不方便做日期窗口的数据库） ----------
+
+def _as_date(value) -> date:
+    if isinstance(value, str):  # SQLite 的 date() 返回字符串
+        return date.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _daily_totals(db: Session, user_id: int, metric: str, since: date, last: date):
+    n_days = (last - since).days + 1
+    totals = np.zeros(n_days, dtype=np.float64)
+    counts = np.zeros(n_days, dtype=np.int64)
+
+    column = getattr(HealthData, metric)
+    day_expr = func.date(HealthData.timestamp)
+    # 只取按天聚合后的结果，不把原始读数拉到应用层
+    row_aggregates = (
+        db.query(day_expr, func.sum(column), func.count(column))
+        .filter(
+            HealthData.user_id == user_id,
+            column.isnot(None),
+            HealthData.timestamp >= datetime.combine(since, datetime.min.time()),
+            HealthData.timestamp < datetime.combine(last + timedelta(days=1), datetime.min.time()),
+        )
+        .group_by(day_expr)
+        .all()
+    )
+    series_aggregates = (
+        db.query(HealthSeries.day, HealthSeries.value_sum, HealthSeries.count)
+        .filter(
+            HealthSeries.user_id == user_id,
+            HealthSeries.metric == metric,
+            HealthSeries.day >= since,
+            HealthSeries.day <= last,
+        )
+        .all()
+    )
+
+    for day, total, count in list(row_aggregates) + list(series_aggregates):
+        index = (_as_date(day) - since).days
+        totals[index] += total or 0
+        counts[index] += count or 0
+    return totals, counts
+
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    padded = np.cumsum(np.concatenate((np.zeros(window, dtype=values.dtype), values)))
+    return padded[window:] - padded[:-window]
+
+
+def trend_numpy(db: Session, user_id: int, metric: str, days: int = 90, end: date = None) -> List[dict]:
+    since, first, last = _window_bounds(days, end)
+    totals, counts = _daily_totals(db, user_id, metric, since, last)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ma_short = _rolling_sum(totals, SHORT_WINDOW) / _rolling_sum(counts, SHORT_WINDOW)
+        ma_long = _rolling_sum(totals, LONG_WINDOW) / _rolling_sum(counts, LONG_WINDOW)
+    wow_delta = np.full_like(ma_short, np.nan)
+    wow_delta[7:] = ma_short[7:] - ma_short[:-7]
+
+    offset = (first - since).days
+    return [
+        _point(first + timedelta(days=i), ma_short[offset + i], ma_long[offset + i], wow_delta[offset + i])
+        for i in range(days)
+    ]
+
+
+# ✅ 按数据库方言选择执行策略：PostgreSQL 用窗口函数，其它数据库用 NumPy
+def compute_trend(db: Session, user_id: int, metric: str, days: int = 90, strategy: str = None) -> dict:
+    if metric not in TREND_METRICS:
+        raise ValueError(f"不支持的指标：{metric}")
+    if strategy is None:
+        strategy = "sql" if db.get_bind().dialect.name == "postgresql" else "numpy"
+
+    compute = trend_sql if strategy == "sql" else trend_numpy
+    return {
+        "metric": metric,
+        "strategy": strategy,
+        "points": compute(db, user_id, metric, days),
+    }
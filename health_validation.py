@@ -0,0 +1,184 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from schemas import HealthDataCreate
+from service_time import SERVICE_TIMEZONE
+
+# ✅ 拒收原因（按位组合，一行可能同时命中多个原因）
+REJECT_HEART_RATE = 1
+REJECT_BLOOD_PRESSURE = 2
+REJECT_BLOOD_SUGAR = 4
+REJECT_WEIGHT = 8
+REJECT_STEPS = 16
+REJECT_STEPS_DECREASING = 32
+
+REJECT_REASONS = {
+    REJECT_HEART_RATE: "heart_rate_out_of_range",
+    REJECT_BLOOD_PRESSURE: "blood_pressure_invalid",
+    REJECT_BLOOD_SUGAR: "blood_sugar_out_of_range",
+    REJECT_WEIGHT: "weight_out_of_range",
+    REJECT_STEPS: "steps_out_of_range",
+    REJECT_STEPS_DECREASING: "steps_counter_decreased",
+}
+
+# ✅ 生理合理范围（闭区间）
+HEART_RATE_RANGE = (25, 250)        # 次/分
+SYSTOLIC_RANGE = (60, 260)          # mmHg
+DIASTOLIC_RANGE = (30, 160)         # mmHg
+BLOOD_SUGAR_RANGE = (1.0, 35.0)     # mmol/L
+WEIGHT_RANGE = (2.0, 300.0)         # kg
+STEPS_RANGE = (0, 100000)           # 当天累计步数
+
+# 血压字符串最多 7 个字符，如 "120/80"、"180/110"
+_BP_WIDTH = 8
+
+
+# 库里的时间都是不带时区的 UTC 时间，换算秒数时按 UTC 处理，与存储一致
+def _epoch(ts: datetime) -> float:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+# ✅ 把一批上报数据转成列（缺失值：数值列为 NaN，血压为空串，时间取服务器当前时间）
+def to_columns(items: Sequence[HealthDataCreate], now: datetime = None) -> Dict[str, np.ndarray]:
+    now_ts = _epoch(now or datetime.utcnow())
+    nan = float("nan")
+
+    def numeric(name):
+        return np.array([nan if getattr(i, name) is None else getattr(i, name) for i in items], dtype=np.float64)
+
+    return {
+        "user_id": np.array([i.user_id for i in items], dtype=np.int64),
+        "timestamp": np.array([_epoch(i.timestamp) if i.timestamp else now_ts for i in items], dtype=np.float64),
+        "heart_rate": numeric("heart_rate"),
+        "blood_sugar": numeric("blood_sugar"),
+        "weight": numeric("weight"),
+        "steps": numeric("steps"),
+        "blood_pressure": np.array([i.blood_pressure or "" for i in items], dtype=f"U{_BP_WIDTH}"),
+    }
+
+
+def _out_of_range(values: np.ndarray, bounds) -> np.ndarray:
+    low, high = bounds
+    # NaN 表示未上报，不算越界
+    return (values < low) | (values > high)
+
+
+# ✅ 解析 "收缩压/舒张压"：把定长 Unicode 数组看成码点矩阵，逐列（共 8 列）做 Horner 累加，
+# 每一步都是对整批数据的数组运算
+def _invalid_blood_pressure(bp: np.ndarray) -> np.ndarray:
+    n = len(bp)
+    columns = np.ascontiguousarray(bp).view(np.uint32).reshape(n, _BP_WIDTH).T.astype(np.int32)
+
+    systolic = np.zeros(n, dtype=np.int32)
+    diastolic = np.zeros(n, dtype=np.int32)
+    sys_digits = np.zeros(n, dtype=np.int8)
+    dia_digits = np.zeros(n, dtype=np.int8)
+    slashes = np.zeros(n, dtype=np.int8)
+    bad_char = np.zeros(n, dtype=bool)
+
+    for col in columns:
+        digit = col - 48
+        is_digit = (digit >= 0) & (digit <= 9)
+        is_slash = col == 47
+        bad_char |= ~(is_digit | is_slash | (col == 0))
+        in_sys = is_digit & (slashes == 0)
+        in_dia = is_digit & (slashes == 1)
+        systolic = np.where(in_sys, systolic * 10 + digit, systolic)
+        diastolic = np.where(in_dia, diastolic * 10 + digit, diastolic)
+        sys_digits += in_sys
+        dia_digits += in_dia
+        slashes += is_slash
+
+    present = columns[0] != 0
+    # 原始字符串超过定宽会被截断（最后一列非空），截断后的值一律视为非法
+    well_formed = (
+        ~bad_char & (slashes == 1) & (columns[-1] == 0)
+        & (sys_digits > 0) & (sys_digits <= 3) & (dia_digits > 0) & (dia_digits <= 3)
+    )
+    in_range = (
+        (systolic >= SYSTOLIC_RANGE[0]) & (systolic <= SYSTOLIC_RANGE[1])
+        & (diastolic >= DIASTOLIC_RANGE[0]) & (diastolic <= DIASTOLIC_RANGE[1])
+        & (systolic > diastolic)
+    )
+    return present & ~(well_formed & in_range)
+
+
+# 时区偏移只会在整刻钟处变化：逐个刻钟查一次偏移，再换算成社区当地日期（自 1970-01-01 起的天数）。
+# 一批数据通常只跨几天，按区间逐刻钟查表不用排序；跨度比行数还大时改为对出现过的刻钟去重
+def _local_days(seconds: np.ndarray) -> np.ndarray:
+    quarter = seconds // 900
+    first = int(quarter.min())
+    span = int(quarter.max()) - first + 1
+    if span <= len(seconds):
+        quarters, inverse = np.arange(first, first + span), quarter - first
+    else:
+        quarters, inverse = np.unique(quarter, return_inverse=True)
+    offsets = np.array(
+        [datetime.fromtimestamp(int(q) * 900, SERVICE_TIMEZONE).utcoffset().total_seconds() for q in quarters],
+        dtype=np.int64,
+    )
+    return (seconds + offsets[inverse.reshape(-1)]) // 86400
+
+
+# ✅ 步数是当天累计计数器：同一用户同一天内按时间排序后不应低于此前的最大值（跨天归零是正常的）；
+# “一天”按社区当地日期划分，计步器在当地零点归零
+def _decreasing_steps(user_id: np.ndarray, timestamp: np.ndarray, steps: np.ndarray) -> np.ndarray:
+    result = np.zeros(len(steps), dtype=bool)
+    rows = np.flatnonzero(~np.isnan(steps))
+    if len(rows) < 2:
+        return result
+
+    # user_id 和秒级时间戳拼成一个 int64 排序键；网关通常按用户、按时间顺序上报，已有序时跳过排序
+    seconds = timestamp[rows].astype(np.int64)
+    key = (user_id[rows] << 32) | (seconds & 0xFFFFFFFF)
+    if (key[1:] >= key[:-1]).all():
+        order = rows
+    else:
+        order = rows[np.argsort(key, kind="stable")]
+    users = user_id[order]
+    days = _local_days(timestamp[order].astype(np.int64))
+    same_counter = (users[1:] == users[:-1]) & (days[1:] == days[:-1])
+
+    # 分段累计最大值：每段加上足够大的偏移，使全局 cummax 不会跨段传播；
+    # 越界的步数已单独标记，这里先截断到合理范围，保证偏移后仍能被 float64 精确表示
+    values = np.clip(steps[order], STEPS_RANGE[0], STEPS_RANGE[1])
+    segment = np.cumsum(np.concatenate(([False], ~same_counter)))
+    span = STEPS_RANGE[1] - STEPS_RANGE[0] + 1
+    running_max = np.maximum.accumulate(values + segment * span) - segment * span
+
+    result[order[1:]] = same_counter & (values[1:] < running_max[:-1])
+    return result
+
+
+# ✅ 列式校验整批数据，返回每行的拒收原因位掩码（0 表示通过）
+def validate_columns(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    mask = np.zeros(len(columns["user_id"]), dtype=np.uint8)
+    mask |= _out_of_range(columns["heart_rate"], HEART_RATE_RANGE) * np.uint8(REJECT_HEART_RATE)
+    mask |= _invalid_blood_pressure(columns["blood_pressure"]) * np.uint8(REJECT_BLOOD_PRESSURE)
+    mask |= _out_of_range(columns["blood_sugar"], BLOOD_SUGAR_RANGE) * np.uint8(REJECT_BLOOD_SUGAR)
+    mask |= _out_of_range(columns["weight"], WEIGHT_RANGE) * np.uint8(REJECT_WEIGHT)
+    mask |= _out_of_range(columns["steps"], STEPS_RANGE) * np.uint8(REJECT_STEPS)
+    mask |= _decreasing_steps(columns["user_id"], columns["timestamp"], columns["steps"]) * np.uint8(REJECT_STEPS_DECREASING)
+    return mask
+
+
+def validate_batch(items: Sequence[HealthDataCreate]) -> np.ndarray:
+    if not items:
+        return np.zeros(0, dtype=np.uint8)
+    return validate_columns(to_columns(items))
+
+
+# ✅ 把位掩码展开成便于前端展示的拒收报告（只遍历被拒的行）
+def rejection_report(mask: np.ndarray) -> List[dict]:
+    report = []
+    for index in np.flatnonzero(mask):
+        bits = int(mask[index])
+        report.append({
+            "index": int(index),
+            "reasons": [name for bit, name in REJECT_REASONS.items() if bits & bit],
+        })
+    return report
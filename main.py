@@ -2,8 +2,9 @@ import os
 os.environ["CURL_CA_BUNDLE"] = ""  # 可选：避免部分 SSL 报错
 
 from fastapi import FastAPI, Depends, HTTPException, status, Query, Form, BackgroundTasks
-from routers import needs, tasks  # ✅ 导入新模块
+from routers import needs, tasks, matching as matching_router, availability as availability_router, search as search_router  # ✅ 导入新模块
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy import func
 from sqlalchemy.orm import Session
@@ -17,15 +18,20 @@ from email.mime.text import MIMEText
 from email.utils import formataddr
 
 # 项目内部模块
-from database import get_db
-from models import User, Task, Feedback
+from database import get_db, track_queries, ASYNC_DB, QUERY_GUARD
+from models import User, ProviderStats
 from routers import feedback  # ✅ 加在顶端
+import async_routes
 import crud
+import health_trend
+import matching
+import need_sweeper
+import scheduler
 from security import authenticate_user, create_access_token, get_current_user
 from schemas import (
     UserRegister, UserLogin, Token,
     ForgotPasswordRequest, VerifyCodeRequest, ResetPasswordRequest,
-    UserCreate, UserResponse,
+    UserCreate, UserResponse, ProfileResponse,
     AppointmentCreate, AppointmentResponse,
     HealthDataCreate, HealthDataResponse
 )
@@ -71,11 +77,49 @@ def send_reset_email(to_email: str, code: str):
 app = FastAPI()
 
 
+# ✅ 异步模式（DB_ASYNC=1）：挂载前把各路由模块的同步路由换成 async def 版本
+if ASYNC_DB:
+    for module in (needs, tasks, feedback, matching_router, availability_router, search_router):
+        async_routes.asyncify_router(module.router)
+
 # ✅ 挂载接口
 app.include_router(needs.router, prefix="/api/needs", tags=["需求"])
 app.include_router(tasks.router, prefix="/api/tasks", tags=["任务"])
 
 app.include_router(feedback.router, prefix="/api/feedback", tags=["反馈"])  # ✅ 加在挂载处
+app.include_router(matching_router.router, prefix="/api/matching", tags=["派单"])
+app.include_router(availability_router.router, prefix="/api/availability", tags=["空闲时间"])
+app.include_router(search_router.router, prefix="/api/search", tags=["检索"])
+
+
+# ✅ 定时任务（间隔秒数可用环境变量调整，设为 0 关闭）
+scheduler.register("matching", scheduler.interval_from_env("MATCHING_INTERVAL_SECONDS", 300), matching.run_scheduled)
+scheduler.register("need_sweeper", scheduler.interval_from_env("NEED_SWEEP_INTERVAL_SECONDS", 600), need_sweeper.run_scheduled)
+
+
+@app.on_event("startup")
+async def start_scheduler():
+    scheduler.start()
+
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    await scheduler.stop()
+
+
+# ✅ 开发 / 测试时打开 SQL_QUERY_GUARD=1：统计每个请求的 SQL 条数，出现关系懒加载直接报错
+if QUERY_GUARD:
+    @app.middleware("http")
+    async def query_guard(request, call_next):
+        with track_queries() as stats:
+            response = await call_next(request)
+        if stats["lazy_loads"]:
+            return JSONResponse(status_code=500, content={
+                "detail": "请求触发了关系懒加载（N+1），请在查询中显式指定加载策略",
+                "lazy_loads": stats["lazy_loads"],
+            })
+        response.headers["X-Query-Count"] = str(stats["queries"])
+        return response
 
 
 app.add_middleware(
@@ -104,7 +148,8 @@ def get_users(
     search: Optional[str] = Query(None),
     db: Session = Depends(get_db)
 ):
-    query = db.query(User)
+    # ✅ 接单数和评分直接取 provider_stats 里提交反馈时增量维护好的值，一条查询返回全部用户
+    query = db.query(User, ProviderStats).outerjoin(ProviderStats, ProviderStats.provider_id == User.id)
 
     # ✅ 正确添加 role=provider 的筛选逻辑
     if role:
@@ -113,19 +158,9 @@ def get_users(
     if search:
         query = query.filter(User.name.contains(search) | User.email.contains(search))
 
-    users = query.all()
-
     results = []
-    for user in users:
-        # ✅ 统计该用户接过多少个任务
-        service_count = db.query(Task).filter(Task.provider_id == user.id).count()
-
-        # ✅ 统计其平均评分：关联 Task -> Feedback，条件是 task.provider_id == user.id
-        avg_rating = db.query(func.avg(Feedback.rating))\
-            .join(Task, Feedback.task_id == Task.id)\
-            .filter(Task.provider_id == user.id)\
-            .scalar()
-
+    for user, stats in query.all():
+        feedback_count = stats.feedback_count if stats else 0
         results.append(UserResponse(
             id=user.id,
             name=user.name,
@@ -133,8 +168,10 @@ def get_users(
             email=user.email,
             phone=user.phone,
             role=user.role,
-            serviceCount=service_count,
-            averageRating=round(avg_rating or 0.0, 1)
+            serviceCount=stats.accepted_count if stats else 0,
+            averageRating=round(stats.rating_sum / feedback_count, 1) if feedback_count else 0.0,
+            ratingCount=feedback_count,
+            ratingScore=stats.rating_score if stats else None
         ))
 
     return results
@@ -163,42 +200,6 @@ def update_user(user_id: int, user_data: dict, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="用户未找到")
     return db_user
 
-@app.get("/users/", response_model=List[UserResponse])
-def get_users(
-    role: Optional[str] = Query(None),
-    search: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
-):
-    query = db.query(User)
-
-    if role:
-        query = query.filter(User.role == role)
-    if search:
-        query = query.filter(User.name.contains(search) | User.email.contains(search))
-
-    users = query.all()
-
-    # 手动添加 serviceCount 和 averageRating 字段
-    results = []
-    for user in users:
-        service_count = db.query(Task).filter(Task.provider_id == user.id).count()
-        avg_rating = db.query(Feedback).join(Task).filter(Task.provider_id == user.id).with_entities(
-            func.avg(Feedback.rating)
-        ).scalar()
-
-        results.append(UserResponse(
-            id=user.id,
-            name=user.name,
-            age=user.age,
-            email=user.email,
-            phone=user.phone,
-            role=user.role,
-            serviceCount=service_count,
-            averageRating=round(avg_rating or 0.0, 1)
-        ))
-
-    return results
-
 
 @app.post("/appointments/")
 def create_appointment(appointment: AppointmentCreate, db: Session = Depends(get_db)):
@@ -218,17 +219,36 @@ def delete_appointment(appointment_id: int, db: Session = Depends(get_db)):
     return {"message": "预约已取消"}
 
 
-@app.post("/health/")
+@app.post("/health/", response_model=HealthDataResponse)
 def create_health_data(health_data: HealthDataCreate, db: Session = Depends(get_db)):
     db_health = crud.create_health_data(db, health_data)
     return db_health
 
 
-@app.get("/health/{user_id}")
+# 批量上报健康数据（网关/手环高频数据）
+@app.post("/health/batch")
+def create_health_data_batch(items: List[HealthDataCreate], db: Session = Depends(get_db)):
+    return crud.create_health_data_batch(db, items)
+
+
+@app.get("/health/{user_id}", response_model=List[HealthDataResponse])
 def get_health_data(user_id: int, db: Session = Depends(get_db)):
     return crud.get_health_data(db, user_id)
 
 
+# 健康指标趋势：7 日 / 30 日移动平均及周环比（只返回平滑后的序列）
+@app.get("/health/{user_id}/trend")
+def get_health_trend(
+    user_id: int,
+    metric: str = Query("heart_rate"),
+    days: int = Query(90, ge=1, le=365),
+    db: Session = Depends(get_db)
+):
+    if metric not in health_trend.TREND_METRICS:
+        raise HTTPException(status_code=400, detail="不支持的健康指标")
+    return health_trend.compute_trend(db, user_id, metric, days)
+
+
 @app.post("/auth/register", response_model=Token)
 def register(user: UserRegister, db: Session = Depends(get_db)):
     db_user = crud.get_user_by_email(db, user.email)
@@ -243,7 +263,7 @@ def register(user: UserRegister, db: Session = Depends(get_db)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-@app.get("/me", response_model=UserResponse)
+@app.get("/me", response_model=ProfileResponse)
 def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
 
@@ -319,19 +339,20 @@ def reset_password(data: ResetPasswordRequest, db: Session = Depends(get_db)):
 
 
     # 获取当前用户的个人资料
-@app.get("/profile", response_model=UserResponse)
+@app.get("/profile", response_model=ProfileResponse)
 def get_profile(current_user: User = Depends(get_current_user)):
     return current_user
 
 
 # 更新当前用户的个人资料
-@app.put("/profile", response_model=UserResponse)
+@app.put("/profile", response_model=ProfileResponse)
 def update_profile(
     updated: UserCreate,  # 👈 注意：你也可以新建一个 ProfileUpdate schema 更合理
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_user = crud.update_user(db, user_id=current_user.id, user_data=updated.dict())
+    # 只更新请求里带了的字段，没传 lat/lng 的旧客户端不会把常驻位置清空
+    db_user = crud.update_user(db, user_id=current_user.id, user_data=updated.dict(exclude_unset=True))
     if not db_user:
         raise HTTPException(status_code=404, detail="用户未找到")
     return db_user
@@ -0,0 +1,303 @@
+import math
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from fastapi import HTTPException
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+from scipy.spatial import cKDTree
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import Feedback, ServiceNeed, Task, User
+import availability
+import crud
+import geo
+
+# ✅ 派单代价参数：代价 = 距离(km) + 在手任务数 × WORKLOAD_WEIGHT - (评分 - 中性分) × RATING_WEIGHT
+WORKLOAD_WEIGHT = 2.0
+RATING_WEIGHT = 1.5
+NEUTRAL_RATING = 3.0
+MAX_ONGOING_TASKS = 3        # 每位服务者同时进行中的任务上限
+MAX_MATCH_KM = 30.0          # 超过该距离不派单
+UNKNOWN_DISTANCE_KM = 10.0   # 需求或服务者没有坐标时按此距离计算
+K_CANDIDATES = 20            # 每个需求只考虑最近的若干位服务者
+UNASSIGNED_COST = 1e6        # “不派单”的代价，远大于任何真实派单
+
+_latest_plan: Optional[dict] = None
+_latest_lock = threading.Lock()
+
+
+def _haversine(lat1, lng1, lat2, lng2) -> np.ndarray:
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * geo.EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _project_km(lat: np.ndarray, lng: np.ndarray, ref_lat: float) -> np.ndarray:
+    # 城市范围内用等距圆柱投影近似成平面坐标（km），用于 KD 树找近邻
+    return np.column_stack((
+        np.radians(lng) * geo.EARTH_RADIUS_KM * math.cos(math.radians(ref_lat)),
+        np.radians(lat) * geo.EARTH_RADIUS_KM,
+    ))
+
+
+def _candidate_pairs(need_lat, need_lng, provider_lat, provider_lng, base_cost, available, k):
+    # 返回候选边 (需求下标, 服务者下标, 距离 km)：有坐标的需求只连最近的 k 位服务者，
+    # 没有坐标的一方按 UNKNOWN_DISTANCE_KM 计，连向基础代价最低的 k 位服务者
+    need_known = ~(np.isnan(need_lat) | np.isnan(need_lng))
+    provider_known = ~(np.isnan(provider_lat) | np.isnan(provider_lng)) & available
+    provider_unknown = np.flatnonzero(~provider_known & available)
+
+    needs_idx, providers_idx, distances = [], [], []
+
+    located = np.flatnonzero(provider_known)
+    known_needs = np.flatnonzero(need_known)
+    if len(located) and len(known_needs):
+        ref_lat = float(np.mean(need_lat[known_needs]))
+        tree = cKDTree(_project_km(provider_lat[located], provider_lng[located], ref_lat))
+        kk = min(k, len(located))
+        dist, idx = tree.query(
+            _project_km(need_lat[known_needs], need_lng[known_needs], ref_lat),
+            k=kk, distance_upper_bound=MAX_MATCH_KM * 1.05,
+        )
+        dist, idx = dist.reshape(len(known_needs), kk), idx.reshape(len(known_needs), kk)
+        hit = idx < len(located)
+        rows = np.repeat(known_needs, kk).reshape(len(known_needs), kk)[hit]
+        cols = located[idx[hit]]
+        exact = _haversine(need_lat[rows], need_lng[rows], provider_lat[cols], provider_lng[cols])
+        keep = exact <= MAX_MATCH_KM
+        needs_idx.append(rows[keep])
+        providers_idx.append(cols[keep])
+        distances.append(exact[keep])
+
+    # 没有坐标的服务者 / 需求：在基础代价最低的若干位中挑
+    fallback = np.flatnonzero(available)
+    fallback = fallback[np.argsort(base_cost[fallback], kind="stable")[:k]]
+    if len(provider_unknown):
+        fallback_for_known = provider_unknown[np.argsort(base_cost[provider_unknown], kind="stable")[:k]]
+        rows = np.repeat(known_needs, len(fallback_for_known))
+        needs_idx.append(rows)
+        providers_idx.append(np.tile(fallback_for_known, len(known_needs)))
+        distances.append(np.full(len(rows), UNKNOWN_DISTANCE_KM))
+    unknown_needs = np.flatnonzero(~need_known)
+    if len(unknown_needs) and len(fallback):
+        rows = np.repeat(unknown_needs, len(fallback))
+        needs_idx.append(rows)
+        providers_idx.append(np.tile(fallback, len(unknown_needs)))
+        distances.append(np.full(len(rows), UNKNOWN_DISTANCE_KM))
+
+    if not needs_idx:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+    return np.concatenate(needs_idx), np.concatenate(providers_idx), np.concatenate(distances)
+
+
+# ✅ 纯数组版本的最小代价二分匹配：每位服务者按剩余容量拆成多个“槽位”，
+# 第 s 个槽位的代价里工作量按 workload + s 计，保证同一人多接单的代价递增；
+# 每个需求只连最近的 K_CANDIDATES 位服务者，再给每个需求加一个代价很高的“不派单”虚拟槽位，
+# 在稀疏图上求最小权完美匹配，几千 × 几千的规模也能在秒级完成
+def assign(need_lat: np.ndarray, need_lng: np.ndarray,
+           provider_lat: np.ndarray, provider_lng: np.ndarray,
+           workload: np.ndarray, rating: np.ndarray,
+           max_ongoing: int = MAX_ONGOING_TASKS, k: int = None,
+           pair_filter: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None) -> List[tuple]:
+    k = k or K_CANDIDATES
+    n_needs = len(need_lat)
+    capacity = np.clip(max_ongoing - workload, 0, None).astype(np.int64)
+    if n_needs == 0 or capacity.sum() == 0:
+        return []
+
+    # 槽位数不必超过平均每人需要承担的单量
+    per_provider = max(1, math.ceil(n_needs / max(np.count_nonzero(capacity), 1)) + 1)
+    slots = np.minimum(capacity, per_provider)
+    slot_start = np.concatenate(([0], np.cumsum(slots)[:-1]))
+    n_slots = int(slots.sum())
+
+    base_cost = workload * WORKLOAD_WEIGHT - (rating - NEUTRAL_RATING) * RATING_WEIGHT
+    rows, providers, distance = _candidate_pairs(
+        need_lat, need_lng, provider_lat, provider_lng, base_cost, capacity > 0, k
+    )
+    # 额外的可行性约束（如服务者在需求时间段内是否有空），返回与候选边等长的布尔数组
+    if pair_filter is not None and len(rows):
+        keep = pair_filter(rows, providers)
+        rows, providers, distance = rows[keep], providers[keep], distance[keep]
+
+    # 每条候选边按服务者的槽位展开
+    edge_slots = slots[providers]
+    edge_rows = np.repeat(rows, edge_slots)
+    edge_providers = np.repeat(providers, edge_slots)
+    edge_distance = np.repeat(distance, edge_slots)
+    rank = np.arange(len(edge_rows)) - np.repeat(np.cumsum(edge_slots) - edge_slots, edge_slots)
+    edge_cols = slot_start[edge_providers] + rank
+    edge_cost = edge_distance + base_cost[edge_providers] + rank * WORKLOAD_WEIGHT
+
+    # 虚拟“不派单”槽位：第 i 个需求独占第 n_slots + i 列
+    all_rows = np.concatenate((edge_rows, np.arange(n_needs)))
+    all_cols = np.concatenate((edge_cols, n_slots + np.arange(n_needs)))
+    all_cost = np.concatenate((edge_cost, np.full(n_needs, UNASSIGNED_COST)))
+    # 稀疏矩阵里 0 表示“无边”，整体平移保证权重为正
+    weights = all_cost - min(all_cost.min(), 0) + 1.0
+    graph = csr_matrix((weights, (all_rows, all_cols)), shape=(n_needs, n_slots + n_needs))
+
+    matched_rows, matched_cols = min_weight_full_bipartite_matching(graph)
+
+    lookup = {(int(r), int(c)): (int(p), float(d), float(cost))
+              for r, c, p, d, cost in zip(edge_rows, edge_cols, edge_providers, edge_distance, edge_cost)}
+    result = []
+    for r, c in zip(matched_rows, matched_cols):
+        if c >= n_slots:
+            continue  # 命中虚拟槽位，本轮不派单
+        p, d, cost = lookup[(int(r), int(c))]
+        result.append((int(r), p, d, cost))
+    return result
+
+
+def _busy_matrix(n_providers: int, busy: List[tuple]):
+    # busy: [(服务者下标, 开始, 结束)] -> 两个 (服务者数, 每人最多几段) 的 datetime64 矩阵，空位为 NaT（与任何时间比较都为假）
+    counts = np.bincount(np.array([p for p, _, _ in busy], dtype=np.int64), minlength=n_providers)
+    width = max(int(counts.max(initial=0)), 1)
+    starts = np.full((n_providers, width), np.datetime64("NaT"), dtype="datetime64[s]")
+    ends = starts.copy()
+    filled = np.zeros(n_providers, dtype=np.int64)
+    for p, start, end in busy:
+        starts[p, filled[p]], ends[p, filled[p]] = start, end
+        filled[p] += 1
+    return starts, ends
+
+
+def _without_conflicts(assignments: List[tuple], need_start: np.ndarray, need_end: np.ndarray):
+    # 同一位服务者在一轮里分到时间重叠的需求时，按代价从低到高保留不冲突的，其余退回重新派单
+    kept, dropped = [], []
+    taken: Dict[int, List[tuple]] = {}
+    for r, p, distance, cost in sorted(assignments, key=lambda a: a[3]):
+        start, end = need_start[r], need_end[r]
+        windows = taken.setdefault(p, [])
+        if any(start < e and end > s for s, e in windows):  # 没有时间的需求是 NaT，永远不冲突
+            dropped.append(r)
+            continue
+        windows.append((start, end))
+        kept.append((r, p, distance, cost))
+    return kept, dropped
+
+
+# ✅ 从数据库取出所有未接单需求和可用服务者，计算全局派单方案（不落库）。
+# 与接单时的检查一致，不派给服务时间与服务者进行中任务重叠的需求；
+# 一轮匹配里同一人分到时间重叠的需求时只留一个，其余需求带着新占用的时间再匹配一轮，直到没有冲突
+def compute_plan(db: Session) -> dict:
+    started = datetime.utcnow()
+    needs = (
+        db.query(ServiceNeed.id, ServiceNeed.lat, ServiceNeed.lng, ServiceNeed.start_at, ServiceNeed.end_at)
+        .filter(ServiceNeed.status == "open")
+        .all()
+    )
+    providers = db.query(User.id, User.lat, User.lng).filter(User.role == "provider").all()
+
+    ongoing = (
+        db.query(Task.provider_id, ServiceNeed.start_at, ServiceNeed.end_at)
+        .join(ServiceNeed, Task.need_id == ServiceNeed.id)
+        .filter(Task.status == "ongoing")
+        .all()
+    )
+    ratings = dict(
+        db.query(Task.provider_id, func.avg(Feedback.rating))
+        .join(Feedback, Feedback.task_id == Task.id)
+        .group_by(Task.provider_id)
+        .all()
+    )
+
+    # 有结构化服务时间的需求只派给当时有空的服务者（从未登记空闲时间的服务者不受限制）
+    windows = [(n.start_at, n.end_at) if n.start_at is not None else None for n in needs]
+    provider_ids = np.array([p.id for p in providers], dtype=np.int64)
+    provider_index = {pid: i for i, pid in enumerate(provider_ids.tolist())}
+    need_start = np.array([n.start_at for n in needs], dtype="datetime64[s]")
+    need_end = np.array([n.end_at for n in needs], dtype="datetime64[s]")
+
+    workload = np.zeros(len(providers), dtype=np.int64)
+    busy = []
+    for provider_id, start_at, end_at in ongoing:
+        p = provider_index.get(provider_id)
+        if p is None:
+            continue
+        workload[p] += 1
+        if start_at is not None:
+            busy.append((p, np.datetime64(start_at, "s"), np.datetime64(end_at, "s")))
+
+    def column(rows, index):
+        return np.array([np.nan if row[index] is None else row[index] for row in rows], dtype=np.float64)
+
+    need_lat, need_lng = column(needs, 1), column(needs, 2)
+    provider_lat, provider_lng = column(providers, 1), column(providers, 2)
+    rating = np.array([float(ratings.get(p.id) or NEUTRAL_RATING) for p in providers], dtype=np.float64)
+
+    assignments = []
+    pending = np.arange(len(needs))
+    while len(pending):
+        busy_start, busy_end = _busy_matrix(len(providers), busy)
+        subset_windows = [windows[i] for i in pending.tolist()]
+
+        def pair_filter(rows, cols):
+            need_rows = pending[rows]
+            overlaps = (
+                (need_start[need_rows][:, None] < busy_end[cols]) & (need_end[need_rows][:, None] > busy_start[cols])
+            ).any(axis=1)
+            return ~overlaps & availability.availability_index.pairs_free(db, subset_windows, rows, provider_ids[cols])
+
+        matched = [
+            (int(pending[r]), p, distance, cost)
+            for r, p, distance, cost in assign(
+                need_lat[pending], need_lng[pending], provider_lat, provider_lng, workload, rating,
+                pair_filter=pair_filter,
+            )
+        ]
+        kept, dropped = _without_conflicts(matched, need_start, need_end)
+        assignments.extend(kept)
+        for r, p, _, _ in kept:
+            workload[p] += 1
+            if windows[r] is not None:
+                busy.append((p, need_start[r], need_end[r]))
+        pending = np.array(sorted(dropped), dtype=np.int64)
+
+    assigned = {r for r, _, _, _ in assignments}
+    return {
+        "computed_at": started.isoformat(),
+        "open_needs": len(needs),
+        "providers": len(providers),
+        "assignments": [
+            {
+                "need_id": needs[r].id,
+                "provider_id": providers[p].id,
+                "distance_km": round(distance, 3),
+                "cost": round(cost, 3),
+            }
+            for r, p, distance, cost in sorted(assignments)
+        ],
+        "unassigned_need_ids": [need.id for i, need in enumerate(needs) if i not in assigned],
+        "elapsed_ms": round((datetime.utcnow() - started).total_seconds() * 1000, 1),
+    }
+
+
+# ✅ 按方案派单：逐条走原子接单，已被他人抢走的需求会被跳过并记录原因
+def apply_plan(db: Session, plan: dict, actor_id: Optional[int] = None) -> List[Dict]:
+    results = []
+    for item in plan["assignments"]:
+        try:
+            task = crud.accept_need(db, item["need_id"], item["provider_id"], actor_id)
+            results.append(dict(item, status="assigned", task_id=task.id))
+        except HTTPException as e:
+            results.append(dict(item, status="skipped", reason=e.detail))
+    return results
+
+
+def run_scheduled(db: Session):
+    global _latest_plan
+    plan = compute_plan(db)
+    with _latest_lock:
+        _latest_plan = plan
+
+
+def latest_plan() -> Optional[dict]:
+    with _latest_lock:
+        return _latest_plan
@@ -1,5 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Float, Date, DateTime, ForeignKey, Text, LargeBinary, JSON,
+    UniqueConstraint, Index, DDL, event, text,
+)
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 from database import Base
 
@@ -15,12 +18,16 @@ class User(Base):
     phone = Column(String, unique=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     role = Column(String, nullable=False, default="provider")  # admin / provider
+    lat = Column(Float, nullable=True)  # 服务者常驻位置，用于派单
+    lng = Column(Float, nullable=True)
 
     appointments = relationship("Appointment", back_populates="user", cascade="all, delete-orphan")
     health_data = relationship("HealthData", back_populates="user", cascade="all, delete-orphan")
+    health_series = relationship("HealthSeries", back_populates="user", cascade="all, delete-orphan")
     
     service_needs = relationship("ServiceNeed", back_populates="creator", cascade="all, delete-orphan")
     tasks = relationship("Task", back_populates="provider", cascade="all, delete-orphan")
+    availability = relationship("ProviderAvailability", back_populates="provider", cascade="all, delete-orphan")
 
 # 预约模型
 class Appointment(Base):
@@ -37,6 +44,9 @@ class Appointment(Base):
 # 健康数据模型
 class HealthData(Base):
     __tablename__ = "health_data"
+    __table_args__ = (
+        Index("ix_health_data_user_timestamp", "user_id", "timestamp"),  # 按用户 + 时间范围查询（趋势分析）
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -46,9 +56,41 @@ class HealthData(Base):
     weight = Column(Float, nullable=True)
     steps = Column(Integer, nullable=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    dedup_key = Column(String(64), unique=True, nullable=True)  # 客户端读数 id 或内容哈希，用于重传去重
 
     user = relationship("User", back_populates="health_data")
 
+# 健康数据压缩序列（高频心率、步数：每用户每指标每天一行，payload 为差分 + varint 编码）
+class HealthSeries(Base):
+    __tablename__ = "health_series"
+    __table_args__ = (
+        UniqueConstraint("user_id", "metric", "day", name="uq_health_series_user_metric_day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    metric = Column(String(20), nullable=False)  # heart_rate / steps
+    day = Column(Date, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    value_sum = Column(BigInteger, nullable=False, default=0)  # 当天读数之和，便于直接在 SQL 中做聚合
+    payload = Column(LargeBinary, nullable=False)
+
+    user = relationship("User", back_populates="health_series")
+
+# 服务者空闲时间（每人每天一行）：slots 为 96 位位图，每位对应 15 分钟，1 表示空闲，共 12 字节
+class ProviderAvailability(Base):
+    __tablename__ = "provider_availability"
+    __table_args__ = (
+        Index("ix_provider_availability_day", "day"),
+    )
+
+    provider_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    slots = Column(LargeBinary(12), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    provider = relationship("User", back_populates="availability")
+
 # 服务需求模型（社区端发布）
 class ServiceNeed(Base):
     __tablename__ = "service_needs"
@@ -57,22 +99,61 @@ class ServiceNeed(Base):
     title = Column(String(100), nullable=False)
     description = Column(Text, nullable=False)
     address = Column(String(200), nullable=False)
-    time = Column(String(100), nullable=False)
-    status = Column(String(20), default="open")  # open / accepted / completed
+    time = Column(String(100), nullable=False)  # 用户填写的原文，仅用于展示
+    start_at = Column(DateTime, nullable=True)  # 由 time 解析出的服务时间段（当地时间），解析不出为空
+    end_at = Column(DateTime, nullable=True)
+    status = Column(String(20), default="open")  # open / accepted / completed / expired（服务时间已过无人接单）
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
+    escalated_at = Column(DateTime, nullable=True)  # 到了服务时间仍无人接单、已提醒社区跟进的时间（社区当地时间，与 start_at 一致）
+    lat = Column(Float, nullable=True)  # 创建时由本地地名库解析地址得到
+    lng = Column(Float, nullable=True)
+    # 标题 + 描述 + 地址的 MinHash 签名，用于重复需求检测；延迟加载，列表查询不带出这 256 字节
+    minhash = deferred(Column(LargeBinary, nullable=True))
+    duplicate_of = Column(Integer, nullable=True)  # 创建时判定的疑似重复需求（仅提示，不拦截）
 
     creator = relationship("User", back_populates="service_needs")
     task = relationship("Task", back_populates="need", uselist=False)
 
+    __table_args__ = (
+        Index("ix_service_needs_start_end", "start_at", "end_at"),  # 按时间段筛选 / 冲突检测
+        Index("ix_service_needs_status_start", "status", "start_at"),  # 过期清理按状态 + 开始时间范围扫描
+        # 部分索引：只索引未接单的需求（服务者端列表），已接单 / 已完成的历史数据不占索引
+        Index(
+            "ix_service_needs_open", "id",
+            postgresql_where=text("status = 'open'"),
+            sqlite_where=text("status = 'open'"),
+        ),
+    )
+
+# 重复需求检测的 LSH 桶：每个需求的 MinHash 签名分段哈希成若干桶号，同桶的需求才做相似度比较
+class NeedLshBand(Base):
+    __tablename__ = "need_lsh_bands"
+
+    need_id = Column(Integer, ForeignKey("service_needs.id", ondelete="CASCADE"), primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+
+    __table_args__ = (
+        Index("ix_need_lsh_bands_bucket", "bucket"),
+    )
+
+# 地名库（地址关键字 -> 坐标，用于本地地理编码）
+class Gazetteer(Base):
+    __tablename__ = "gazetteer"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), unique=True, nullable=False)
+    lat = Column(Float, nullable=False)
+    lng = Column(Float, nullable=False)
+
 # 接单任务模型（服务者接单）
 class Task(Base):
     __tablename__ = "tasks"
 
     id = Column(Integer, primary_key=True, index=True)
-    need_id = Column(Integer, ForeignKey("service_needs.id"))
+    need_id = Column(Integer, ForeignKey("service_needs.id"), unique=True)  # 一个需求只能被一个服务者接单
     provider_id = Column(Integer, ForeignKey("users.id"))
-    status = Column(String(20), default="ongoing")  # ongoing / done
+    status = Column(String(20), default="ongoing")  # ongoing / completed
     accepted_at = Column(DateTime, default=datetime.utcnow)
 
     need = relationship("ServiceNeed", back_populates="task")
@@ -84,10 +165,100 @@ class Feedback(Base):
     __tablename__ = "feedbacks"
 
     id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("tasks.id"))
+    task_id = Column(Integer, ForeignKey("tasks.id"), unique=True)  # 一个任务只能有一条反馈
     elder_name = Column(String(50), nullable=False)
     comment = Column(Text, nullable=False)
     rating = Column(Integer, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     task = relationship("Task", back_populates="feedback")
+
+    __table_args__ = (
+        Index("ix_feedbacks_created", "created_at", "id"),  # 反馈列表按时间倒序游标分页
+    )
+
+# 任务生命周期事件（只追加、不修改）：accepted / completed / feedback。
+# 不加外键：删除用户 / 任务后历史记录仍然保留
+class TaskEvent(Base):
+    __tablename__ = "task_events"
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=False)
+    need_id = Column(Integer, nullable=False)
+    provider_id = Column(Integer, nullable=False)
+    actor_id = Column(Integer, nullable=True)  # 操作人，如接单的服务者、提交反馈的管理员
+    type = Column(String(20), nullable=False)
+    data = Column(JSON, nullable=True)  # 如反馈评分
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_task_events_task", "task_id", "id"),  # 单个任务的历史
+        Index("ix_task_events_provider", "provider_id", "id"),  # 服务者的历史
+    )
+
+# 服务者统计投影（由 task_events 增量维护，可随时从事件重建）
+class ProviderStats(Base):
+    __tablename__ = "provider_stats"
+
+    provider_id = Column(Integer, primary_key=True)
+    accepted_count = Column(Integer, nullable=False, default=0)
+    ongoing_count = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+    feedback_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    # 1~5 星各有多少条反馈
+    rating_1 = Column(Integer, nullable=False, default=0)
+    rating_2 = Column(Integer, nullable=False, default=0)
+    rating_3 = Column(Integer, nullable=False, default=0)
+    rating_4 = Column(Integer, nullable=False, default=0)
+    rating_5 = Column(Integer, nullable=False, default=0)
+    rating_score = Column(Float, nullable=True)  # 贝叶斯平均分（见 ratings.py），没有反馈时为空
+    last_event_id = Column(Integer, nullable=True)  # 已投影到的最后一个事件
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+# 服务者评分的按周 / 按月汇总（由 task_events 的反馈事件增量维护，可随时从事件重建），供评分趋势图使用
+class ProviderRatingBucket(Base):
+    __tablename__ = "provider_rating_buckets"
+
+    provider_id = Column(Integer, primary_key=True)
+    period = Column(String(10), primary_key=True)  # week / month
+    period_start = Column(Date, primary_key=True)  # 周一 / 每月 1 日
+    feedback_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+
+# 全文检索文档：需求（标题 + 描述 + 地址）和反馈（老人姓名 + 评价内容）切成中文二元组后的词串，空格分隔。
+# PostgreSQL 用生成列 tsv 的 GIN 索引；SQLite 用 FTS5 外部内容表 search_fts，由触发器同步
+class SearchDocument(Base):
+    __tablename__ = "search_documents"
+
+    id = Column(Integer, primary_key=True)
+    doc_type = Column(String(20), nullable=False)  # need / feedback
+    doc_id = Column(Integer, nullable=False)
+    tokens = Column(Text, nullable=False)
+    length = Column(Integer, nullable=False)  # 词数，BM25 长度归一化用
+
+    __table_args__ = (
+        UniqueConstraint("doc_type", "doc_id", name="uq_search_documents_doc"),
+    )
+
+
+# PostgreSQL：存储生成列 tsv + GIN 索引（不映射到模型，只在检索 SQL 里使用）。
+# 不用表达式索引：按 id 倒序取候选时每行都要重算 to_tsvector，百万行下慢一个数量级
+for _statement in (
+    "ALTER TABLE search_documents ADD COLUMN tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', tokens)) STORED",
+    "CREATE INDEX ix_search_documents_tsv ON search_documents USING gin (tsv)",
+):
+    event.listen(SearchDocument.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+
+# SQLite：FTS5 外部内容表，触发器保持与 search_documents 同步
+for _statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(tokens, content='search_documents', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN "
+    "INSERT INTO search_fts(rowid, tokens) VALUES (new.id, new.tokens); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, tokens) VALUES ('delete', old.id, old.tokens); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, tokens) VALUES ('delete', old.id, old.tokens); "
+    "INSERT INTO search_fts(rowid, tokens) VALUES (new.id, new.tokens); END",
+):
+    event.listen(SearchDocument.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
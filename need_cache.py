@@ -0,0 +1,73 @@
+import hashlib
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+from database import on_event_loop
+from models import ServiceNeed
+from schemas import ServiceNeedOut
+import events
+
+# 缓存最长有效期（秒）：本进程的写入会立即失效缓存，这里兜底其他进程 / 其他实例的写入
+OPEN_NEEDS_CACHE_TTL = 10
+
+_adapter = TypeAdapter(List[ServiceNeedOut])
+
+
+class OpenNeedsCache:
+    # ✅ 未接单需求列表的进程内缓存：保存序列化好的 JSON 字节和 ETag，命中时不查库也不走 Pydantic。
+    # 每次失效版本号 +1；重建期间若又发生失效，重建结果不写回，避免缓存旧数据
+    def __init__(self, ttl: float = OPEN_NEEDS_CACHE_TTL):
+        self.ttl = ttl
+        self._version = 0
+        self._entry: Optional[Tuple[bytes, str, float]] = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def invalidate(self, *_):
+        with self._lock:
+            self._version += 1
+            self._entry = None
+
+    def _fresh(self) -> Optional[Tuple[bytes, str]]:
+        entry = self._entry
+        if entry is not None and time.monotonic() - entry[2] < self.ttl:
+            return entry[0], entry[1]
+        return None
+
+    def get(self, db: Session) -> Tuple[bytes, str]:
+        hit = self._fresh()
+        if hit is not None:
+            return hit
+
+        # 同时未命中的请求只让一个去查库，其余等它建好直接复用。
+        # 异步模式下这段代码跑在事件循环上，等锁会卡住所有请求：拿不到锁就自己查一次
+        if not self._build_lock.acquire(blocking=not on_event_loop()):
+            return self._build(db)
+        try:
+            hit = self._fresh()
+            if hit is not None:
+                return hit
+            return self._build(db)
+        finally:
+            self._build_lock.release()
+
+    def _build(self, db: Session) -> Tuple[bytes, str]:
+        with self._lock:
+            version = self._version
+        needs = db.query(ServiceNeed).filter(ServiceNeed.status == "open").all()
+        body = _adapter.dump_json(_adapter.validate_python(needs, from_attributes=True))
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        with self._lock:
+            if self._version == version:
+                self._entry = (body, etag, time.monotonic())
+        return body, etag
+
+
+open_needs_cache = OpenNeedsCache()
+
+# 需求的创建 / 接单 / 完成都会发布事件，统一在这里失效缓存
+events.bus.add_listener(open_needs_cache.invalidate)
@@ -0,0 +1,138 @@
+# 重复需求检测：标题 + 描述 + 地址按字符二元组切分，计算 MinHash 签名（NUM_PERM 个 32 位最小哈希）；
+# 签名分成 BANDS 段，每段哈希成一个桶号存入 need_lsh_bands。新需求只需按桶号查出同桶的近期未接单需求，
+# 再用签名估计相似度，不必逐条比对全部描述
+import hashlib
+import re
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from models import NeedLshBand, ServiceNeed
+
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+# 估计的 Jaccard 相似度达到该值视为重复（16 段 × 4 行时，相似度 0.7 的需求有约 99% 概率落入同一桶）
+DUPLICATE_THRESHOLD = 0.7
+# 只和最近这段时间内发布、仍未接单的需求比较
+DUPLICATE_LOOKBACK = timedelta(days=14)
+# 批量查桶时每条 IN 的桶号个数
+BUCKET_QUERY_CHUNK = 5000
+
+_PRIME = (1 << 31) - 1  # 32 位 crc 乘以小于 2^31 的系数不会溢出 uint64
+_rng = np.random.default_rng(20240501)  # 固定种子：签名要跨进程、跨重启保持一致
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)[:, None]
+_NOISE = re.compile(r"[\W_]+")
+
+
+def _shingles(text: str) -> List[str]:
+    text = _NOISE.sub("", text.lower())
+    if len(text) < 2:
+        return [text]
+    return list({text[i:i + 2] for i in range(len(text) - 1)})
+
+
+# ✅ MinHash 签名（NUM_PERM 个 uint32）
+def signature(title: str, description: str, address: str) -> np.ndarray:
+    grams = _shingles(f"{title} {description} {address}")
+    x = np.array([zlib.crc32(g.encode("utf-8")) for g in grams], dtype=np.uint64)[None, :]
+    return ((_A * x + _B) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def buckets(sig: np.ndarray) -> List[int]:
+    # 每段签名连同段号一起哈希成 64 位有符号整数（BigInteger 列）
+    return [
+        int.from_bytes(
+            hashlib.blake2b(bytes([band]) + sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes(),
+                            digest_size=8).digest(),
+            "big", signed=True,
+        )
+        for band in range(BANDS)
+    ]
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def _overlaps(window: Tuple[Optional[datetime], Optional[datetime]], start_at, end_at) -> bool:
+    # 两边都有结构化时间时，时间段不重叠说明是不同日期的同类服务，不算重复
+    if window[0] is None or start_at is None:
+        return True
+    return window[0] < end_at and start_at < window[1]
+
+
+# ✅ 批量查重：items 为 [(签名, (start_at, end_at))]，返回每条对应的疑似重复需求 id（没有为 None）。
+# 所有桶号一起查库（按 BUCKET_QUERY_CHUNK 分批），同一桶里的候选再按签名相似度挑最像的一条
+def find_duplicates(db: Session, items: Sequence[Tuple[np.ndarray, tuple]]) -> List[Optional[int]]:
+    item_buckets = [buckets(sig) for sig, _ in items]
+    wanted = sorted({b for bs in item_buckets for b in bs})
+    cutoff = datetime.utcnow() - DUPLICATE_LOOKBACK
+
+    # 分两步查：先按桶号索引取需求 id，再按主键取候选需求。写成一条 JOIN 时 SQLite 会从未接单需求的部分索引出发，
+    # 逐条探测桶表，需求越多越慢
+    by_bucket: Dict[int, List[int]] = {}
+    for start in range(0, len(wanted), BUCKET_QUERY_CHUNK):
+        rows = (
+            db.query(NeedLshBand.bucket, NeedLshBand.need_id)
+            .filter(NeedLshBand.bucket.in_(wanted[start:start + BUCKET_QUERY_CHUNK]))
+            .all()
+        )
+        for bucket, need_id in rows:
+            by_bucket.setdefault(bucket, []).append(need_id)
+
+    need_ids = sorted({need_id for ids in by_bucket.values() for need_id in ids})
+    candidates: Dict[int, tuple] = {}
+    for start in range(0, len(need_ids), BUCKET_QUERY_CHUNK):
+        rows = (
+            db.query(ServiceNeed.id, ServiceNeed.minhash, ServiceNeed.start_at, ServiceNeed.end_at)
+            .filter(
+                ServiceNeed.id.in_(need_ids[start:start + BUCKET_QUERY_CHUNK]),
+                ServiceNeed.status == "open",
+                ServiceNeed.created_at >= cutoff,
+            )
+            .all()
+        )
+        for need_id, minhash, start_at, end_at in rows:
+            candidates[need_id] = (np.frombuffer(minhash, dtype=np.uint32), start_at, end_at)
+
+    result = []
+    for (sig, window), bs in zip(items, item_buckets):
+        best, best_score = None, DUPLICATE_THRESHOLD
+        for need_id in sorted({n for b in bs for n in by_bucket.get(b, ()) if n in candidates}):
+            other, start_at, end_at = candidates[need_id]
+            score = similarity(sig, other)
+            if score >= best_score and (best is None or score > best_score) and _overlaps(window, start_at, end_at):
+                best, best_score = need_id, score
+        result.append(best)
+    return result
+
+
+# ✅ 把需求的桶号写入索引（与需求本身在同一事务中，由调用方提交）
+def index_needs(db: Session, need_ids: Sequence[int], signatures: Sequence[np.ndarray]):
+    rows = [
+        {"need_id": need_id, "bucket": bucket}
+        for need_id, sig in zip(need_ids, signatures)
+        for bucket in buckets(sig)
+    ]
+    if rows:
+        db.execute(insert(NeedLshBand), rows)
+
+
+# ✅ 清理超出比对期限的桶（按需求 id 范围删除：id 随创建时间递增），由过期需求清理任务顺带执行
+def prune(db: Session) -> int:
+    cutoff = datetime.utcnow() - DUPLICATE_LOOKBACK
+    first_recent = (
+        db.query(ServiceNeed.id).filter(ServiceNeed.created_at >= cutoff).order_by(ServiceNeed.id).limit(1).scalar()
+    )
+    query = db.query(NeedLshBand)
+    if first_recent is not None:
+        query = query.filter(NeedLshBand.need_id < first_recent)
+    pruned = query.delete(synchronize_session=False)
+    db.commit()
+    return pruned
@@ -0,0 +1,126 @@
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from schemas import ServiceNeedCreate
+
+# 单次导入的最大行数
+MAX_IMPORT_ROWS = 10000
+
+# ✅ 表格列名（中英文均可，表头不区分大小写、忽略首尾空格）
+COLUMN_ALIASES = {
+    "title": "title", "标题": "title", "服务项目": "title",
+    "description": "description", "描述": "description", "说明": "description", "服务内容": "description",
+    "address": "address", "地址": "address", "服务地址": "address",
+    "time": "time", "时间": "time", "服务时间": "time",
+    "start_at": "start_at", "开始时间": "start_at",
+    "end_at": "end_at", "结束时间": "end_at",
+}
+
+
+async def _line_batches(chunks: AsyncIterator[bytes], encoding: str) -> AsyncIterator[List[str]]:
+    # 边收边解码，每收到一块就切出其中完整的行，不把整个文件读进内存
+    decoder = codecs.getincrementaldecoder(encoding)(errors="strict")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *complete, pending = pending.split("\n")
+        if complete:
+            yield complete
+    pending += decoder.decode(b"", final=True)
+    if pending.strip():
+        yield [pending]
+
+
+class _CsvParser:
+    # 第一行为表头；引号内的换行会让一条记录跨多行，引号个数为奇数说明字段还没结束，拼上下一行
+    def __init__(self):
+        self.header = None
+        self.buffered = None
+        self.line_no = 0
+
+    def feed(self, lines: List[str]) -> List[Tuple[int, Optional[dict], Optional[str]]]:
+        texts, numbers = [], []
+        for line in lines:
+            self.line_no += 1
+            line = line.rstrip("\r")
+            self.buffered = line if self.buffered is None else self.buffered + "\n" + line
+            if self.buffered.count('"') % 2:
+                continue
+            if self.buffered.strip():
+                texts.append(self.buffered)
+                numbers.append(self.line_no)
+            self.buffered = None
+
+        records = []
+        for line_no, values in zip(numbers, csv.reader(texts)):
+            if self.header is None:
+                self.header = [COLUMN_ALIASES.get(name.strip().lower(), name.strip()) for name in values]
+                continue
+            records.append((line_no, {k: v.strip() for k, v in zip(self.header, values) if v.strip()}, None))
+        return records
+
+    def close(self) -> List[Tuple[int, Optional[dict], Optional[str]]]:
+        if self.buffered is not None:
+            return [(self.line_no, None, "引号未闭合")]
+        return []
+
+
+class _NdjsonParser:
+    def __init__(self):
+        self.line_no = 0
+
+    def feed(self, lines: List[str]) -> List[Tuple[int, Optional[dict], Optional[str]]]:
+        records = []
+        for line in lines:
+            self.line_no += 1
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                records.append((self.line_no, None, f"JSON 格式错误：{e.msg}"))
+                continue
+            if not isinstance(record, dict):
+                records.append((self.line_no, None, "每行必须是一个 JSON 对象"))
+                continue
+            records.append((self.line_no, {COLUMN_ALIASES.get(k, k): v for k, v in record.items()}, None))
+        return records
+
+    def close(self) -> List[Tuple[int, Optional[dict], Optional[str]]]:
+        return []
+
+
+def _errors(e: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()]
+
+
+# ✅ 流式解析上传内容并逐行按 ServiceNeedCreate 校验。
+# 返回 (通过校验的 [(行号, 数据)], 报告)，报告里先只有出错的行
+async def parse_upload(chunks: AsyncIterator[bytes], fmt: str, encoding: str = "utf-8-sig"):
+    parser = _CsvParser() if fmt == "csv" else _NdjsonParser()
+    valid: List[Tuple[int, ServiceNeedCreate]] = []
+    report: List[Dict] = []
+
+    def check(records) -> bool:
+        for line_no, record, error in records:
+            if len(valid) + len(report) >= MAX_IMPORT_ROWS:
+                report.append({"row": line_no, "status": "error", "errors": [f"超过单次导入上限 {MAX_IMPORT_ROWS} 行"]})
+                return False
+            if error is not None:
+                report.append({"row": line_no, "status": "error", "errors": [error]})
+                continue
+            try:
+                valid.append((line_no, ServiceNeedCreate.model_validate(record)))
+            except ValidationError as e:
+                report.append({"row": line_no, "status": "error", "errors": _errors(e)})
+        return True
+
+    async for lines in _line_batches(chunks, encoding):
+        if not check(parser.feed(lines)):
+            return valid, report
+    check(parser.close())
+    return valid, report
@@ -0,0 +1,120 @@
+# 过期需求清理：服务时间已过仍无人接单的需求，按批处理
+#   - 服务时间段已结束超过 NEED_EXPIRY_GRACE：标记为 expired，不再出现在未接单列表里
+#   - 已到开始时间、时间段还没结束：升级提醒（记录 escalated_at 并推送事件，提醒社区人工跟进），每个需求只升级一次
+# 每批在独立的短事务里完成，走 (status, start_at) 索引；PostgreSQL 下用 FOR UPDATE SKIP LOCKED 跳过
+# 正被接单事务锁住的行，清理和接单互不等待
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from models import ServiceNeed
+import events
+import geo
+import need_dedup
+import service_time
+
+SWEEP_BATCH_SIZE = 500
+SWEEP_MAX_BATCHES = 20       # 过期、升级两步各自单次最多处理的批数，剩下的留给下一轮
+NEED_EXPIRY_GRACE = timedelta(hours=1)
+SWEEP_REPORTS_KEPT = 20      # 内存中保留最近多少次清理报告
+
+_reports: deque = deque(maxlen=SWEEP_REPORTS_KEPT)
+_reports_lock = threading.Lock()
+
+
+def _sweep_batch(db: Session, condition, values: dict) -> List[int]:
+    # 先锁定一批候选（跳过已被其他事务锁住的行），再带状态条件更新，最后立即提交释放行锁
+    ids = db.execute(
+        select(ServiceNeed.id)
+        .where(ServiceNeed.status == "open", *condition)
+        .order_by(ServiceNeed.start_at)
+        .limit(SWEEP_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not ids:
+        db.commit()
+        return []
+    swept = db.execute(
+        update(ServiceNeed)
+        .where(ServiceNeed.id.in_(ids), ServiceNeed.status == "open")
+        .values(**values)
+        .returning(ServiceNeed.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.commit()
+    return sorted(swept)
+
+
+def _sweep_phase(db: Session, condition, values: dict, on_batch) -> Tuple[List[int], int, bool]:
+    # 逐批处理直到没有剩余或用完批数；返回 (处理的需求 id, 批数, 是否还有剩余)。
+    # 最后一批是满的才说明可能还有剩余（刚好处理完时会多查一次空批，不算剩余）
+    swept, batches, full = [], 0, False
+    while batches < SWEEP_MAX_BATCHES:
+        ids = _sweep_batch(db, condition, values)
+        batches += 1
+        full = len(ids) >= SWEEP_BATCH_SIZE
+        if ids:
+            swept += ids
+            on_batch(ids)
+        if not full:
+            break
+    return swept, batches, full
+
+
+def _on_expired(ids: List[int]):
+    for need_id in ids:
+        geo.need_index.discard(need_id)
+    events.bus.publish(events.NEEDS_EXPIRED, {"need_ids": ids})
+
+
+def _on_escalated(ids: List[int]):
+    events.bus.publish(events.NEEDS_ESCALATED, {"need_ids": ids})
+
+
+# ✅ 执行一次清理，返回报告（同时保存在内存里供管理员查看）。
+# 过期和升级各有自己的批数上限，积压的过期需求不会挤掉升级提醒
+def sweep(db: Session, now: Optional[datetime] = None) -> dict:
+    started = datetime.utcnow()
+    now = now or service_time.local_now()
+    cutoff = now - NEED_EXPIRY_GRACE
+
+    # start_at < cutoff 让查询走 (status, start_at) 索引的范围扫描
+    expire_condition = (ServiceNeed.start_at < cutoff, ServiceNeed.end_at < cutoff)
+    expired, expire_batches, expire_left = _sweep_phase(db, expire_condition, {"status": "expired"}, _on_expired)
+
+    # escalated_at 与服务时间一样用社区当地时间
+    escalate_condition = (ServiceNeed.start_at <= now, ServiceNeed.end_at >= cutoff, ServiceNeed.escalated_at.is_(None))
+    escalated, escalate_batches, escalate_left = _sweep_phase(
+        db, escalate_condition, {"escalated_at": now}, _on_escalated
+    )
+
+    lsh_pruned = need_dedup.prune(db)
+
+    report = {
+        "started_at": started,
+        "local_time": now,
+        "expired_count": len(expired),
+        "escalated_count": len(escalated),
+        "expired_need_ids": expired,
+        "escalated_need_ids": escalated,
+        "lsh_pruned": lsh_pruned,  # 清理掉的重复检测桶（超出比对期限的需求）
+        "batches": expire_batches + escalate_batches,
+        "incomplete": expire_left or escalate_left,  # 达到批数上限时最后一批仍是满的，剩余的下一轮继续
+        "elapsed_ms": round((datetime.utcnow() - started).total_seconds() * 1000, 1),
+    }
+    with _reports_lock:
+        _reports.append(report)
+    return report
+
+
+def recent_reports() -> List[dict]:
+    with _reports_lock:
+        return list(reversed(_reports))
+
+
+def run_scheduled(db: Session):
+    sweep(db)
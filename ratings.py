@@ -0,0 +1,159 @@
+# 服务者评分：提交反馈时在 provider_stats 上增量维护 1~5 星直方图和贝叶斯平均分 rating_score（同一条 UPSERT）。
+# 评价很少的服务者分数向先验收缩：1 条 5 星 ≈ 3.64，200 条平均 4.8 ≈ 4.74，排名不再被少量好评带偏。
+# 排行榜按 rating_score 排序，进程内保存为有序列表，提交反馈后只更新该服务者的一项。
+# 评分趋势按周 / 按月汇总在 provider_rating_buckets 里，同样随反馈事件增量更新
+import bisect
+import math
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import ProviderRatingBucket, ProviderStats, User
+
+RATING_MIN = 1
+RATING_MAX = 5
+RATING_COLUMNS = tuple(f"rating_{level}" for level in range(RATING_MIN, RATING_MAX + 1))
+# 贝叶斯平均的先验：相当于每位服务者先有 RATING_PRIOR_WEIGHT 条 RATING_PRIOR_MEAN 星的评价
+RATING_PRIOR_MEAN = 3.5
+RATING_PRIOR_WEIGHT = 10
+# 4 星及以上算好评，Wilson 下界按 95% 置信度计算
+POSITIVE_RATING = 4
+WILSON_Z = 1.96
+# 趋势汇总的时间粒度；不指定起始日期时默认看多少个周期
+TREND_PERIODS = ("week", "month")
+TREND_DEFAULT_SPAN = {"week": 26, "month": 12}
+# 排行榜最长有效期（秒）：本进程提交的反馈会立即更新，这里兜底其他进程 / 其他实例的写入
+LEADERBOARD_TTL = 60
+
+
+def rating_column(rating: int) -> str:
+    # 历史数据里可能有超出 1~5 的评分，计入最近的一档
+    return f"rating_{min(max(int(rating), RATING_MIN), RATING_MAX)}"
+
+
+# ✅ 贝叶斯平均分；参数既可以是数字，也可以是列表达式（在 UPSERT 里直接按更新后的值计算）
+def bayesian_score(rating_sum, count):
+    return (RATING_PRIOR_MEAN * RATING_PRIOR_WEIGHT + rating_sum) / (RATING_PRIOR_WEIGHT + count)
+
+
+# ✅ 好评率的 Wilson 置信下界：样本越少下界越低
+def wilson_lower_bound(positive: int, total: int, z: float = WILSON_Z) -> Optional[float]:
+    if not total:
+        return None
+    p = positive / total
+    centre = p + z * z / (2 * total)
+    margin = z * math.sqrt(p * (1 - p) / total + z * z / (4 * total * total))
+    return (centre - margin) / (1 + z * z / total)
+
+
+def histogram(row: Optional[ProviderStats]) -> List[int]:
+    return [getattr(row, name) or 0 if row else 0 for name in RATING_COLUMNS]
+
+
+# ✅ 某个时间点所在周期的起始日：周一 / 每月 1 日
+def period_start(period: str, at: datetime) -> date:
+    day = at.date() if isinstance(at, datetime) else at
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def _shift(period: str, start: date, n: int) -> date:
+    if period == "week":
+        return start + timedelta(weeks=n)
+    months = start.year * 12 + start.month - 1 + n
+    return date(months // 12, months % 12 + 1, 1)
+
+
+# 汇总桶按反馈的 UTC 创建时间分周期，“今天”也按 UTC 取，默认区间和范围校验用同一个时钟
+def utc_today() -> date:
+    return datetime.utcnow().date()
+
+
+# ✅ 评分趋势：[since, until] 内每个周期的反馈数和平均分，按主键范围读出汇总行；没有反馈的周期计 0 条、平均分为空
+def trend(db: Session, provider_id: int, period: str, since: Optional[date] = None,
+          until: Optional[date] = None) -> List[dict]:
+    last = period_start(period, until or utc_today())
+    first = period_start(period, since) if since else _shift(period, last, 1 - TREND_DEFAULT_SPAN[period])
+    rows = {
+        row.period_start: row
+        for row in db.query(ProviderRatingBucket).filter(
+            ProviderRatingBucket.provider_id == provider_id,
+            ProviderRatingBucket.period == period,
+            ProviderRatingBucket.period_start >= first,
+            ProviderRatingBucket.period_start <= last,
+        )
+    }
+    points = []
+    start = first
+    while start <= last:
+        row = rows.get(start)
+        count = row.feedback_count if row else 0
+        points.append({
+            "period_start": start,
+            "feedback_count": count,
+            "average_rating": round(row.rating_sum / count, 2) if count else None,
+        })
+        start = _shift(period, start, 1)
+    return points
+
+
+class Leaderboard:
+    # ✅ 按 (-rating_score, -feedback_count, provider_id) 升序排列的有序列表；只收录有过反馈的服务者
+    def __init__(self, ttl: float = LEADERBOARD_TTL):
+        self.ttl = ttl
+        self._keys: List[Tuple[float, int, int]] = []
+        self._by_provider: Dict[int, Tuple[float, int, int]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _load(self, db: Session):
+        rows = (
+            db.query(ProviderStats.provider_id, ProviderStats.rating_score, ProviderStats.feedback_count)
+            .join(User, User.id == ProviderStats.provider_id)  # 统计不随用户删除，已删除的服务者不上榜
+            .filter(ProviderStats.feedback_count > 0)
+            .all()
+        )
+        by_provider = {pid: (-score, -count, pid) for pid, score, count in rows if score is not None}
+        with self._lock:
+            self._by_provider = by_provider
+            self._keys = sorted(by_provider.values())
+            self._loaded_at = time.monotonic()
+
+    def _stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    # ✅ 某位服务者的统计变化后调用：读出最新分数，替换有序列表里的一项（还没加载过就等第一次查询时整表加载）
+    def update(self, db: Session, provider_id: int):
+        if self._stale():
+            return
+        row = (
+            db.query(ProviderStats.rating_score, ProviderStats.feedback_count)
+            .filter(ProviderStats.provider_id == provider_id)
+            .first()
+        )
+        with self._lock:
+            old = self._by_provider.pop(provider_id, None)
+            if old is not None:
+                del self._keys[bisect.bisect_left(self._keys, old)]
+            if row is not None and row.feedback_count and row.rating_score is not None:
+                key = (-row.rating_score, -row.feedback_count, provider_id)
+                self._by_provider[provider_id] = key
+                bisect.insort(self._keys, key)
+
+    # ✅ 前 k 名：[(服务者 ID, rating_score, 反馈数)]
+    def top(self, db: Session, k: int) -> List[Tuple[int, float, int]]:
+        if self._stale():
+            self._load(db)
+        with self._lock:
+            return [(pid, -score, -count) for score, count, pid in self._keys[:k]]
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,117 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from database import get_db
+from models import ProviderAvailability, ServiceNeed, User
+from schemas import AvailabilityUpdate, AvailabilityOut
+from security import get_current_user
+import availability
+import service_time
+
+router = APIRouter()
+
+# 单次批量登记的最多条数（一人一天为一条）
+MAX_AVAILABILITY_ITEMS = 20000
+
+
+# ✅ 批量登记空闲时间：服务者登记自己的，社区管理员可一次为多位服务者登记
+@router.put("/")
+def update_availability(
+    data: AvailabilityUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role not in ("provider", "admin"):
+        raise HTTPException(status_code=403, detail="无权登记空闲时间")
+    if len(data.items) > MAX_AVAILABILITY_ITEMS:
+        raise HTTPException(status_code=400, detail=f"单次最多登记 {MAX_AVAILABILITY_ITEMS} 条")
+
+    items = []
+    for item in data.items:
+        if current_user.role == "provider":
+            if item.provider_id not in (None, current_user.id):
+                raise HTTPException(status_code=403, detail="只能登记自己的空闲时间")
+            provider_id = current_user.id
+        elif item.provider_id is None:
+            raise HTTPException(status_code=400, detail="代为登记时需填写 provider_id")
+        else:
+            provider_id = item.provider_id
+        items.append((provider_id, item.day, availability.mask_from_ranges(item.ranges)))
+
+    if current_user.role == "admin":
+        wanted = {provider_id for provider_id, _, _ in items}
+        found = {
+            uid for (uid,) in
+            db.query(User.id).filter(User.id.in_(wanted), User.role == "provider").all()
+        }
+        missing = sorted(wanted - found)
+        if missing:
+            raise HTTPException(status_code=400, detail=f"以下用户不存在或不是服务者：{missing[:20]}")
+
+    return {"updated": availability.save(db, items)}
+
+
+# ✅ 查看自己的空闲时间（默认从今天起 7 天）
+@router.get("/mine", response_model=List[AvailabilityOut])
+def get_my_availability(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "provider":
+        raise HTTPException(status_code=403, detail="仅服务者可查看")
+
+    start = start or service_time.local_now().date()
+    end = end or start + timedelta(days=6)
+    rows = (
+        db.query(ProviderAvailability)
+        .filter(
+            ProviderAvailability.provider_id == current_user.id,
+            ProviderAvailability.day >= start,
+            ProviderAvailability.day <= end,
+        )
+        .order_by(ProviderAvailability.day)
+        .all()
+    )
+    return [
+        {"provider_id": row.provider_id, "day": row.day, "ranges": availability.ranges_from_mask(row.slots)}
+        for row in rows
+    ]
+
+
+# ✅ 查询某个时间段全程有空的服务者（社区端）：传 need_id 时使用该需求的服务时间
+@router.get("/free")
+def list_free_providers(
+    start_at: Optional[datetime] = None,
+    end_at: Optional[datetime] = None,
+    need_id: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="仅社区管理员可查看")
+
+    if need_id is not None:
+        need = db.query(ServiceNeed.start_at, ServiceNeed.end_at).filter(ServiceNeed.id == need_id).first()
+        if need is None:
+            raise HTTPException(status_code=404, detail="该服务需求不存在")
+        if need.start_at is None:
+            raise HTTPException(status_code=400, detail="该需求没有可识别的服务时间")
+        start_at, end_at = need.start_at, need.end_at
+    else:
+        if start_at is None:
+            raise HTTPException(status_code=400, detail="请提供 start_at，或 need_id")
+        start_at, end_at = service_time.resolve_window("", start_at, end_at)
+
+    started = datetime.utcnow()
+    provider_ids = availability.availability_index.free_providers(db, start_at, end_at)
+    return {
+        "start_at": start_at,
+        "end_at": end_at,
+        "count": len(provider_ids),
+        "provider_ids": provider_ids.tolist(),
+        "elapsed_ms": round((datetime.utcnow() - started).total_seconds() * 1000, 2),
+    }
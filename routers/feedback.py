@@ -1,14 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import date, datetime, timedelta
+from typing import List, Optional
 
 from database import get_db
+import crud
+import feedback_listing
+import ratings
 from models import Feedback, Task, User
-from schemas import FeedbackCreate, FeedbackOut
+from schemas import FeedbackCreate, FeedbackOut, FeedbackPage, RatingTrendOut
 from security import get_current_user
 
 router = APIRouter()
 
+# 反馈列表每页最多条数
+MAX_FEEDBACK_PAGE = 500
+# 评分趋势最长可查询的天数
+MAX_TREND_DAYS = 366 * 5
+
 
 # ✅ 提交反馈（社区端）
 @router.post("/{task_id}", response_model=FeedbackOut)
@@ -21,22 +31,7 @@ def create_feedback(
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="仅社区管理员可提交反馈")
 
-    task = db.query(Task).filter(Task.id == task_id).first()
-    if not task:
-        raise HTTPException(status_code=404, detail="任务不存在")
-    if task.feedback:
-        raise HTTPException(status_code=400, detail="该任务已存在反馈")
-
-    feedback = Feedback(
-        task_id=task_id,
-        elder_name=data.elder_name,
-        comment=data.comment,
-        rating=data.rating
-    )
-    db.add(feedback)
-    db.commit()
-    db.refresh(feedback)
-    return feedback
+    return crud.create_feedback(db, task_id, data, current_user.id)
 
 
 # ✅ 服务者查看自己的评价
@@ -51,16 +46,33 @@ def get_my_feedback(
     return db.query(Feedback).join(Task).filter(Task.provider_id == current_user.id).all()
 
 
-# ✅ 社区查看所有评价（建议使用 /all，避免和 GET / 冲突）
-@router.get("/all", response_model=List[FeedbackOut])
+# ✅ 社区查看所有评价（建议使用 /all，避免和 GET / 冲突）：可按服务者、评分、日期筛选，游标分页；
+# format=ndjson 时从游标处起流式返回全部结果
+@router.get("/all", response_model=FeedbackPage)
 def list_all_feedback(
+    provider_id: Optional[int] = Query(None),
+    min_rating: Optional[int] = Query(None, ge=1, le=5),
+    max_rating: Optional[int] = Query(None, ge=1, le=5),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=MAX_FEEDBACK_PAGE),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="仅社区管理员可查看所有反馈")
+    try:
+        after = feedback_listing.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
 
-    return db.query(Feedback).all()
+    filters = feedback_listing.FeedbackFilter(provider_id, min_rating, max_rating, since, until)
+    if format == "ndjson":
+        return StreamingResponse(feedback_listing.stream_ndjson(filters, after), media_type="application/x-ndjson")
+    items, next_cursor = feedback_listing.list_page(db, filters, after, limit)
+    return {"items": items, "next_cursor": next_cursor}
 
 # ✅ 获取某个服务者收到的所有反馈（社区端查看）
 @router.get("/by-provider/{provider_id}", response_model=List[FeedbackOut])
@@ -74,3 +86,23 @@ def get_feedback_by_provider(
 
     feedbacks = db.query(Feedback).join(Task).filter(Task.provider_id == provider_id).all()
     return feedbacks
+
+
+# ✅ 服务者评分趋势：按周 / 按月的反馈数和平均分（读预先汇总好的数据，不下载反馈明细）
+@router.get("/by-provider/{provider_id}/trend", response_model=RatingTrendOut)
+def get_rating_trend(
+    provider_id: int,
+    period: str = Query("month", pattern="^(week|month)$"),
+    since: Optional[date] = Query(None),  # 不传时按周看最近 26 周、按月看最近 12 个月
+    until: Optional[date] = Query(None),  # 默认到今天（UTC）
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="仅社区管理员可查看服务者评价")
+    if since and until and since > until:
+        raise HTTPException(status_code=400, detail="起始日期不能晚于结束日期")
+    if since and (until or ratings.utc_today()) - since > timedelta(days=MAX_TREND_DAYS):
+        raise HTTPException(status_code=400, detail="查询范围不能超过 5 年")
+
+    return {"provider_id": provider_id, "period": period, "points": ratings.trend(db, provider_id, period, since, until)}
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import User
+from security import get_current_user
+import async_routes
+import matching
+
+router = APIRouter()
+
+
+# ✅ 立即计算一次全局派单方案（apply=true 时按方案直接派单）
+@router.post("/run")
+@async_routes.cpu_bound
+def run_matching(
+    apply: bool = Query(False),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="仅社区管理员可派单")
+
+    plan = matching.compute_plan(db)
+    if apply:
+        plan["results"] = matching.apply_plan(db, plan, current_user.id)
+    return plan
+
+
+# ✅ 查看定时任务最近一次计算的派单方案
+@router.get("/latest")
+def get_latest_plan(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="仅社区管理员可查看派单方案")
+
+    plan = matching.latest_plan()
+    if plan is None:
+        raise HTTPException(status_code=404, detail="暂无派单方案")
+    return plan
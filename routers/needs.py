@@ -1,24 +1,138 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import codecs
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from database import get_db
 from models import ServiceNeed, User
-from schemas import ServiceNeedCreate, ServiceNeedOut
+from schemas import ServiceNeedCreate, ServiceNeedOut, NearbyNeedOut
 from security import get_current_user
+import async_routes
+import events
+import crud
+import geo
+import need_cache
+import need_dedup
+import need_import
+import need_sweeper
+import search
+import service_time
 
 router = APIRouter()
 
 
 # ✅ 获取所有未接单服务需求（服务者端用）
+# 不带筛选条件时走缓存，并支持 If-None-Match 条件请求（内容未变返回 304）；
+# 可按时间段筛选：返回服务时间与 [window_start, window_end) 有重叠的需求（时间未能解析的需求不参与筛选）
 @router.get("/", response_model=List[ServiceNeedOut])
-def list_open_needs(db: Session = Depends(get_db)):
-    return db.query(ServiceNeed).filter(ServiceNeed.status == "open").all()
+def list_open_needs(
+    window_start: Optional[datetime] = None,
+    window_end: Optional[datetime] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    if window_start is None and window_end is None:
+        body, etag = need_cache.open_needs_cache.get(db)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if if_none_match == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    # 库里存的是不带时区的当地时间，带时区的筛选参数先换算过来再比较
+    window_start, window_end = service_time.to_local_naive(window_start), service_time.to_local_naive(window_end)
+    query = db.query(ServiceNeed).filter(ServiceNeed.status == "open")
+    if window_start is not None:
+        query = query.filter(ServiceNeed.end_at > window_start)
+    if window_end is not None:
+        query = query.filter(ServiceNeed.start_at < window_end)
+    return query.order_by(ServiceNeed.start_at).all()
+
+
+# 没有新事件时多久发一次心跳注释，防止代理断开空闲连接
+SSE_HEARTBEAT_SECONDS = 15
+
+
+# ✅ 需求动态推送（SSE）：替代轮询 GET /api/needs/。
+# 断线重连时浏览器会自动带上 Last-Event-ID（也可用 ?last_event_id=），服务端从内存缓冲补发；
+# 缺失的事件已被覆盖时先发一条 reset，客户端收到后重新拉取全量列表
+@router.get("/events")
+async def need_events(
+    request: Request,
+    last_event_id: Optional[str] = Query(None, max_length=64),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    last_event_id = last_event_id or last_event_id_header
+
+    async def stream():
+        waiter = events.bus.subscribe()
+        try:
+            # 未带 id 的新连接只接收此后的事件；其他进程发出的 id 解析为 None，第一轮就会重置
+            cursor = events.bus.last_id if last_event_id is None else events.bus.parse_id(last_event_id)
+            yield "retry: 3000\n\n"  # 断线后 3 秒重连
+            while True:
+                # 先清标记再取事件，取完之后发布的事件一定会再次唤醒
+                waiter.clear()
+                pending, reset = events.bus.since(cursor)
+                if reset:
+                    cursor = events.bus.last_id
+                    yield events.format_sse(events.bus.wire_id(cursor), "reset", "{}")
+                    continue
+                for event_id, event_type, data in pending:
+                    yield events.format_sse(events.bus.wire_id(event_id), event_type, data)
+                    cursor = event_id
+                if pending:
+                    continue
+                try:
+                    await asyncio.wait_for(waiter.wait(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+        finally:
+            events.bus.unsubscribe(waiter)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # nginx 不要缓冲
+    })
+
+
+# ✅ 附近的未接单需求（按距离由近到远，最多返回 k 条）
+@router.get("/nearby", response_model=List[NearbyNeedOut])
+def list_nearby_needs(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius: float = Query(5.0, gt=0, le=100),  # 公里
+    k: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    geo.need_index.ensure_loaded(db)
+    hits = geo.need_index.nearest(lat, lng, radius, k)
+    if not hits:
+        return []
+
+    needs = {
+        need.id: need
+        for need in db.query(ServiceNeed).filter(ServiceNeed.id.in_([need_id for need_id, _ in hits])).all()
+    }
+    results = []
+    for need_id, distance in hits:
+        need = needs.get(need_id)
+        if need is None or need.status != "open":
+            geo.need_index.discard(need_id)  # 其他进程已接单/删除，顺手清理索引
+            continue
+        need.distance_km = round(distance, 3)
+        results.append(need)
+    return results
 
 
 # ✅ 创建新服务需求（社区管理员用）
 @router.post("/", response_model=ServiceNeedOut)
+@async_routes.cpu_bound
 def create_need(
     data: ServiceNeedCreate,
     db: Session = Depends(get_db),
@@ -27,16 +141,87 @@ def create_need(
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="无权限：仅管理员可发布服务需求")
 
+    coords = geo.geocode(db, data.address)  # 地址只在创建时解析一次
+    start_at, end_at = service_time.resolve_window(data.time, data.start_at, data.end_at)
+    # 与近期未接单的需求比对，疑似重复的只做标记提醒，仍然正常发布
+    signature = need_dedup.signature(data.title, data.description, data.address)
+    [duplicate_of] = need_dedup.find_duplicates(db, [(signature, (start_at, end_at))])
     new_need = ServiceNeed(
         title=data.title,
         description=data.description,
         address=data.address,
         time=data.time,
+        start_at=start_at,
+        end_at=end_at,
         created_by=current_user.id,
         created_at=datetime.utcnow(),
-        status="open"
+        status="open",
+        lat=coords[0] if coords else None,
+        lng=coords[1] if coords else None,
+        minhash=signature.tobytes(),
+        duplicate_of=duplicate_of,
     )
     db.add(new_need)
+    db.flush()
+    need_dedup.index_needs(db, [new_need.id], [signature])
+    search.index_documents(db, [(search.DOC_NEED, new_need.id, search.need_text(data.title, data.description, data.address))])
     db.commit()
     db.refresh(new_need)
+    geo.need_index.add(new_need.id, new_need.lat, new_need.lng)
+    events.bus.publish(events.NEED_CREATED, ServiceNeedOut.model_validate(new_need, from_attributes=True).model_dump(mode="json"))
     return new_need
+
+
+# ✅ 批量发布服务需求（社区管理员用）：请求体直接是 CSV（表格另存为 CSV）或 NDJSON（每行一个 JSON 对象），
+# 边接收边解析；每行按 ServiceNeedCreate 校验，合格的行一次性批量写入，返回逐行结果。
+# CSV 第一行为表头：title/description/address/time（或 标题/描述/地址/时间），可选 start_at/end_at（开始时间/结束时间）
+@router.post("/import")
+async def import_needs(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),  # 不传时按 Content-Type 判断
+    encoding: str = Query("utf-8-sig"),  # Excel 导出的 GBK 编码 CSV 请传 gb18030
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="无权限：仅管理员可发布服务需求")
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        raise HTTPException(status_code=400, detail=f"不支持的编码：{encoding}")
+    fmt = format or ("ndjson" if "json" in request.headers.get("content-type", "") else "csv")
+
+    try:
+        valid, report = await need_import.parse_upload(request.stream(), fmt, encoding)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail=f"文件不是 {encoding} 编码，Excel 导出的 CSV 请使用 encoding=gb18030")
+
+    created, errors = await run_in_threadpool(crud.create_needs_bulk, db, valid, current_user.id)
+    rows = sorted(report + errors + created, key=lambda r: r["row"])
+    return {
+        "total": len(rows),
+        "created": len(created),
+        "failed": len(rows) - len(created),
+        "rows": rows,
+    }
+
+
+# ✅ 立即清理一次过期需求（社区管理员）：已过服务时间的标记为过期，刚到服务时间仍无人接单的升级提醒
+@router.post("/sweep")
+def sweep_needs(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="仅社区管理员可操作")
+
+    return need_sweeper.sweep(db)
+
+
+# ✅ 最近几次过期清理的报告（含定时任务执行的）
+@router.get("/sweeps")
+def list_sweep_reports(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="仅社区管理员可查看")
+
+    return need_sweeper.recent_reports()
@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from database import get_db
+from models import Feedback, ServiceNeed, User
+from schemas import SearchPage
+from security import get_current_user
+import search
+
+router = APIRouter()
+
+MAX_PAGE_SIZE = 100
+
+
+# ✅ 全文检索需求和反馈（社区端），如 q=迟到、q=服务态度；type 不传时两类一起搜，按相关度排序
+@router.get("/", response_model=SearchPage)
+def search_documents(
+    q: str = Query(..., min_length=1, max_length=100),
+    type: Optional[str] = Query(None, pattern="^(need|feedback)$"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="仅社区管理员可检索")
+
+    hits, has_more = search.search(db, q, (type,) if type else search.DOC_TYPES, page, page_size)
+
+    # 按类型各查一次原文；已删除的文档（索引里还残留）直接跳过
+    need_ids = [doc_id for doc_type, doc_id, _ in hits if doc_type == search.DOC_NEED]
+    feedback_ids = [doc_id for doc_type, doc_id, _ in hits if doc_type == search.DOC_FEEDBACK]
+    docs = {}
+    if need_ids:
+        for need in db.query(ServiceNeed).filter(ServiceNeed.id.in_(need_ids)).all():
+            docs[(search.DOC_NEED, need.id)] = (need.title, need.description, need.created_at)
+    if feedback_ids:
+        for fb in db.query(Feedback).filter(Feedback.id.in_(feedback_ids)).all():
+            docs[(search.DOC_FEEDBACK, fb.id)] = (fb.elder_name, fb.comment, fb.created_at)
+
+    items = []
+    for doc_type, doc_id, score in hits:
+        doc = docs.get((doc_type, doc_id))
+        if doc is None:
+            continue
+        title, content, created_at = doc
+        items.append({"type": doc_type, "id": doc_id, "score": round(score, 4),
+                      "title": title, "content": content, "created_at": created_at})
+    return {"items": items, "page": page, "page_size": page_size, "has_more": has_more}
@@ -1,15 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
-from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from database import get_db
-from models import Task, ServiceNeed, User, Feedback
-from schemas import TaskCreate, TaskOut, FeedbackCreate, FeedbackOut
+import async_routes
+import crud
+import ratings
+import routing
+import task_log
+from models import Task, ServiceNeed, User, ProviderStats
+from schemas import (
+    TaskCreate, TaskOut, FeedbackCreate, FeedbackOut, FeedbackPage, TaskEventOut, ProviderStatsOut, LeaderboardEntry, BulkCompleteIn, BulkCompleteOut,
+)
 from security import get_current_user
+from routers import feedback as feedback_router
 
 router = APIRouter()
 
+# 批量完成时单次最多的任务数
+MAX_BULK_COMPLETE = 200
+# 排行榜单次最多返回的人数
+MAX_LEADERBOARD = 100
+
 
 # ✅ 服务者接单（创建 Task）
 @router.post("/", response_model=TaskOut)
@@ -21,24 +33,8 @@ def accept_task(
     if current_user.role != "provider":
         raise HTTPException(status_code=403, detail="仅服务者可接单")
 
-    need = db.query(ServiceNeed).filter(ServiceNeed.id == data.need_id).first()
-    if not need:
-        raise HTTPException(status_code=404, detail="该服务需求不存在")
-    if need.status != "open":
-        raise HTTPException(status_code=400, detail="该服务需求已被接单")
-
-    # 创建接单任务记录
-    task = Task(
-        need_id=data.need_id,
-        provider_id=current_user.id,
-        accepted_at=datetime.utcnow(),
-        status="ongoing"
-    )
-    db.add(task)
-    need.status = "accepted"  # 同时更新需求状态
-    db.commit()
-    db.refresh(task)
-    return task
+    # 原子抢单（同时更新需求状态并创建接单任务记录）
+    return crud.accept_need(db, data.need_id, current_user.id)
 
 
 # ✅ 获取我已接的任务（服务者看自己）
@@ -54,6 +50,21 @@ def get_my_tasks(
     return db.query(Task).options(joinedload(Task.need)).filter(Task.provider_id == current_user.id).all()
 
 
+# ✅ 今天的上门路线：按时间窗和距离规划进行中任务的访问顺序（可传当前位置，默认从常驻位置出发）
+@router.get("/my/route")
+@async_routes.cpu_bound
+def get_my_route(
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "provider":
+        raise HTTPException(status_code=403, detail="仅服务者可查看")
+
+    return routing.provider_route(db, current_user, lat, lng)
+
+
 # ✅ 服务者完成任务
 @router.put("/complete/{task_id}", response_model=TaskOut)
 def complete_task(
@@ -64,18 +75,38 @@ def complete_task(
     if current_user.role != "provider":
         raise HTTPException(status_code=403, detail="仅服务者可操作")
 
-    task = db.query(Task).filter(Task.id == task_id).first()
-    if not task:
-        raise HTTPException(status_code=404, detail="任务不存在")
-    if task.provider_id != current_user.id:
-        raise HTTPException(status_code=403, detail="无权修改他人任务")
-    if task.status == "completed":
-        raise HTTPException(status_code=400, detail="该任务已完成")
+    _, failures = crud.complete_tasks(db, current_user.id, [task_id])
+    if task_id in failures:
+        status_code, detail = crud.COMPLETE_FAILURES[failures[task_id]]
+        raise HTTPException(status_code=status_code, detail=detail)
+    # 连同 need 一起加载，避免序列化时再懒加载
+    return db.query(Task).options(joinedload(Task.need)).filter(Task.id == task_id).one()
+
 
-    task.status = "completed"
-    db.commit()
-    db.refresh(task)
-    return task
+# ✅ 服务者批量完成任务：逐个返回结果，部分失败不影响其余任务
+@router.put("/complete", response_model=BulkCompleteOut)
+def complete_tasks(
+    data: BulkCompleteIn,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "provider":
+        raise HTTPException(status_code=403, detail="仅服务者可操作")
+    task_ids = list(dict.fromkeys(data.task_ids))  # 去重并保持顺序
+    if not task_ids:
+        raise HTTPException(status_code=400, detail="请提供要完成的任务")
+    if len(task_ids) > MAX_BULK_COMPLETE:
+        raise HTTPException(status_code=400, detail=f"单次最多完成 {MAX_BULK_COMPLETE} 个任务")
+
+    completed, failures = crud.complete_tasks(db, current_user.id, task_ids)
+    results = []
+    for task_id in task_ids:
+        if task_id in failures:
+            status_code, detail = crud.COMPLETE_FAILURES[failures[task_id]]
+            results.append({"task_id": task_id, "outcome": failures[task_id], "detail": detail})
+        else:
+            results.append({"task_id": task_id, "outcome": "completed", "detail": None})
+    return {"completed": len(completed), "failed": len(failures), "results": results}
 
 
 # ✅ 社区管理员提交反馈
@@ -89,29 +120,11 @@ def submit_feedback(
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="仅社区管理员可提交反馈")
 
-    task = db.query(Task).filter(Task.id == task_id).first()
-    if not task:
-        raise HTTPException(status_code=404, detail="任务不存在")
-    if task.status != "completed":
-        raise HTTPException(status_code=400, detail="任务未完成，无法反馈")
-
-    new_feedback = Feedback(
-        task_id=task.id,
-        elder_name=feedback.elder_name,
-        comment=feedback.comment,
-        rating=feedback.rating,
-        created_at=datetime.utcnow(),
-    )
-    db.add(new_feedback)
-    db.commit()
-    db.refresh(new_feedback)
-    return new_feedback
-
-
-# ✅ 获取所有服务反馈
-@router.get("/feedbacks", response_model=List[FeedbackOut])
-def list_feedbacks(db: Session = Depends(get_db)):
-    return db.query(Feedback).all()
+    return crud.create_feedback(db, task_id, feedback, current_user.id)
+
+
+# ✅ 获取所有服务反馈：旧路径，与 GET /api/feedback/all 相同（仅社区管理员，游标分页）
+router.add_api_route("/feedbacks", feedback_router.list_all_feedback, methods=["GET"], response_model=FeedbackPage)
 
 @router.get("/completed", response_model=List[TaskOut])
 def list_completed_tasks(
@@ -120,7 +133,7 @@ def list_completed_tasks(
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="仅社区管理员可访问")
-    return db.query(Task).filter(Task.status == "completed").all()
+    return db.query(Task).options(joinedload(Task.need)).filter(Task.status == "completed").all()
 
 # ✅ 获取某个服务者的所有任务（社区端查看）
 @router.get("/by-provider/{provider_id}", response_model=List[TaskOut])
@@ -132,4 +145,64 @@ def get_tasks_by_provider(
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="仅社区管理员可查看服务者任务")
 
-    return db.query(Task).filter(Task.provider_id == provider_id).all()
+    return db.query(Task).options(joinedload(Task.need)).filter(Task.provider_id == provider_id).all()
+
+
+# ✅ 任务历史（接单、完成、反馈事件，按发生顺序）：社区管理员或任务所属服务者可查看
+@router.get("/{task_id}/history", response_model=List[TaskEventOut])
+def get_task_history(
+    task_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    task = db.query(Task.provider_id).filter(Task.id == task_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if current_user.role != "admin" and task.provider_id != current_user.id:
+        raise HTTPException(status_code=403, detail="无权查看他人任务")
+    return task_log.task_history(db, task_id)
+
+
+# ✅ 服务者统计（接单数、进行中、已完成、反馈数、平均评分）：社区管理员或服务者本人可查看
+@router.get("/stats/{provider_id}", response_model=ProviderStatsOut)
+def get_provider_stats(
+    provider_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin" and current_user.id != provider_id:
+        raise HTTPException(status_code=403, detail="无权查看他人统计")
+    return task_log.provider_stats(db, provider_id)
+
+
+# ✅ 服务者评分排行榜（按贝叶斯平均分，评价少的不会仅凭一两条好评排到前面）
+@router.get("/leaderboard", response_model=List[LeaderboardEntry])
+def get_leaderboard(
+    limit: int = Query(10, ge=1, le=MAX_LEADERBOARD),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    top = ratings.leaderboard.top(db, limit)
+    rows = {
+        stats.provider_id: (stats, name)
+        for stats, name in db.query(ProviderStats, User.name)
+        .join(User, User.id == ProviderStats.provider_id)
+        .filter(ProviderStats.provider_id.in_([pid for pid, _, _ in top]))
+        .all()
+    } if top else {}
+
+    entries = []
+    for provider_id, score, count in top:
+        if provider_id not in rows:  # 榜单缓存期间被删除的服务者
+            continue
+        stats, name = rows[provider_id]
+        entries.append({
+            "rank": len(entries) + 1,
+            "provider_id": provider_id,
+            "name": name,
+            "rating_score": round(score, 3),
+            "average_rating": round(stats.rating_sum / stats.feedback_count, 2),
+            "feedback_count": stats.feedback_count,
+            "histogram": ratings.histogram(stats),
+        })
+    return entries
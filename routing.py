@@ -0,0 +1,241 @@
+# 服务者当日路线规划：最近邻构造初始路线，再用 2-opt（翻转路段）和 or-opt（挪动连续站点）反复改进。
+# 有结构化服务时间（start_at / end_at）的需求按时间窗计算：早到需等待，服务结束晚于 end_at 按迟到分钟数重罚。
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models import ServiceNeed, Task, User
+import geo
+import service_time
+
+# ✅ 路线参数
+ROUTE_SPEED_KMH = 25.0        # 市区平均行驶速度
+STOP_SERVICE_MINUTES = 30.0   # 每个上门服务占用的时间
+LATE_WEIGHT = 100.0           # 每迟到 1 分钟折算成多少公里，保证优先守时、其次少跑路
+NEIGHBOURS = 8                # 局部改进时每站只考虑最近的若干站
+MAX_ROUTE_STOPS = 30          # 单次规划的最多站点数，超出部分按时间顺序放在 unrouted 里
+
+Window = Optional[Tuple[float, float]]  # 相对出发时刻的 (最早开始, 最晚结束)，单位分钟
+
+
+def distance_matrix(lat: np.ndarray, lng: np.ndarray) -> List[List[float]]:
+    lat1, lng1 = np.radians(lat)[:, None], np.radians(lng)[:, None]
+    lat2, lng2 = lat1.T, lng1.T
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    # 纯 Python 列表的下标访问比逐个取 ndarray 元素快得多，局部改进的内层循环全靠它
+    return (2 * geo.EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))).tolist()
+
+
+def route_cost(order: Sequence[int], dist: List[List[float]], windows: Sequence[Window]) -> Tuple[float, float, float]:
+    # 节点 0 为出发点；返回 (代价, 总公里数, 总迟到分钟数)
+    _, _, km, late = _states(order, dist, windows)[-1]
+    return km + LATE_WEIGHT * late, km, late
+
+
+def _nearest_neighbour(n: int, dist: List[List[float]]) -> List[int]:
+    order, left, current = [], set(range(1, n)), 0
+    while left:
+        current = min(left, key=dist[current].__getitem__)
+        order.append(current)
+        left.remove(current)
+    return order
+
+
+def _states(order: List[int], dist: List[List[float]], windows: Sequence[Window]) -> List[Tuple[int, float, float, float]]:
+    # states[k] 为走到第 k 站之前的 (上一站, 时刻, 累计公里, 累计迟到)，改动只影响之后的站，从这里接着算即可
+    states = [(0, 0.0, 0.0, 0.0)]
+    for stop in order:
+        states.append(_advance(states[-1], stop, dist, windows))
+    return states
+
+
+def _advance(state, stop: int, dist: List[List[float]], windows: Sequence[Window]):
+    prev, t, km, late = state
+    leg = dist[prev][stop]
+    t += leg / ROUTE_SPEED_KMH * 60
+    window = windows[stop]
+    if window is not None and t < window[0]:
+        t = window[0]
+    t += STOP_SERVICE_MINUTES
+    if window is not None and t > window[1]:
+        late += t - window[1]
+    return stop, t, km + leg, late
+
+
+def _move_cost(order: List[int], states, k: int, changed: List[int], dist: List[List[float]],
+               windows: Sequence[Window], timed: bool, bound: float) -> float:
+    # 改动后的路线 = order[:k] + changed + order[k + len(changed):]，从第 k 站接着算。
+    # 回到原路线的后缀后，剩余里程与原路线相同；迟到分钟数随到达时刻单调不减，所以：
+    #   到达时刻不早于原路线 → 原路线的剩余代价是下界，已不可能更优时提前放弃；
+    #   到达时刻不晚于原路线 → 原路线的剩余代价是上界，已确定更优时提前返回（调用方会重算准确代价）
+    prev, t, km, late = states[k]
+    n = len(order)
+    final = states[n]
+    rejoin = k + len(changed)
+    for position, stop in enumerate(changed + order[rejoin:], start=k):
+        leg = dist[prev][stop]
+        km += leg
+        t += leg / ROUTE_SPEED_KMH * 60
+        window = windows[stop]
+        if window is not None and t < window[0]:
+            t = window[0]
+        t += STOP_SERVICE_MINUTES
+        if window is not None and t > window[1]:
+            late += t - window[1]
+        if km + LATE_WEIGHT * late >= bound:
+            return bound
+        prev = stop
+        if position >= rejoin:
+            _, original_t, original_km, original_late = states[position + 1]
+            rest = km + final[2] - original_km + LATE_WEIGHT * (late + final[3] - original_late)
+            if not timed or abs(t - original_t) < 1e-9:
+                return rest
+            if t > original_t and rest >= bound:
+                return bound
+            if t < original_t and rest < bound:
+                return rest
+    return km + LATE_WEIGHT * late
+
+
+def _improve(order: List[int], dist: List[List[float]], windows: Sequence[Window]) -> List[int]:
+    # 交替使用两种邻域直到无法改进：2-opt（翻转一段）和 or-opt（把 1~3 个连续站点挪到别处）。
+    # 只尝试让某站与它最近的 NEIGHBOURS 个站点相邻的改动，候选数从 O(n²) 降到 O(n·k)。
+    # 路线不回到出发点（开放路径），最后一站之后没有边
+    n = len(order)
+    timed = any(w is not None for w in windows)
+    near = [sorted((s for s in range(1, n + 1) if s != a), key=dist[a].__getitem__)[:NEIGHBOURS] for a in range(n + 1)]
+    improved = True
+    while improved:
+        improved = False
+        states = _states(order, dist, windows)
+        best = states[-1][2] + LATE_WEIGHT * states[-1][3]
+        pos = {stop: k for k, stop in enumerate(order)}
+
+        # 2-opt：翻转 order[i..j]，使第 i-1 站后面接上它的近邻 order[j]
+        for i in range(n - 1):
+            a = order[i - 1] if i else 0
+            for c in near[a]:
+                j = pos[c]
+                if j <= i:
+                    continue
+                changed = order[i:j + 1][::-1]
+                cost = _move_cost(order, states, i, changed, dist, windows, timed, best - 1e-9)
+                if cost < best - 1e-9:
+                    order = order[:i] + changed + order[j + 1:]
+                    states = _states(order, dist, windows)
+                    pos = {stop: k for k, stop in enumerate(order)}
+                    best, improved = states[-1][2] + LATE_WEIGHT * states[-1][3], True
+
+        # or-opt：把 order[i:i+length] 挪到它首站的某个近邻前后（或紧接出发点）
+        for length in (1, 2, 3):
+            for i in range(n - length + 1):
+                segment = order[i:i + length]
+                rest = order[:i] + order[i + length:]
+                targets = {0}
+                for c in near[segment[0]]:
+                    if c in segment:
+                        continue
+                    r = pos[c] if pos[c] < i else pos[c] - length
+                    targets.update((r, r + 1))
+                for p in sorted(targets):
+                    if p == i:
+                        continue
+                    # 新路线为 rest[:p] + segment + rest[p:]，与原路线只在第 k 站到第 k + len(changed) 站之间不同
+                    k = min(i, p)
+                    changed = rest[k:p] + segment if p > i else segment + rest[p:i]
+                    cost = _move_cost(order, states, k, changed, dist, windows, timed, best - 1e-9)
+                    if cost < best - 1e-9:
+                        order = order[:k] + changed + order[k + len(changed):]
+                        states = _states(order, dist, windows)
+                        pos = {stop: k for k, stop in enumerate(order)}
+                        best, improved = states[-1][2] + LATE_WEIGHT * states[-1][3], True
+                        break
+    return order
+
+
+# ✅ 规划访问顺序：dist 为含出发点（下标 0）的距离矩阵，windows[0] 不使用。
+# 最近邻和“最早截止优先”两种初始顺序中取代价更低者，再做局部改进。返回站点下标列表（1..n-1）
+def plan_route(dist: List[List[float]], windows: Sequence[Window]) -> List[int]:
+    n = len(dist)
+    if n <= 2:
+        return list(range(1, n))
+    seeds = [_nearest_neighbour(n, dist)]
+    if any(w is not None for w in windows[1:]):
+        seeds.append(sorted(range(1, n), key=lambda s: (windows[s] is None, windows[s][1] if windows[s] else 0)))
+    return _improve(min(seeds, key=lambda order: route_cost(order, dist, windows)[0]), dist, windows)
+
+
+# ✅ 服务者今天的路线：今天有服务时间或服务时间未解析的进行中任务，从指定位置（默认常驻位置）出发
+def provider_route(db: Session, provider: User, lat: Optional[float] = None, lng: Optional[float] = None) -> dict:
+    started = datetime.utcnow()
+    now = service_time.local_now()
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_end = day_start + timedelta(days=1)
+
+    rows = (
+        db.query(Task.id, Task.need_id, ServiceNeed.title, ServiceNeed.address,
+                 ServiceNeed.lat, ServiceNeed.lng, ServiceNeed.start_at, ServiceNeed.end_at)
+        .join(ServiceNeed, Task.need_id == ServiceNeed.id)
+        .filter(Task.provider_id == provider.id, Task.status == "ongoing")
+        .filter((ServiceNeed.start_at.is_(None)) | ((ServiceNeed.start_at < day_end) & (ServiceNeed.end_at > day_start)))
+        .order_by(ServiceNeed.start_at, Task.id)
+        .all()
+    )
+    stops = [r for r in rows if r.lat is not None and r.lng is not None][:MAX_ROUTE_STOPS]
+    routed = {r.id for r in stops}
+    unrouted = [r.id for r in rows if r.id not in routed]
+
+    if lat is None or lng is None:
+        lat, lng = provider.lat, provider.lng
+    has_origin = lat is not None and lng is not None
+    # 没有出发位置时加一个到各站距离都为 0 的虚拟起点，相当于从最合适的一站开始
+    if has_origin:
+        dist = distance_matrix(np.array([lat] + [r.lat for r in stops]), np.array([lng] + [r.lng for r in stops]))
+    else:
+        dist = distance_matrix(np.array([r.lat for r in stops]), np.array([r.lng for r in stops])) if stops else []
+        dist = [[0.0] * (len(stops) + 1)] + [[0.0] + row for row in dist]
+
+    def minutes(value: Optional[datetime]) -> float:
+        return (value - now).total_seconds() / 60
+
+    windows: List[Window] = [None] + [
+        (minutes(r.start_at), minutes(r.end_at)) if r.start_at is not None else None for r in stops
+    ]
+    order = plan_route(dist, windows)
+
+    # 按规划顺序模拟一遍，给出每站的预计到达时间和迟到分钟数
+    result, t, prev = [], 0.0, 0
+    for stop in order:
+        row, leg, window = stops[stop - 1], dist[prev][stop], windows[stop]
+        t += leg / ROUTE_SPEED_KMH * 60
+        arrive = t
+        if window is not None and t < window[0]:
+            t = window[0]
+        t += STOP_SERVICE_MINUTES
+        result.append({
+            "task_id": row.id,
+            "need_id": row.need_id,
+            "title": row.title,
+            "address": row.address,
+            "lat": row.lat,
+            "lng": row.lng,
+            "start_at": row.start_at,
+            "end_at": row.end_at,
+            "leg_km": round(leg, 3) if has_origin or prev else None,
+            "arrive_at": now + timedelta(minutes=arrive),
+            "late_minutes": round(max(0.0, t - window[1]), 1) if window is not None else 0.0,
+        })
+        prev = stop
+
+    _, km, late = route_cost(order, dist, windows)
+    return {
+        "origin": {"lat": lat, "lng": lng} if has_origin else None,
+        "departure_at": now,
+        "stops": result,
+        "unrouted_task_ids": unrouted,
+        "total_km": round(km, 3),
+        "late_minutes": round(late, 1),
+        "elapsed_ms": round((datetime.utcnow() - started).total_seconds() * 1000, 1),
+    }
@@ -0,0 +1,53 @@
+import asyncio
+import os
+import traceback
+from typing import Callable, List, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+
+# ✅ 进程内的简单定时任务：应用启动时拉起，任务本身在线程池中执行，不阻塞事件循环
+_jobs: List[Tuple[str, float, Callable[[Session], object]]] = []
+_tasks: List[asyncio.Task] = []
+
+
+def interval_from_env(name: str, default: float) -> float:
+    # 环境变量设为 0 表示关闭该定时任务
+    return float(os.getenv(name, default))
+
+
+def register(name: str, interval_seconds: float, job: Callable[[Session], object]):
+    if interval_seconds > 0:
+        _jobs.append((name, interval_seconds, job))
+
+
+def _run_once(name: str, job: Callable[[Session], object]):
+    db = SessionLocal()
+    try:
+        job(db)
+    except Exception:
+        db.rollback()
+        print(f"❌ 定时任务 {name} 执行失败：")
+        traceback.print_exc()
+    finally:
+        db.close()
+
+
+async def _loop(name: str, interval_seconds: float, job: Callable[[Session], object]):
+    while True:
+        await asyncio.sleep(interval_seconds)
+        await run_in_threadpool(_run_once, name, job)
+
+
+def start():
+    for name, interval_seconds, job in _jobs:
+        _tasks.append(asyncio.get_running_loop().create_task(_loop(name, interval_seconds, job)))
+
+
+async def stop():
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
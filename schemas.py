@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field
+from typing import Any, Dict, List, Optional
+from datetime import date, datetime
 
 # ✅ 通用用户基类（新增角色）
 class UserBase(BaseModel):
@@ -10,22 +10,33 @@ class UserBase(BaseModel):
     phone: str
     role: Optional[str] = "provider"  # 默认是服务提供者，可为 "admin" 或 "provider"
 
+# ✅ 服务者常驻位置（用于派单，可选）：只在注册、本人资料里出现，不随公开的用户信息返回
+class ProviderLocation(BaseModel):
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+
 # ✅ 注册时用（需要密码）
-class UserRegister(UserBase):
+class UserRegister(ProviderLocation, UserBase):
     password: str
 
 # ✅ 数据库中创建用户用（也带密码）
-class UserCreate(UserBase):
+class UserCreate(ProviderLocation, UserBase):
     password: str
 
 class UserResponse(UserBase):
     id: int
     serviceCount: Optional[int] = 0
     averageRating: Optional[float] = 0.0
+    ratingCount: Optional[int] = 0
+    ratingScore: Optional[float] = None  # 贝叶斯平均分，排序用（评价少时向先验收缩）
 
     class Config:
         from_attributes = True
 
+# ✅ 本人资料（/me、/profile）：比公开信息多返回常驻位置
+class ProfileResponse(ProviderLocation, UserResponse):
+    pass
+
 
 # ✅ 登录请求体
 class UserLogin(BaseModel):
@@ -59,11 +70,14 @@ class HealthDataCreate(BaseModel):
     blood_sugar: Optional[float] = None
     weight: Optional[float] = None
     steps: Optional[int] = None
+    timestamp: Optional[datetime] = None  # 网关批量上报时携带采集时间，缺省为服务器时间
+    reading_id: Optional[str] = None  # 客户端生成的读数 id，重传时保持不变即可去重
 
-# ✅ 返回健康数据
+# ✅ 返回健康数据（不含内部去重用的 dedup_key 和客户端读数 id）
 class HealthDataResponse(HealthDataCreate):
-    id: int
+    id: Optional[int] = None  # 压缩序列解码出的心率、步数没有行 id
     timestamp: datetime
+    reading_id: Optional[str] = Field(None, exclude=True)
 
     class Config:
         from_attributes = True
@@ -89,6 +103,9 @@ class ServiceNeedCreate(BaseModel):
     description: str
     address: str
     time: str
+    # 可选：直接给出结构化时间段；不给时从 time 文本解析
+    start_at: Optional[datetime] = None
+    end_at: Optional[datetime] = None
 
 # ✅ 返回前端的结构
 class ServiceNeedOut(ServiceNeedCreate):
@@ -96,10 +113,18 @@ class ServiceNeedOut(ServiceNeedCreate):
     status: str
     created_at: datetime
     created_by: int
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    escalated_at: Optional[datetime] = None
+    duplicate_of: Optional[int] = None  # 疑似重复的已有需求
 
     class Config:
         orm_mode = True
 
+# ✅ 附近的需求（带距离）
+class NearbyNeedOut(ServiceNeedOut):
+    distance_km: float
+
 
 # ✅ 接单请求体
 class TaskCreate(BaseModel):
@@ -126,11 +151,25 @@ class TaskOut(BaseModel):
     class Config:
         orm_mode = True
 
+# ✅ 批量完成任务
+class BulkCompleteIn(BaseModel):
+    task_ids: List[int]
+
+class BulkCompleteResult(BaseModel):
+    task_id: int
+    outcome: str  # completed / not_found / forbidden / already_completed
+    detail: Optional[str] = None
+
+class BulkCompleteOut(BaseModel):
+    completed: int
+    failed: int
+    results: List[BulkCompleteResult]
+
 # ✅ 提交反馈（社区端）
 class FeedbackCreate(BaseModel):
     elder_name: str
     comment: str
-    rating: int
+    rating: int = Field(ge=1, le=5)
 
 # ✅ 返回反馈（通用）
 class FeedbackOut(BaseModel):
@@ -143,3 +182,87 @@ class FeedbackOut(BaseModel):
 
     class Config:
         from_attributes = True  # ✅ 替代 orm_mode
+
+# ✅ 反馈列表的一页；next_cursor 为空表示没有更多
+class FeedbackPage(BaseModel):
+    items: List[FeedbackOut]
+    next_cursor: Optional[str] = None
+
+# ✅ 任务生命周期事件（任务历史）
+class TaskEventOut(BaseModel):
+    id: int
+    task_id: int
+    need_id: int
+    provider_id: int
+    actor_id: Optional[int] = None
+    type: str
+    data: Optional[Dict[str, Any]] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+# ✅ 服务者统计（由任务事件投影而来）
+class ProviderStatsOut(BaseModel):
+    provider_id: int
+    accepted_count: int
+    ongoing_count: int
+    completed_count: int
+    feedback_count: int
+    rating_sum: int
+    average_rating: Optional[float] = None
+    rating_score: Optional[float] = None  # 贝叶斯平均分
+    histogram: List[int] = []  # 1~5 星各多少条
+    positive_lower_bound: Optional[float] = None  # 好评（4 星及以上）率的 Wilson 置信下界
+    updated_at: Optional[datetime] = None
+
+# ✅ 服务者评分排行榜
+class LeaderboardEntry(BaseModel):
+    rank: int
+    provider_id: int
+    name: str
+    rating_score: float
+    average_rating: float
+    feedback_count: int
+    histogram: List[int]
+
+# ✅ 服务者评分趋势（按周 / 按月），average_rating 为空表示该周期没有反馈
+class RatingTrendPoint(BaseModel):
+    period_start: date
+    feedback_count: int
+    average_rating: Optional[float] = None
+
+class RatingTrendOut(BaseModel):
+    provider_id: int
+    period: str  # week / month
+    points: List[RatingTrendPoint]
+
+# ✅ 服务者某天的空闲时段，如 ["09:00-12:00", "14:00-17:30"]；空列表表示当天没空
+class AvailabilityDay(BaseModel):
+    provider_id: Optional[int] = None  # 社区管理员代为登记时必填，服务者只能登记自己的
+    day: date
+    ranges: List[str] = []
+
+# ✅ 批量登记空闲时间（同一人同一天整天覆盖）
+class AvailabilityUpdate(BaseModel):
+    items: List[AvailabilityDay]
+
+class AvailabilityOut(BaseModel):
+    provider_id: int
+    day: date
+    ranges: List[str]
+
+# ✅ 全文检索结果（需求：title 为标题、content 为描述；反馈：title 为老人姓名、content 为评价内容）
+class SearchHit(BaseModel):
+    type: str  # need / feedback
+    id: int
+    score: float
+    title: str
+    content: str
+    created_at: Optional[datetime] = None
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]
+    page: int
+    page_size: int
+    has_more: bool
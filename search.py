@@ -0,0 +1,251 @@
+# 全文检索：需求（标题 + 描述 + 地址）和反馈（老人姓名 + 评价内容），BM25 排序、分页返回。
+#   - 切词：连续的中文按重叠二元组切（"服务态度" → 服务 务态 态度），并补上每段的最后一个字，单字查询用前缀匹配也能命中；
+#     字母数字按整词（小写）
+#   - PostgreSQL：由 tokens 生成的 tsv 列（GIN 索引）筛选候选，BM25 按词频 / 文档长度在应用里计算；
+#     文档总数、平均长度、各词的文档频率进程内缓存
+#   - SQLite：FTS5 外部内容表，直接用内置 bm25()
+# 索引在写入需求 / 反馈的同一事务里维护；全量重建：python search.py rebuild
+import math
+import re
+import sys
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.orm import Session
+
+from database import dialect_insert
+from models import Feedback, SearchDocument, ServiceNeed
+
+DOC_NEED = "need"
+DOC_FEEDBACK = "feedback"
+DOC_TYPES = (DOC_NEED, DOC_FEEDBACK)
+
+# 与 SQLite FTS5 bm25() 的默认参数一致，两种数据库排序结果相近
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 文档总数 / 平均长度 / 文档频率的缓存时间（秒），只影响打分权重，不影响能否搜到
+SEARCH_STATS_TTL = 300
+# 文档频率最多数到这么多：更常见的词区分度已经很低，没必要数完。
+# PostgreSQL 上整个查询的命中数超过该值时，不再回表读全部命中，改为按 id 倒序扫描
+DF_COUNT_CAP = 10000
+# 参与 BM25 打分的候选文档上限（取最新的命中），极常见的词不会随数据量增长而变慢，翻页也只能翻到这么多条；
+# SQLite 上按类型筛选在这之后进行，所以只搜一类时实际候选会少一些
+MAX_CANDIDATES = 1000
+MAX_QUERY_TERMS = 32
+INDEX_CHUNK = 1000
+
+_TOKEN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+")
+
+_stats: Dict[tuple, Tuple[object, float]] = {}
+_stats_lock = threading.Lock()
+
+
+# ---------- 切词 ----------
+
+def tokenize(content: str) -> List[str]:
+    tokens = []
+    for run in _TOKEN.findall(unicodedata.normalize("NFKC", content).lower()):
+        if run.isascii():
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            tokens.append(run[-1])
+    return tokens
+
+
+# ✅ 查询词：[(词, 是否前缀匹配)]，各词之间为 AND
+def query_terms(q: str) -> List[Tuple[str, bool]]:
+    terms = {}
+    for run in _TOKEN.findall(unicodedata.normalize("NFKC", q).lower()):
+        if run.isascii():
+            terms[run] = False
+        elif len(run) == 1:
+            terms[run] = True
+        else:
+            for i in range(len(run) - 1):
+                terms[run[i:i + 2]] = False
+    return list(terms.items())[:MAX_QUERY_TERMS]
+
+
+def need_text(title: str, description: str, address: str) -> str:
+    return f"{title} {description} {address}"
+
+
+def feedback_text(elder_name: str, comment: str) -> str:
+    return f"{elder_name} {comment}"
+
+
+# ---------- 写入索引 ----------
+
+# ✅ docs 为 [(文档类型, 文档 id, 原文)]，已有的同一文档整条覆盖；由调用方提交
+def index_documents(db: Session, docs: Sequence[Tuple[str, int, str]]):
+    values = []
+    for doc_type, doc_id, content in docs:
+        tokens = tokenize(content)
+        values.append(dict(doc_type=doc_type, doc_id=doc_id, tokens=" ".join(tokens), length=len(tokens)))
+    for start in range(0, len(values), INDEX_CHUNK):
+        stmt = dialect_insert(db, SearchDocument).values(values[start:start + INDEX_CHUNK])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["doc_type", "doc_id"],
+            set_={"tokens": stmt.excluded.tokens, "length": stmt.excluded.length},
+        ))
+
+
+# ✅ 全量重建：清空后按需求、反馈分批重新切词写入
+def rebuild(db: Session) -> Dict[str, int]:
+    db.query(SearchDocument).delete(synchronize_session=False)
+    counts = {}
+    sources = (
+        (DOC_NEED, select(ServiceNeed.id, ServiceNeed.title, ServiceNeed.description, ServiceNeed.address)
+         .order_by(ServiceNeed.id), lambda row: need_text(row[1], row[2], row[3])),
+        (DOC_FEEDBACK, select(Feedback.id, Feedback.elder_name, Feedback.comment)
+         .order_by(Feedback.id), lambda row: feedback_text(row[1], row[2])),
+    )
+    for doc_type, query, to_text in sources:
+        counts[doc_type] = 0
+        for chunk in db.execute(query.execution_options(yield_per=INDEX_CHUNK)).partitions():
+            index_documents(db, [(doc_type, row[0], to_text(row)) for row in chunk])
+            counts[doc_type] += len(chunk)
+    db.commit()
+    with _stats_lock:
+        _stats.clear()
+    return counts
+
+
+# ---------- 查询 ----------
+
+def _cached(key: tuple, compute):
+    entry = _stats.get(key)
+    if entry is not None and time.monotonic() - entry[1] < SEARCH_STATS_TTL:
+        return entry[0]
+    value = compute()
+    with _stats_lock:
+        _stats[key] = (value, time.monotonic())
+    return value
+
+
+def _tsquery(terms: Sequence[Tuple[str, bool]]) -> str:
+    # 词只含中文和小写字母数字，直接加引号即可
+    return " & ".join(f"'{term}'" + (":*" if prefix else "") for term, prefix in terms)
+
+
+def _bm25(tokens: str, length: int, terms, idfs, avgdl: float) -> float:
+    counts: Dict[str, int] = {}
+    for token in tokens.split():
+        counts[token] = counts.get(token, 0) + 1
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avgdl)
+    score = 0.0
+    for (term, prefix), idf in zip(terms, idfs):
+        tf = sum(n for token, n in counts.items() if token.startswith(term)) if prefix else counts.get(term, 0)
+        score += idf * tf * (BM25_K1 + 1) / (tf + norm)
+    return score
+
+
+def _search_postgresql(db: Session, terms, phrase: bool, types, limit: int, offset: int) -> List[tuple]:
+    types_param = bindparam("types", expanding=True)
+    match = "doc_type IN :types AND tsv @@ CAST(:query AS tsquery)"
+
+    def corpus():
+        row = db.execute(
+            text("SELECT count(*), avg(length) FROM search_documents WHERE doc_type IN :types").bindparams(types_param),
+            {"types": list(types)},
+        ).one()
+        return row[0], float(row[1] or 0)
+
+    def df(term, prefix):
+        return db.execute(
+            text(f"SELECT count(*) FROM (SELECT 1 FROM search_documents WHERE {match} LIMIT :cap) AS matched")
+            .bindparams(types_param),
+            {"types": list(types), "query": _tsquery([(term, prefix)]), "cap": DF_COUNT_CAP},
+        ).scalar()
+
+    total, avgdl = _cached(("corpus", types), corpus)
+    dfs = [_cached(("df", types, term, prefix), lambda: df(term, prefix)) for term, prefix in terms]
+    idfs = [math.log(1 + (total - n + 0.5) / (n + 0.5)) for n in dfs]
+    params = {"types": list(types), "query": _tsquery(terms)}
+    columns = "SELECT id, doc_type, doc_id, length, tokens FROM search_documents"
+
+    if min(dfs) >= DF_COUNT_CAP and phrase:
+        # 单个短语且每个二元组都很常见（如"迟到""态度很好"），整句命中通常也很多，直接按 id 倒序扫描
+        ids = None
+    else:
+        # 取命中的 id（不排序，只能走 GIN 位图），最多 DF_COUNT_CAP + 1 个；有少见的词时一定能取全
+        ids = db.execute(
+            text(f"SELECT id FROM search_documents WHERE {match} LIMIT :cap").bindparams(types_param),
+            dict(params, cap=DF_COUNT_CAP + 1),
+        ).scalars().all()
+    if ids is not None and len(ids) <= DF_COUNT_CAP:
+        # 已是全部命中：取最新的 MAX_CANDIDATES 条按主键读出
+        newest = sorted(ids, reverse=True)[:MAX_CANDIDATES]
+        rows = db.execute(
+            text(f"{columns} WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)), {"ids": newest},
+        ).all() if newest else []
+    else:
+        # 命中太多：位图要回表读全部命中行，改为按主键从新到旧分段扫描，凑够 MAX_CANDIDATES 条即停。
+        # 本事务内关闭位图扫描，避免规划器低估 AND 查询的命中数又走回位图
+        db.execute(text("SET LOCAL enable_bitmapscan = off"))
+        upper = db.execute(text("SELECT max(id) FROM search_documents")).scalar() or 0
+        window = MAX_CANDIDATES * 8
+        rows = []
+        while upper > 0 and len(rows) < MAX_CANDIDATES:
+            rows += db.execute(
+                text(f"{columns} WHERE id > :lower AND id <= :upper AND {match} "
+                     f"ORDER BY id DESC LIMIT :cap").bindparams(types_param),
+                dict(params, lower=upper - window, upper=upper, cap=MAX_CANDIDATES - len(rows)),
+            ).all()
+            upper -= window
+            window *= 2
+        db.execute(text("RESET enable_bitmapscan"))
+
+    avgdl = max(avgdl, 1.0)
+    scored = sorted(
+        ((_bm25(tokens, length, terms, idfs, avgdl), row_id, doc_type, doc_id)
+         for row_id, doc_type, doc_id, length, tokens in rows),
+        key=lambda r: (-r[0], -r[1]),
+    )
+    return [(doc_type, doc_id, score) for score, _, doc_type, doc_id in scored[offset:offset + limit]]
+
+
+def _search_sqlite(db: Session, terms, phrase: bool, types, limit: int, offset: int) -> List[tuple]:
+    match = " ".join(f'"{term}"' + ("*" if prefix else "") for term, prefix in terms)
+    # 先按 rowid 倒序找到第 MAX_CANDIDATES 条命中（只走倒排表，很快），只对这之后的文档算 bm25()
+    floor = db.execute(
+        text("SELECT rowid FROM search_fts WHERE search_fts MATCH :match ORDER BY rowid DESC LIMIT 1 OFFSET :skip"),
+        {"match": match, "skip": MAX_CANDIDATES - 1},
+    ).scalar() or 0
+    sql = text("""
+        SELECT d.doc_type, d.doc_id, -bm25(search_fts) AS score
+        FROM search_fts JOIN search_documents d ON d.id = search_fts.rowid
+        WHERE search_fts MATCH :match AND search_fts.rowid >= :floor AND d.doc_type IN :types
+        ORDER BY bm25(search_fts), d.id DESC
+        LIMIT :limit OFFSET :offset
+    """).bindparams(bindparam("types", expanding=True))
+    return db.execute(sql, {"match": match, "floor": floor, "types": list(types), "limit": limit, "offset": offset}).all()
+
+
+# ✅ 检索一页：返回 ([(文档类型, 文档 id, 得分)], 是否还有下一页)
+def search(db: Session, q: str, types: Sequence[str] = DOC_TYPES, page: int = 1, page_size: int = 20):
+    terms = query_terms(q)
+    if not terms:
+        return [], False
+    phrase = len(_TOKEN.findall(unicodedata.normalize("NFKC", q).lower())) == 1
+    types = tuple(sorted(set(types)))
+    backend = _search_postgresql if db.get_bind().dialect.name == "postgresql" else _search_sqlite
+    rows = backend(db, terms, phrase, types, page_size + 1, (page - 1) * page_size)
+    return [(doc_type, doc_id, float(score)) for doc_type, doc_id, score in rows[:page_size]], len(rows) > page_size
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] != "rebuild":
+        print("用法：python search.py rebuild")
+        sys.exit(1)
+    from database import SessionLocal
+    session = SessionLocal()
+    try:
+        counts = rebuild(session)
+        print(f"✅ 已重建检索索引：需求 {counts[DOC_NEED]} 条，反馈 {counts[DOC_FEEDBACK]} 条")
+    finally:
+        session.close()
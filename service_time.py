@@ -0,0 +1,204 @@
+import os
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from fastapi import HTTPException
+
+# ✅ 服务时间按社区当地时间理解和存储（不带时区的本地时间），与用户填写的文字一致
+SERVICE_TIMEZONE = ZoneInfo(os.getenv("SERVICE_TIMEZONE", "Asia/Shanghai"))
+
+# 只写了开始时刻时默认的服务时长
+DEFAULT_DURATION = timedelta(hours=2)
+
+# 只写了时段（如“明天上午”）时对应的时间范围（小时）
+PERIODS = {
+    "凌晨": (0, 6),
+    "早上": (6, 9),
+    "早晨": (6, 9),
+    "上午": (8, 12),
+    "中午": (11, 13),
+    "下午": (13, 18),
+    "傍晚": (17, 19),
+    "晚上": (18, 21),
+}
+_AFTERNOON = ("下午", "傍晚", "晚上")
+
+RELATIVE_DAYS = {"今天": 0, "今日": 0, "明天": 1, "明日": 1, "后天": 2}
+WEEKDAYS = {"一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6}
+
+_FULL_DATE = re.compile(r"(\d{4})\s*[-/.年]\s*(\d{1,2})\s*[-/.月]\s*(\d{1,2})\s*[日号]?")
+_NEXT_MONTH_DAY = re.compile(r"下个?月\s*(\d{1,2})\s*[日号]")
+_MONTH_DAY = re.compile(r"(\d{1,2})\s*月\s*(\d{1,2})\s*[日号]?")
+# 10-25 / 10/25 / 10.25：前后不能紧挨数字、冒号或“点”，避免把 9:00-11:00、9-11点 当成日期
+_NUMERIC_MONTH_DAY = re.compile(r"(?<![\d:：.])(\d{1,2})\s*[-/.]\s*(\d{1,2})(?![\d:：点时])")
+_DAY_OF_MONTH = re.compile(r"(?<![\d月])(\d{1,2})\s*[日号]")
+_RELATIVE = re.compile("|".join(RELATIVE_DAYS))
+_WEEKEND = re.compile(r"(下)?周末")
+_WEEKDAY = re.compile(r"(下)?(?:周|星期|礼拜)([一二三四五六日天])")
+# 日期、时间都摘掉之后还剩这些，说明有没认出来的日期（或“每周一”这种周期性时间），不能按今天处理
+_UNPARSED = re.compile(r"\d|[年月日号周每]|星期|礼拜|天")
+
+_PERIOD = "(" + "|".join(PERIODS) + ")?"
+_CLOCK = r"(\d{1,2})(?:\s*[:：]\s*(\d{2})|\s*点\s*(半|\d{1,2}\s*分?)?|\s*时)"
+_TIME_RANGE = re.compile(
+    _PERIOD + r"\s*" + _CLOCK
+    + r"(?:\s*(?:-|~|～|—|至|到)\s*" + _PERIOD + r"\s*" + _CLOCK + ")?"
+)
+_PERIOD_ONLY = re.compile(_PERIOD[:-1])
+# “9-11点”：开始时刻省略了“点”，补上后按时间段解析
+_BARE_RANGE_START = re.compile(r"(?<![\d:：.])(\d{1,2})(?=\s*(?:-|~|～|—|至|到)\s*" + _PERIOD + r"\s*\d{1,2}\s*[点时])")
+
+
+def local_now() -> datetime:
+    return datetime.now(SERVICE_TIMEZONE).replace(tzinfo=None)
+
+
+# 带时区的时间换算成当地时间后去掉时区，与库中存储方式一致；不带时区的视为已是当地时间
+def to_local_naive(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(SERVICE_TIMEZONE).replace(tzinfo=None)
+    return value
+
+
+def _cut(text: str, m) -> str:
+    return text[:m.start()] + " " + text[m.end():]
+
+
+def _this_or_next_year(today: date, month: int, day: int) -> date:
+    result = date(today.year, month, day)
+    if result < today:  # 没写年份且日期已过，理解为明年
+        result = date(today.year + 1, month, day)
+    return result
+
+
+def _parse_date(text: str, today: date) -> Tuple[Optional[date], str]:
+    # 返回 (日期, 去掉日期部分后的文字)；日期不存在（如 2 月 30 日）时抛 ValueError
+    m = _FULL_DATE.search(text)
+    if m:
+        return date(int(m.group(1)), int(m.group(2)), int(m.group(3))), _cut(text, m)
+
+    m = _NEXT_MONTH_DAY.search(text)
+    if m:
+        year, month = (today.year + 1, 1) if today.month == 12 else (today.year, today.month + 1)
+        return date(year, month, int(m.group(1))), _cut(text, m)
+
+    for pattern in (_MONTH_DAY, _NUMERIC_MONTH_DAY):
+        m = pattern.search(text)
+        if m:
+            return _this_or_next_year(today, int(m.group(1)), int(m.group(2))), _cut(text, m)
+
+    m = _RELATIVE.search(text)
+    if m:
+        return today + timedelta(days=RELATIVE_DAYS[m.group(0)]), _cut(text, m)
+
+    m = _WEEKEND.search(text)
+    if m:
+        # “周末”：本周六（今天已是周日则为今天）；“下周末”：下一个自然周的周六
+        ahead = 0 if today.weekday() == 6 else 5 - today.weekday()
+        if m.group(1):
+            ahead = 5 - today.weekday() + 7
+        return today + timedelta(days=ahead), _cut(text, m)
+
+    m = _WEEKDAY.search(text)
+    if m:
+        ahead = (WEEKDAYS[m.group(2)] - today.weekday()) % 7
+        if m.group(1):  # “下周三”：下一个自然周的周三
+            ahead = WEEKDAYS[m.group(2)] - today.weekday() + 7
+        return today + timedelta(days=ahead), _cut(text, m)
+
+    m = _DAY_OF_MONTH.search(text)
+    if m:
+        # “25号”：本月 25 日，已过则为下月
+        day = int(m.group(1))
+        if day >= today.day:
+            return date(today.year, today.month, day), _cut(text, m)
+        year, month = (today.year + 1, 1) if today.month == 12 else (today.year, today.month + 1)
+        return date(year, month, day), _cut(text, m)
+
+    return None, text
+
+
+def _clock(period: Optional[str], hour: str, minute: Optional[str], point_suffix: Optional[str]) -> Optional[timedelta]:
+    h = int(hour)
+    m = int(minute) if minute else 0
+    if point_suffix:
+        m = 30 if point_suffix == "半" else int(point_suffix.rstrip("分").strip())
+    if period is None and minute is None and 1 <= h <= 6:
+        # 口语里没说上午下午的“3点半”指下午（写成 03:30 这种 24 小时制的不改）
+        h += 12
+    elif period in _AFTERNOON and h < 12:
+        h += 12
+    elif period == "中午" and h < 3:
+        h += 12
+    elif period == "凌晨" and h == 12:
+        h = 0
+    if h > 24 or m > 59:
+        return None
+    return timedelta(hours=h, minutes=m)
+
+
+# ✅ 从自由文本中解析服务时间段，返回 (start_at, end_at)；解析不出来返回 (None, None)。
+# 支持：2025-06-01 / 2025年6月1日 / 6月1日 / 6-1 6/1 6.1 / 25号 / 下月3日 / 今天 明天 后天 / 周六 下周三 周末；
+#      9:00-11:00 / 上午9点到11点半 / 下午3点 / 3点半（下午）/ 上午 / 晚上 等。
+# 有认不出的日期或数字（如“每周一”“2小时”）时宁可返回 (None, None)，也不猜成今天
+def parse_service_time(text: str, now: datetime = None) -> Tuple[Optional[datetime], Optional[datetime]]:
+    if not text:
+        return None, None
+    now = now or local_now()
+    try:
+        day, rest = _parse_date(text, now.date())
+    except ValueError:  # 如 2 月 30 日
+        return None, None
+
+    start_offset = end_offset = None
+    rest = _BARE_RANGE_START.sub(r"\1点", rest)
+    m = _TIME_RANGE.search(rest)
+    if m:
+        rest = _cut(rest, m)
+        start_period = m.group(1)
+        start_offset = _clock(start_period, m.group(2), m.group(3), m.group(4))
+        if m.group(6):
+            end_offset = _clock(m.group(5) or start_period, m.group(6), m.group(7), m.group(8))
+            # “上午10点-2点”：结束时刻比开始早，按下午理解
+            if start_offset is not None and end_offset is not None and end_offset <= start_offset:
+                end_offset += timedelta(hours=12)
+                if end_offset <= start_offset or end_offset > timedelta(hours=24):
+                    end_offset = None
+    else:
+        p = _PERIOD_ONLY.search(rest)
+        if p:
+            rest = _cut(rest, p)
+            low, high = PERIODS[p.group(1)]
+            start_offset, end_offset = timedelta(hours=low), timedelta(hours=high)
+
+    if day is None and start_offset is None:
+        return None, None
+    if _UNPARSED.search(rest):
+        return None, None
+    if start_offset is None:  # 只有日期：整天
+        base = datetime.combine(day, time())
+        return base, base + timedelta(days=1)
+    base = datetime.combine(day or now.date(), time())
+    start = base + start_offset
+    end = base + end_offset if end_offset is not None else start + DEFAULT_DURATION
+    # 没写日期时默认今天；今天的这个时间段已经结束（如傍晚发布“上午9点到11点”）则理解为明天，
+    # 否则需求一发布就会被过期清理
+    if day is None and end <= now:
+        start, end = start + timedelta(days=1), end + timedelta(days=1)
+    return start, end
+
+
+# ✅ 创建需求时确定时间段：显式给出的 start_at/end_at 优先，否则解析 time 文本
+def resolve_window(text: str, start_at: Optional[datetime] = None,
+                   end_at: Optional[datetime] = None) -> Tuple[Optional[datetime], Optional[datetime]]:
+    if start_at is None and end_at is None:
+        return parse_service_time(text)
+    if start_at is None:
+        raise HTTPException(status_code=400, detail="缺少服务开始时间")
+    start_at, end_at = to_local_naive(start_at), to_local_naive(end_at)
+    end_at = end_at or start_at + DEFAULT_DURATION
+    if end_at <= start_at:
+        raise HTTPException(status_code=400, detail="服务结束时间必须晚于开始时间")
+    return start_at, end_at
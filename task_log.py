@@ -0,0 +1,265 @@
+# 任务生命周期事件日志（task_events，只追加）及其投影：
+#   - 服务者统计 provider_stats、按周 / 按月的评分汇总 provider_rating_buckets：每写一个事件就在同一事务里增量更新
+#   - 任务状态 tasks.status、需求状态 service_needs.status：业务写入时同步维护，重建时以事件为准校正
+# 重建：python task_log.py rebuild
+# 历史数据补录（上线前已有的任务没有事件）：python task_log.py backfill
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from database import dialect_insert
+from models import Feedback, ProviderRatingBucket, ProviderStats, ServiceNeed, Task, TaskEvent
+import ratings
+
+TASK_ACCEPTED = "accepted"
+TASK_COMPLETED = "completed"
+TASK_FEEDBACK = "feedback"
+
+# 事件发生后任务 / 需求应处的状态
+TASK_STATUS = {TASK_ACCEPTED: "ongoing", TASK_COMPLETED: "completed"}
+NEED_STATUS = {TASK_ACCEPTED: "accepted", TASK_COMPLETED: "completed"}
+
+STATS_COLUMNS = ("accepted_count", "ongoing_count", "completed_count", "feedback_count", "rating_sum") + ratings.RATING_COLUMNS
+
+REBUILD_CHUNK = 5000
+
+
+# ✅ 每种事件对服务者统计的增量（增量更新和重建共用同一套规则）
+def _stats_delta(event_type: str, data: Optional[dict]) -> Dict[str, int]:
+    if event_type == TASK_ACCEPTED:
+        return {"accepted_count": 1, "ongoing_count": 1}
+    if event_type == TASK_COMPLETED:
+        return {"ongoing_count": -1, "completed_count": 1}
+    if event_type == TASK_FEEDBACK:
+        rating = int((data or {}).get("rating", 0))
+        return {"feedback_count": 1, "rating_sum": rating, ratings.rating_column(rating): 1}
+    return {}
+
+
+def _apply_stats(db: Session, provider_id: int, delta: Dict[str, int], last_event_id: int, at: datetime):
+    if not delta:
+        return
+    table = ProviderStats.__table__
+    inserted = {name: delta.get(name, 0) for name in STATS_COLUMNS}
+    updated = {name: table.c[name] + value for name, value in delta.items()}
+    if "feedback_count" in delta:
+        # 评分按累加后的值重算，与计数在同一条语句里更新
+        inserted["rating_score"] = ratings.bayesian_score(inserted["rating_sum"], inserted["feedback_count"])
+        updated["rating_score"] = ratings.bayesian_score(updated["rating_sum"], updated["feedback_count"])
+    stmt = dialect_insert(db, ProviderStats).values(
+        provider_id=provider_id,
+        last_event_id=last_event_id,
+        updated_at=at,
+        **inserted,
+    )
+    # 已有记录时在原值上累加（单条 UPSERT，并发写入也不会丢增量）
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.provider_id],
+        set_=dict(updated, last_event_id=last_event_id, updated_at=at),
+    ))
+
+
+# ✅ 反馈事件计入其所在的周、月汇总（同样是累加式 UPSERT）
+def _apply_rating_buckets(db: Session, provider_id: int, delta: Dict[str, int], at: datetime):
+    if "feedback_count" not in delta:
+        return
+    table = ProviderRatingBucket.__table__
+    stmt = dialect_insert(db, ProviderRatingBucket).values([
+        dict(provider_id=provider_id, period=period, period_start=ratings.period_start(period, at),
+             feedback_count=delta["feedback_count"], rating_sum=delta["rating_sum"])
+        for period in ratings.TREND_PERIODS
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.provider_id, table.c.period, table.c.period_start],
+        set_={
+            "feedback_count": table.c.feedback_count + stmt.excluded.feedback_count,
+            "rating_sum": table.c.rating_sum + stmt.excluded.rating_sum,
+        },
+    ))
+
+
+# ✅ 追加一条事件并增量更新投影；与业务写入在同一事务中，由调用方提交
+def record(db: Session, event_type: str, task: Task, actor_id: Optional[int] = None,
+           data: Optional[dict] = None) -> TaskEvent:
+    event = TaskEvent(
+        task_id=task.id,
+        need_id=task.need_id,
+        provider_id=task.provider_id,
+        actor_id=actor_id,
+        type=event_type,
+        data=data,
+        created_at=datetime.utcnow(),
+    )
+    db.add(event)
+    db.flush()
+    delta = _stats_delta(event_type, data)
+    _apply_stats(db, task.provider_id, delta, event.id, event.created_at)
+    _apply_rating_buckets(db, task.provider_id, delta, event.created_at)
+    return event
+
+
+# ✅ 批量追加同类事件：tasks 为 [(task_id, need_id, provider_id)]，事件一次插入，每位服务者的统计只 UPSERT 一次
+def record_many(db: Session, event_type: str, tasks: List[Tuple[int, int, int]], actor_id: Optional[int] = None,
+                data: Optional[dict] = None) -> int:
+    if not tasks:
+        return 0
+    now = datetime.utcnow()
+    # 只有涉及多位服务者时才需要 id 与参数一一对应（SQLite 上要求顺序会退化为逐行插入）
+    ordered = len({provider_id for _, _, provider_id in tasks}) > 1
+    event_ids = db.execute(
+        insert(TaskEvent).returning(TaskEvent.id, sort_by_parameter_order=ordered),
+        [
+            dict(task_id=task_id, need_id=need_id, provider_id=provider_id, actor_id=actor_id,
+                 type=event_type, data=data, created_at=now)
+            for task_id, need_id, provider_id in tasks
+        ],
+    ).scalars().all()
+
+    per_provider: Dict[int, Tuple[int, int]] = {}
+    for (_, _, provider_id), event_id in zip(tasks, event_ids):
+        count, last = per_provider.get(provider_id, (0, 0))
+        per_provider[provider_id] = (count + 1, max(last, event_id))
+    delta = _stats_delta(event_type, data)
+    for provider_id, (count, last) in per_provider.items():
+        scaled = {name: value * count for name, value in delta.items()}
+        _apply_stats(db, provider_id, scaled, last, now)
+        _apply_rating_buckets(db, provider_id, scaled, now)
+    return len(event_ids)
+
+
+# ---------- 查询 ----------
+
+def task_history(db: Session, task_id: int) -> List[TaskEvent]:
+    return db.query(TaskEvent).filter(TaskEvent.task_id == task_id).order_by(TaskEvent.id).all()
+
+
+def provider_stats(db: Session, provider_id: int) -> dict:
+    row = db.get(ProviderStats, provider_id)
+    stats = {name: getattr(row, name) if row else 0 for name in STATS_COLUMNS}
+    stats["provider_id"] = provider_id
+    stats["average_rating"] = round(stats["rating_sum"] / stats["feedback_count"], 2) if stats["feedback_count"] else None
+    stats["rating_score"] = round(row.rating_score, 3) if row and row.rating_score is not None else None
+    stats["histogram"] = ratings.histogram(row)
+    positive = sum(stats[f"rating_{level}"] for level in range(ratings.POSITIVE_RATING, ratings.RATING_MAX + 1))
+    stats["positive_lower_bound"] = ratings.wilson_lower_bound(positive, stats["feedback_count"])
+    stats["updated_at"] = row.updated_at if row else None
+    return stats
+
+
+# ---------- 重建 ----------
+
+def _set_status(db: Session, model, wanted: Dict[int, str]) -> int:
+    # 按目标状态分组批量校正，只更新确实不一致的行
+    by_status = defaultdict(list)
+    for row_id, status in wanted.items():
+        by_status[status].append(row_id)
+    fixed = 0
+    for status, ids in by_status.items():
+        for start in range(0, len(ids), REBUILD_CHUNK):
+            fixed += db.execute(
+                update(model)
+                .where(model.id.in_(ids[start:start + REBUILD_CHUNK]), model.status != status)
+                .values(status=status)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+    return fixed
+
+
+# ✅ 从事件日志全量重建投影：服务者统计、评分汇总整表重写，任务 / 需求状态与事件不一致的予以校正
+def rebuild(db: Session) -> dict:
+    stats = defaultdict(lambda: dict.fromkeys(STATS_COLUMNS, 0))
+    last_event = {}
+    buckets: Dict[tuple, List[int]] = defaultdict(lambda: [0, 0])
+    task_status: Dict[int, str] = {}
+    need_status: Dict[int, str] = {}
+    count = 0
+
+    rows = db.execute(
+        select(TaskEvent.id, TaskEvent.task_id, TaskEvent.need_id, TaskEvent.provider_id, TaskEvent.type, TaskEvent.data,
+               TaskEvent.created_at)
+        .order_by(TaskEvent.id)
+        .execution_options(yield_per=REBUILD_CHUNK)
+    )
+    for chunk in rows.partitions():
+        for event_id, task_id, need_id, provider_id, event_type, data, created_at in chunk:
+            delta = _stats_delta(event_type, data)
+            for name, value in delta.items():
+                stats[provider_id][name] += value
+            if "feedback_count" in delta:
+                for period in ratings.TREND_PERIODS:
+                    bucket = buckets[(provider_id, period, ratings.period_start(period, created_at))]
+                    bucket[0] += delta["feedback_count"]
+                    bucket[1] += delta["rating_sum"]
+            last_event[provider_id] = event_id
+            if event_type in TASK_STATUS:
+                task_status[task_id] = TASK_STATUS[event_type]
+                need_status[need_id] = NEED_STATUS[event_type]
+            count += 1
+
+    now = datetime.utcnow()
+    db.query(ProviderStats).delete()
+    if stats:
+        db.execute(insert(ProviderStats), [
+            dict(values, provider_id=provider_id, last_event_id=last_event[provider_id], updated_at=now,
+                 rating_score=ratings.bayesian_score(values["rating_sum"], values["feedback_count"])
+                 if values["feedback_count"] else None)
+            for provider_id, values in stats.items()
+        ])
+    db.query(ProviderRatingBucket).delete()
+    if buckets:
+        db.execute(insert(ProviderRatingBucket), [
+            dict(provider_id=provider_id, period=period, period_start=start, feedback_count=count, rating_sum=total)
+            for (provider_id, period, start), (count, total) in buckets.items()
+        ])
+    tasks_fixed = _set_status(db, Task, task_status)
+    needs_fixed = _set_status(db, ServiceNeed, need_status)
+    db.commit()
+    ratings.leaderboard.invalidate()
+    return {"events": count, "providers": len(stats), "tasks_fixed": tasks_fixed, "needs_fixed": needs_fixed}
+
+
+# ✅ 为上线前已有、还没有任何事件的任务补录事件（完成时间未知，按接单时间记），之后需重建投影
+def backfill(db: Session) -> int:
+    logged = select(TaskEvent.task_id).distinct()
+    rows = (
+        db.query(Task, Feedback)
+        .outerjoin(Feedback, Feedback.task_id == Task.id)
+        .filter(Task.id.notin_(logged))
+        .order_by(Task.id)
+        .all()
+    )
+    events = []
+    for task, feedback in rows:
+        base = dict(task_id=task.id, need_id=task.need_id, provider_id=task.provider_id, actor_id=None)
+        accepted_at = task.accepted_at or datetime.utcnow()
+        if not events or events[-1]["task_id"] != task.id:
+            events.append(dict(base, type=TASK_ACCEPTED, data={"backfilled": True}, created_at=accepted_at))
+            if task.status == "completed":
+                events.append(dict(base, type=TASK_COMPLETED, data={"backfilled": True}, created_at=accepted_at))
+        if feedback is not None:
+            events.append(dict(base, type=TASK_FEEDBACK, data={"rating": feedback.rating, "backfilled": True},
+                               created_at=feedback.created_at or accepted_at))
+    if events:
+        db.execute(insert(TaskEvent), events)
+    db.commit()
+    return len(events)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ("rebuild", "backfill"):
+        print("用法：python task_log.py rebuild | backfill")
+        sys.exit(1)
+    from database import SessionLocal
+    session = SessionLocal()
+    try:
+        if sys.argv[1] == "backfill":
+            print(f"✅ 已补录 {backfill(session)} 条事件")
+        result = rebuild(session)
+        print(f"✅ 已重建：{result['events']} 条事件，{result['providers']} 位服务者，"
+              f"校正任务状态 {result['tasks_fixed']} 条，需求状态 {result['needs_fixed']} 条")
+    finally:
+        session.close()
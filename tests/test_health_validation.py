@@ -0,0 +1,27 @@
+# 步数计数器按社区当地日期分段（默认 Asia/Shanghai，UTC+8）
+from datetime import datetime
+
+from health_validation import REJECT_STEPS_DECREASING, validate_batch
+from schemas import HealthDataCreate
+
+
+def steps_batch(*readings):
+    return [HealthDataCreate(user_id=1, timestamp=ts, steps=steps) for ts, steps in readings]
+
+
+def test_steps_reset_at_local_midnight_is_accepted():
+    # 15:30Z = 当地 23:30，16:30Z = 次日 00:30：跨过当地零点归零，不是倒退
+    mask = validate_batch(steps_batch(
+        (datetime(2026, 10, 19, 15, 30), 8000),
+        (datetime(2026, 10, 19, 16, 30), 100),
+    ))
+    assert not (mask & REJECT_STEPS_DECREASING).any()
+
+
+def test_steps_decrease_across_utc_midnight_is_rejected():
+    # 23:30Z 和 00:30Z 都是当地 10-20 上午，同一天内倒退
+    mask = validate_batch(steps_batch(
+        (datetime(2026, 10, 19, 23, 30), 8000),
+        (datetime(2026, 10, 20, 0, 30), 100),
+    ))
+    assert list(mask & REJECT_STEPS_DECREASING) == [0, REJECT_STEPS_DECREASING]
@@ -0,0 +1,18 @@
+# 接口 SQL 条数检查接入测试：在子进程里跑 benchmarks/check_query_counts.py（同步、异步两种数据库模式各一次），
+# 查询条数随数据量增长、触发懒加载或冷启动并发卡死都会以非 0 状态退出
+# 数据库模式在导入时就确定了，放在子进程里才能两种模式都测；总是用脚本自带的临时 SQLite，不会写到 DATABASE_URL 指向的库
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "check_query_counts.py")
+
+
+@pytest.mark.parametrize("async_mode", ["0", "1"])
+def test_query_counts_do_not_grow_with_data(async_mode):
+    env = {k: v for k, v in os.environ.items() if k != "DATABASE_URL"}
+    env["DB_ASYNC"] = async_mode
+    result = subprocess.run([sys.executable, SCRIPT], env=env, capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stdout + result.stderr
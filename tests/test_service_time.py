@@ -0,0 +1,62 @@
+# 服务时间解析表：now 固定为 2026-10-19（周一）16:00
+from datetime import datetime, timezone
+
+import pytest
+
+from service_time import parse_service_time, to_local_naive
+
+NOW = datetime(2026, 10, 19, 16, 0)
+
+
+def dt(month, day, hour, minute=0, year=2026):
+    return datetime(year, month, day, hour, minute)
+
+
+CASES = [
+    # 完整日期 / 月日
+    ("2026-10-25 9:00", (dt(10, 25, 9), dt(10, 25, 11))),
+    ("2026年11月1日上午", (dt(11, 1, 8), dt(11, 1, 12))),
+    ("10月25日 上午9点到11点半", (dt(10, 25, 9), dt(10, 25, 11, 30))),
+    ("10-25 9:00", (dt(10, 25, 9), dt(10, 25, 11))),
+    ("10/25 9:00-11:00", (dt(10, 25, 9), dt(10, 25, 11))),
+    ("10.25 上午", (dt(10, 25, 8), dt(10, 25, 12))),
+    ("1-5 下午", (dt(1, 5, 13, year=2027), dt(1, 5, 18, year=2027))),  # 日期已过：明年
+    ("25号上午", (dt(10, 25, 8), dt(10, 25, 12))),
+    ("3号上午", (dt(11, 3, 8), dt(11, 3, 12))),  # 本月已过：下月
+    ("下月3日 上午", (dt(11, 3, 8), dt(11, 3, 12))),
+    # 相对日期 / 星期
+    ("明天上午", (dt(10, 20, 8), dt(10, 20, 12))),
+    ("今天上午", (dt(10, 19, 8), dt(10, 19, 12))),
+    ("周末上午", (dt(10, 24, 8), dt(10, 24, 12))),
+    ("下周末上午", (dt(10, 31, 8), dt(10, 31, 12))),
+    ("周三下午3点", (dt(10, 21, 15), dt(10, 21, 17))),
+    ("下周三 9:00", (dt(10, 28, 9), dt(10, 28, 11))),
+    # 只有时间：默认今天，今天的时间段已结束则为明天
+    ("下午3点到5点", (dt(10, 19, 15), dt(10, 19, 17))),
+    ("上午9点到11点", (dt(10, 20, 9), dt(10, 20, 11))),
+    ("3点半", (dt(10, 19, 15, 30), dt(10, 19, 17, 30))),
+    ("3点到5点", (dt(10, 19, 15), dt(10, 19, 17))),
+    ("晚上", (dt(10, 19, 18), dt(10, 19, 21))),
+    ("9:00-11:00", (dt(10, 20, 9), dt(10, 20, 11))),
+    ("9-11点", (dt(10, 20, 9), dt(10, 20, 11))),
+    # 只有日期：整天
+    ("2026-10-25", (dt(10, 25, 0), dt(10, 26, 0))),
+    # 认不出来的：宁可不解析，也不猜成今天
+    ("每周一上午", (None, None)),
+    ("上午9点，约2小时", (None, None)),
+    ("2月30日上午", (None, None)),
+    ("尽快", (None, None)),
+    ("", (None, None)),
+]
+
+
+@pytest.mark.parametrize("text,expected", CASES)
+def test_parse_service_time(text, expected):
+    assert parse_service_time(text, NOW) == expected
+
+
+def test_to_local_naive():
+    aware = datetime(2026, 10, 20, 1, 0, tzinfo=timezone.utc)
+    assert to_local_naive(aware) == datetime(2026, 10, 20, 9, 0)
+    assert to_local_naive(datetime(2026, 10, 20, 9, 0)) == datetime(2026, 10, 20, 9, 0)
+    assert to_local_naive(None) is None